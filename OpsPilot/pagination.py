@@ -0,0 +1,292 @@
+# OpsPilot/pagination.py
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from django.utils.http import urlencode
+
+
+CURSOR_AFTER = 'after'
+CURSOR_BEFORE = 'before'
+
+APPROXIMATE_COUNT_TIMEOUT = 60 * 5
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor can't be decoded for the current ordering"""
+
+
+def keyset_ordering(queryset):
+    """
+    The queryset's ordering as (field, descending) pairs ending with the primary key.
+
+    Returns None when an ordering term isn't a plain column of the model (an
+    expression, a related lookup or a random order), since rows can't be keyed
+    on it.
+    """
+    model = queryset.model
+    terms = list(queryset.query.order_by or model._meta.ordering or [])
+
+    ordering = []
+    for term in terms:
+        if not isinstance(term, str) or term == '?':
+            return None
+        descending = term.startswith('-')
+        name = term.lstrip('-')
+        if name == 'pk':
+            name = model._meta.pk.name
+        if '__' in name:
+            return None
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.is_relation or field.null:
+            return None
+        ordering.append((field, descending))
+        if field.primary_key:
+            return ordering
+
+    # The primary key breaks ties so every row has a unique position
+    descending = ordering[0][1] if ordering else False
+    ordering.append((model._meta.pk, descending))
+    return ordering
+
+
+def encode_cursor(values):
+    payload = json.dumps([str(value) for value in values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(payload)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise ValueError('cursor does not match the ordering')
+        return [field.to_python(value) for (field, _), value in zip(ordering, values)]
+    except (ValueError, TypeError, ValidationError) as exc:
+        raise InvalidCursor(str(exc))
+
+
+def keyset_filter(ordering, values, forward=True):
+    """
+    Q selecting the rows after (or before) a position in the ordering.
+
+    For ordering (a, b, pk) this is a > x OR (a = x AND b > y) OR (a = x AND
+    b = y AND pk > z), with each comparison flipped for descending columns.
+    """
+    condition = Q()
+    equal = {}
+    for (field, descending), value in zip(ordering, values):
+        after = 'lt' if descending else 'gt'
+        before = 'gt' if descending else 'lt'
+        lookup = after if forward else before
+        condition |= Q(**equal, **{f'{field.attname}__{lookup}': value})
+        equal[field.attname] = value
+    return condition
+
+
+def approximate_count(queryset, timeout=APPROXIMATE_COUNT_TIMEOUT):
+    """Row count of a queryset, cached for a few minutes per query so it isn't recounted on every page"""
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    key = 'approximate_count:' + hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+    return cache.get_or_set(key, queryset.order_by().count, timeout)
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset"""
+    is_keyset = True
+
+    def __init__(self, object_list, ordering, has_next, has_previous, paginator):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._ordering = ordering
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _cursor(self, obj):
+        return encode_cursor([getattr(obj, field.attname) for field, _ in self._ordering])
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        return self._cursor(self.object_list[-1]) if self._has_next and self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return self._cursor(self.object_list[0]) if self._has_previous and self.object_list else None
+
+    @property
+    def approximate_count(self):
+        return self.paginator.approximate_count
+
+
+class KeysetPaginator:
+    """
+    Cursor paginator keyed on the queryset's ordering columns and the primary key.
+
+    Each page is one indexed range query for per_page + 1 rows, so the first
+    page and the five-thousandth cost the same and no COUNT(*) is run. Only a
+    cached, approximate total is available, and only when asked for.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None, count=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering or keyset_ordering(queryset)
+        if self.ordering is None:
+            raise ValueError('Queryset ordering cannot be used for keyset pagination')
+        self.count = count
+
+    def _ordered(self, reverse=False):
+        return self.queryset.order_by(*[
+            F(field.attname).asc() if descending == reverse else F(field.attname).desc()
+            for field, descending in self.ordering
+        ])
+
+    def page(self, after=None, before=None):
+        """The page after one cursor, before another, or the first page"""
+        if before:
+            values = decode_cursor(before, self.ordering)
+            rows = list(self._ordered(reverse=True).filter(keyset_filter(self.ordering, values, forward=False))[
+                :self.per_page + 1
+            ])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return KeysetPage(rows, self.ordering, has_next=True, has_previous=has_previous, paginator=self)
+
+        queryset = self._ordered()
+        if after:
+            values = decode_cursor(after, self.ordering)
+            queryset = queryset.filter(keyset_filter(self.ordering, values))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], self.ordering, has_next=has_next, has_previous=bool(after),
+                          paginator=self)
+
+    @property
+    def approximate_count(self):
+        if not self.count:
+            return None
+        return approximate_count(self.queryset)
+
+
+class RankedPage(KeysetPage):
+    """One page of a RankedPaginator; its cursors are positions in the ranked list"""
+
+    def __init__(self, object_list, start, end, paginator):
+        super().__init__(object_list, None, has_next=end < len(paginator.ids), has_previous=start > 0,
+                         paginator=paginator)
+        self._start = start
+        self._end = end
+
+    @property
+    def next_cursor(self):
+        return str(self._end - 1) if self._has_next else None
+
+    @property
+    def previous_cursor(self):
+        return str(self._start) if self._has_previous else None
+
+
+class RankedPaginator:
+    """
+    Cursor paginator over primary keys ranked outside the database, such as search hits.
+
+    The ranked keys are narrowed to the queryset's rows in one query, and each
+    page fetches just its own rows by key, so the ranking never has to be
+    expressed as an ORDER BY. Cursors are positions in the ranked list.
+    """
+
+    def __init__(self, queryset, ranked_ids, per_page, count=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count = count
+        matching = set(queryset.filter(pk__in=ranked_ids).values_list('pk', flat=True))
+        self.ids = [pk for pk in ranked_ids if pk in matching]
+
+    def _position(self, cursor):
+        try:
+            position = int(cursor)
+        except (TypeError, ValueError) as exc:
+            raise InvalidCursor(str(exc))
+        if not 0 <= position < len(self.ids):
+            raise InvalidCursor('cursor is outside the results')
+        return position
+
+    def page(self, after=None, before=None):
+        """The page after one cursor, before another, or the first page"""
+        if before:
+            end = self._position(before)
+            start = max(end - self.per_page, 0)
+        else:
+            start = self._position(after) + 1 if after else 0
+            end = start + self.per_page
+        ids = self.ids[start:end]
+        rows = self.queryset.order_by().in_bulk(ids)
+        return RankedPage([rows[pk] for pk in ids if pk in rows], start, min(end, len(self.ids)), paginator=self)
+
+    @property
+    def approximate_count(self):
+        return len(self.ids) if self.count else None
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin that pages with ?after= / ?before= cursors instead of ?page= offsets.
+
+    Views whose rows are ranked outside the database (search hits) set
+    `ranked_ids` in get_queryset and are paged through that list. Other
+    querysets whose ordering can't be keyed fall back to the view's normal
+    offset pagination. Set keyset_count = True to show an approximate total.
+    """
+    keyset_count = False
+    ranked_ids = None
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.ranked_ids is not None:
+            paginator = RankedPaginator(queryset, self.ranked_ids, page_size, count=self.keyset_count)
+        else:
+            ordering = keyset_ordering(queryset)
+            if ordering is None:
+                return super().paginate_queryset(queryset, page_size)
+            paginator = KeysetPaginator(queryset, page_size, ordering=ordering, count=self.keyset_count)
+
+        try:
+            page = paginator.page(
+                after=self.request.GET.get(CURSOR_AFTER),
+                before=self.request.GET.get(CURSOR_BEFORE),
+            )
+        except InvalidCursor:
+            page = paginator.page()
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Filters to carry over into the cursor links
+        context['pagination_query'] = urlencode([
+            (key, value) for key, value in self.request.GET.items()
+            if key not in (CURSOR_AFTER, CURSOR_BEFORE, 'page')
+        ])
+        return context
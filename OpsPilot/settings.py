@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from celery.schedules import crontab
+from django.conf import global_settings
 
 # Load environment variables
 load_dotenv()
@@ -130,6 +132,12 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Attachment file fields use the 'attachments' storage (deduplicated blob store)
+STORAGES = {
+    **global_settings.STORAGES,
+    'attachments': {'BACKEND': 'applications.dashboard.storage.BlobStorage'},
+}
+
 # Fixtures directory
 FIXTURE_DIRS = [
     BASE_DIR / 'fixtures',
@@ -145,6 +153,38 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+
+# Periodic tasks (synced into django-celery-beat by the database scheduler)
+CELERY_BEAT_SCHEDULE = {
+    'inventory-stock-valuation-snapshot': {
+        'task': 'applications.inventory.tasks.snapshot_stock_valuation',
+        'schedule': crontab(hour=23, minute=55),
+    },
+    'inventory-supplier-metrics': {
+        'task': 'applications.inventory.tasks.refresh_supplier_analytics',
+        'schedule': crontab(hour=4, minute=45),
+    },
+    'inventory-reorder-drafts': {
+        'task': 'applications.inventory.tasks.generate_reorder_drafts',
+        'schedule': crontab(hour=5, minute=0),
+    },
+    'inventory-cycle-counts': {
+        'task': 'applications.inventory.tasks.schedule_cycle_counts',
+        'schedule': crontab(hour=4, minute=30),
+    },
+    'inventory-low-stock-digest': {
+        'task': 'applications.inventory.tasks.send_low_stock_alert_digest',
+        'schedule': crontab(minute='*/30'),
+    },
+    'media-purge-unreferenced-blobs': {
+        'task': 'applications.dashboard.tasks.purge_unreferenced_media',
+        'schedule': crontab(hour=2, minute=30),
+    },
+}
+
+# Inventory costing method for stock values and job costs: 'fifo' or 'average'
+INVENTORY_COSTING_METHOD = os.getenv('INVENTORY_COSTING_METHOD', 'fifo')
 
 # TODO: change to smtp not backend
 # Email settings
@@ -2,6 +2,12 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.dispatch import receiver
 from django.db.models.signals import post_save
+from django.core.files.storage import storages
+
+
+def attachment_storage():
+    """Storage for uploaded attachments, configured as STORAGES['attachments']"""
+    return storages['attachments']
 
 
 class Company(models.Model):
@@ -50,7 +56,7 @@ class UserProfile(models.Model):
     phone_number = models.CharField(max_length=20, blank=True)
     telegram_id = models.CharField(max_length=50, blank=True, help_text="Telegram ID for notifications")
     whatsapp_number = models.CharField(max_length=20, blank=True, help_text="WhatsApp number for notifications")
-    profile_image = models.ImageField(upload_to='profile_images/', blank=True, null=True)
+    profile_image = models.ImageField(upload_to='profile_images/', storage=attachment_storage, blank=True, null=True)
     bio = models.TextField(blank=True)
 
     # Notification preferences
@@ -3,11 +3,17 @@ from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.core.files.storage import storages
 from applications.accounts.models import UserProfile, Company, Department
 from applications.tasks.models import Task
 from applications.jobs.models import Job
 
 
+def attachment_storage():
+    """Storage for uploaded attachments, configured as STORAGES['attachments']"""
+    return storages['attachments']
+
+
 class EventCategory(models.Model):
     """Categories for different types of events"""
     EVENT_TYPES = [
@@ -251,7 +257,7 @@ class CalendarPermission(models.Model):
 class EventAttachment(models.Model):
     """File attachments for events"""
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='attachments')
-    file = models.FileField(upload_to='event_attachments/%Y/%m/')
+    file = models.FileField(upload_to='event_attachments/%Y/%m/', storage=attachment_storage)
     filename = models.CharField(max_length=255)
     file_size = models.PositiveIntegerField()
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -262,7 +268,8 @@ class EventAttachment(models.Model):
         return f"{self.filename} - {self.event.title}"
 
     def save(self, *args, **kwargs):
-        if self.file:
+        # Record the upload's own name; once stored, file.name is the shared blob path
+        if self.file and not self.file._committed:
             self.filename = self.file.name
             self.file_size = self.file.size
         super().save(*args, **kwargs)
@@ -2,10 +2,16 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.urls import reverse
+from django.core.files.storage import storages
 from datetime import datetime, timedelta
 import uuid
 
 
+def attachment_storage():
+    """Storage for uploaded attachments, configured as STORAGES['attachments']"""
+    return storages['attachments']
+
+
 class ChatRoom(models.Model):
     """Chat rooms for team communication"""
     ROOM_TYPES = [
@@ -107,7 +113,8 @@ class Message(models.Model):
     content = models.TextField()
 
     # File attachments
-    file_attachment = models.FileField(upload_to='chat_files/', null=True, blank=True)
+    file_attachment = models.FileField(upload_to='chat_files/', storage=attachment_storage, null=True,
+                                       blank=True)
     file_name = models.CharField(max_length=255, blank=True)
     file_size = models.PositiveIntegerField(null=True, blank=True)
 
@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import Blob
 
-# Register your models here.
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'width', 'height', 'ref_count', 'created_at', 'updated_at')
+    search_fields = ('sha256', 'name')
+    readonly_fields = ('sha256', 'name', 'size', 'width', 'height', 'ref_count', 'created_at', 'updated_at')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from applications.dashboard.storage import dedupe_media, purge_unreferenced_blobs, recount_blob_references
+
+
+class Command(BaseCommand):
+    help = 'Move existing attachments into the deduplicated blob store and rebuild blob reference counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only hash the files and report the saving')
+        parser.add_argument('--recount', action='store_true',
+                            help='Only rebuild reference counts from the rows pointing at each blob')
+        parser.add_argument('--purge', action='store_true', help='Delete blobs nothing refers to any more')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            corrected = recount_blob_references()
+            self.stdout.write(self.style.SUCCESS(f'Blob reference counts rebuilt: {corrected} blobs corrected'))
+        else:
+            summary = dedupe_media(dry_run=options['dry_run'])
+            saved = summary['bytes_before'] - summary['bytes_after']
+            prefix = 'Dry run: ' if options['dry_run'] else ''
+            self.stdout.write(self.style.SUCCESS(
+                f"{prefix}{summary['files']} files ({summary['rows']} rows) deduplicated into "
+                f"{summary['distinct']} blobs, saving {filesizeformat(saved)}"
+            ))
+            if summary['missing']:
+                self.stdout.write(self.style.WARNING(f"{summary['missing']} rows point at missing files"))
+
+        if options['purge'] and not options['dry_run']:
+            purged, freed = purge_unreferenced_blobs()
+            self.stdout.write(self.style.SUCCESS(f'Unreferenced blobs purged: {purged} ({filesizeformat(freed)})'))
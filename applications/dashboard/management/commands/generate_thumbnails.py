@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from applications.dashboard.models import Blob
+from applications.dashboard.thumbnails import generate_thumbnails, is_image_name
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnails and record dimensions for stored images that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate thumbnails for every stored image')
+
+    def handle(self, *args, **options):
+        blobs = Blob.objects.all() if options['all'] else Blob.objects.filter(width__isnull=True)
+
+        generated, skipped = 0, 0
+        for name in blobs.values_list('name', flat=True).iterator():
+            if not is_image_name(name):
+                continue
+            if generate_thumbnails(name, overwrite=options['all']):
+                generated += 1
+            else:
+                skipped += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Thumbnails generated for {generated} images'))
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'{skipped} files could not be read as images'))
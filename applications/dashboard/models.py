@@ -1,3 +1,23 @@
 from django.db import models
 
-# Create your models here.
+
+class Blob(models.Model):
+    """A stored file, kept once per distinct content and shared by every attachment that uploads it"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True, help_text="Path of the file in media storage")
+    size = models.BigIntegerField(help_text="Size in bytes")
+    ref_count = models.PositiveIntegerField(default=0, help_text="Number of file fields pointing at this blob")
+    width = models.PositiveIntegerField(null=True, blank=True, help_text="Image width in pixels")
+    height = models.PositiveIntegerField(null=True, blank=True, help_text="Image height in pixels")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Blob'
+        verbose_name_plural = 'Blobs'
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
@@ -4,6 +4,7 @@ from django.contrib.auth.models import User
 from django.core.mail import send_mail
 from django.conf import settings
 from threading import Thread
+from .storage import connect_blob_reference_counting
 
 
 # Define a function to send emails in a separate thread
@@ -29,4 +30,8 @@ def user_created(sender, instance, created, **kwargs):
         recipient_list = [instance.email]
 
         # Send email asynchronously
-        send_email_async(subject, message, from_email, recipient_list)
\ No newline at end of file
+        send_email_async(subject, message, from_email, recipient_list)
+
+
+# Count blob references for every app's attachment fields; all models are loaded by the time wsgi.py imports this
+connect_blob_reference_counting()
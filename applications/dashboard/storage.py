@@ -0,0 +1,296 @@
+# dashboard/storage.py
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.db.models import Count, F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+
+BLOB_ROOT = 'blobs'
+HASH_CHUNK_SIZE = 64 * 1024
+
+# Unreferenced blobs younger than this are kept, in case an upload is about to reuse them
+BLOB_PURGE_GRACE = timezone.timedelta(hours=1)
+
+
+def blob_name(sha256, extension=''):
+    """Storage path of a blob: blobs/<aa>/<bb>/<sha256><ext>"""
+    return f"{BLOB_ROOT}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension.lower()}"
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(f"{BLOB_ROOT}/")
+
+
+def hash_file(path):
+    """(sha256 hex digest, size) of a file, read in chunks"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+@deconstructible
+class BlobStorage(FileSystemStorage):
+    """
+    Content-addressed media storage.
+
+    Uploads are hashed while they stream to a temporary file and stored once
+    under blobs/, named by their SHA-256. An upload whose content is already
+    stored reuses the existing file, so the same photo or datasheet attached
+    in several places takes disk space once. Blob rows count the file fields
+    pointing at each file; files are only removed when nothing refers to them.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The stored name comes from the content, so the upload name never collides
+        return name
+
+    def _save(self, name, content):
+        from .models import Blob
+
+        temp_dir = self.path(os.path.join(BLOB_ROOT, 'tmp'))
+        os.makedirs(temp_dir, exist_ok=True)
+
+        # Hash while copying to a temporary file, so large uploads are read once
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks(HASH_CHUNK_SIZE):
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+                    size += len(chunk)
+
+            sha256 = digest.hexdigest()
+            name = Blob.objects.filter(sha256=sha256).values_list('name', flat=True).first() or blob_name(
+                sha256, os.path.splitext(name)[1]
+            )
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        blob, created = Blob.objects.get_or_create(sha256=sha256, defaults={'name': name, 'size': size})
+        if created:
+            from .thumbnails import queue_thumbnails
+            queue_thumbnails(name)
+        return name
+
+    def store_existing(self, name):
+        """
+        Move a file already in media storage into the blob store and return its blob name.
+
+        The original is left in place; callers delete it once the rows that
+        point at it have been updated.
+        """
+        from .models import Blob
+
+        path = self.path(name)
+        sha256, size = hash_file(path)
+        stored_name = Blob.objects.filter(sha256=sha256).values_list('name', flat=True).first() or blob_name(
+            sha256, os.path.splitext(name)[1]
+        )
+        blob_path = self.path(stored_name)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            try:
+                os.link(path, blob_path)
+            except OSError:
+                shutil.copy2(path, blob_path)
+
+        Blob.objects.get_or_create(sha256=sha256, defaults={'name': stored_name, 'size': size})
+        return stored_name
+
+    def delete(self, name):
+        """Delete a file, leaving blobs that are still referenced in place"""
+        from .models import Blob
+
+        if is_blob_name(name) and Blob.objects.filter(name=name, ref_count__gt=0).exists():
+            return
+        super().delete(name)
+
+
+blob_storage = BlobStorage()
+
+
+def blob_fields():
+    """(model, field) for every installed FileField stored in the blob store"""
+    return [
+        (model, field)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField) and isinstance(field.storage, BlobStorage)
+    ]
+
+
+def retain_blobs(names):
+    """Count one more reference to each blob name"""
+    from .models import Blob
+
+    for name in names:
+        Blob.objects.filter(name=name).update(ref_count=F('ref_count') + 1, updated_at=timezone.now())
+
+
+def release_blobs(names):
+    """Count one reference less to each blob name; unreferenced blobs are purged later"""
+    from .models import Blob
+
+    for name in names:
+        Blob.objects.filter(name=name, ref_count__gt=0).update(
+            ref_count=F('ref_count') - 1, updated_at=timezone.now()
+        )
+
+
+def purge_unreferenced_blobs(grace=BLOB_PURGE_GRACE):
+    """Delete blobs nothing has referred to for the grace period. Returns (count, bytes freed)"""
+    from .models import Blob
+    from .thumbnails import delete_thumbnails
+
+    purged, freed = 0, 0
+    stale = Blob.objects.filter(ref_count=0, updated_at__lt=timezone.now() - grace)
+    for blob in stale.iterator():
+        # Re-check under the filter so a blob retained meanwhile is kept
+        if Blob.objects.filter(pk=blob.pk, ref_count=0).delete()[0]:
+            blob_storage.delete(blob.name)
+            delete_thumbnails(blob.name)
+            purged += 1
+            freed += blob.size
+    return purged, freed
+
+
+def _field_names(instance, fields):
+    names = {}
+    for field in fields:
+        value = instance.__dict__.get(field.attname)
+        names[field.attname] = getattr(value, 'name', value) or ''
+    return names
+
+
+def connect_blob_reference_counting():
+    """
+    Keep Blob.ref_count in step with every blob-backed file field as rows are saved and deleted.
+
+    The names a row held before a save are read back from the database in
+    pre_save, so rows that are loaded but never saved cost nothing.
+    """
+    fields_by_model = {}
+    for model, field in blob_fields():
+        fields_by_model.setdefault(model, []).append(field)
+
+    for model, fields in fields_by_model.items():
+        def remember_blobs(sender, instance, fields=fields, raw=False, **kwargs):
+            stored = None
+            if instance.pk is not None and not raw:
+                stored = sender._default_manager.filter(pk=instance.pk).values(
+                    *[field.attname for field in fields]
+                ).first()
+            instance._blob_names = stored or {}
+
+        def count_saved_blobs(sender, instance, fields=fields, **kwargs):
+            previous = getattr(instance, '_blob_names', {})
+            current = _field_names(instance, fields)
+            retain_blobs([name for attname, name in current.items()
+                          if is_blob_name(name) and name != previous.get(attname)])
+            release_blobs([name for attname, name in previous.items()
+                           if is_blob_name(name) and name != current.get(attname)])
+            instance._blob_names = current
+
+        def count_deleted_blobs(sender, instance, fields=fields, **kwargs):
+            release_blobs([name for name in _field_names(instance, fields).values() if is_blob_name(name)])
+
+        dispatch_uid = f'blob_refs_{model._meta.label_lower}'
+        pre_save.connect(remember_blobs, sender=model, weak=False, dispatch_uid=dispatch_uid)
+        post_save.connect(count_saved_blobs, sender=model, weak=False, dispatch_uid=dispatch_uid)
+        post_delete.connect(count_deleted_blobs, sender=model, weak=False, dispatch_uid=dispatch_uid)
+
+
+def recount_blob_references(batch_size=1000):
+    """Recompute every blob's ref_count from the rows pointing at it. Returns the number of blobs corrected"""
+    from .models import Blob
+
+    counts = defaultdict(int)
+    for model, field in blob_fields():
+        rows = model._default_manager.filter(**{f'{field.attname}__startswith': f'{BLOB_ROOT}/'}).values(
+            field.attname
+        ).annotate(references=Count('pk')).order_by()
+        for row in rows:
+            counts[row[field.attname]] += row['references']
+
+    changed = []
+    for blob in Blob.objects.only('pk', 'name', 'ref_count').iterator(chunk_size=batch_size):
+        if blob.ref_count != counts[blob.name]:
+            blob.ref_count = counts[blob.name]
+            blob.updated_at = timezone.now()
+            changed.append(blob)
+    Blob.objects.bulk_update(changed, ['ref_count', 'updated_at'], batch_size=batch_size)
+    return len(changed)
+
+
+def dedupe_media(dry_run=False):
+    """
+    Move every blob-backed file still stored under its upload path into the blob store.
+
+    Rows sharing a file are repointed with one UPDATE per file, originals are
+    removed once nothing points at them and reference counts are rebuilt at
+    the end. With dry_run the files are only hashed, to report the saving.
+    Returns a summary dict.
+    """
+    summary = {'files': 0, 'rows': 0, 'missing': 0, 'distinct': 0, 'bytes_before': 0, 'bytes_after': 0}
+    stored = {}
+    seen = set()
+
+    for model, field in blob_fields():
+        rows = model._default_manager.exclude(**{f'{field.attname}__isnull': True}).exclude(
+            **{field.attname: ''}
+        ).exclude(**{f'{field.attname}__startswith': f'{BLOB_ROOT}/'}).values_list('pk', field.attname)
+
+        pks_by_name = defaultdict(list)
+        for pk, name in rows.iterator():
+            pks_by_name[name].append(pk)
+
+        for name, pks in pks_by_name.items():
+            if name not in stored:
+                if not blob_storage.exists(name):
+                    summary['missing'] += len(pks)
+                    continue
+                sha256, size = hash_file(blob_storage.path(name))
+                summary['files'] += 1
+                summary['bytes_before'] += size
+                if sha256 not in seen:
+                    seen.add(sha256)
+                    summary['distinct'] += 1
+                    summary['bytes_after'] += size
+                stored[name] = name if dry_run else blob_storage.store_existing(name)
+
+            if not dry_run:
+                model._default_manager.filter(pk__in=pks).update(**{field.attname: stored[name]})
+            summary['rows'] += len(pks)
+
+    if not dry_run:
+        # Every row has moved to its blob, so the originals can go
+        for name in stored:
+            blob_storage.delete(name)
+        recount_blob_references()
+
+    return summary
@@ -0,0 +1,18 @@
+# dashboard/tasks.py
+from celery import shared_task
+
+from .storage import purge_unreferenced_blobs
+from .thumbnails import generate_thumbnails
+
+
+@shared_task
+def purge_unreferenced_media():
+    """Nightly removal of stored files no attachment refers to any more"""
+    purged, freed = purge_unreferenced_blobs()
+    return {'purged': purged, 'bytes_freed': freed}
+
+
+@shared_task
+def generate_image_thumbnails(name):
+    """Thumbnails and dimensions for a newly stored image"""
+    return generate_thumbnails(name)
@@ -0,0 +1,17 @@
+from django import template
+
+from applications.dashboard.thumbnails import is_image_name, thumbnail_url
+
+register = template.Library()
+
+
+@register.filter(name='thumbnail')
+def thumbnail_filter(file, size='medium'):
+    """URL of an image file's thumbnail ('small', 'medium' or 'large'), falling back to the original"""
+    return thumbnail_url(file, size)
+
+
+@register.filter(name='is_image')
+def is_image_filter(file):
+    """True when a file field holds an image"""
+    return bool(file) and is_image_name(file.name)
@@ -1,3 +1,184 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.base import ContentFile
 from django.test import TestCase
+from kombu.exceptions import OperationalError
+
+from applications.accounts.models import UserProfile
+from OpsPilot.pagination import InvalidCursor, KeysetPaginator, RankedPaginator, keyset_ordering
+
+from .models import Blob
+from .storage import connect_blob_reference_counting
+from .tasks import generate_image_thumbnails
+from .thumbnails import queue_thumbnails, thumbnail_url
+
+
+class KeysetPaginatorTests(TestCase):
+    """Cursor pages forward and back over an ordered queryset"""
+
+    def setUp(self):
+        for name in ['Alpha', 'Bravo', 'Charlie', 'Delta', 'Echo']:
+            Group.objects.create(name=name)
+        self.paginator = KeysetPaginator(Group.objects.order_by('name'), per_page=2)
+
+    def names(self, page):
+        return [group.name for group in page]
+
+    def test_pages_forward_with_after_cursors(self):
+        first = self.paginator.page()
+        second = self.paginator.page(after=first.next_cursor)
+        last = self.paginator.page(after=second.next_cursor)
+
+        self.assertEqual(self.names(first), ['Alpha', 'Bravo'])
+        self.assertEqual((first.has_previous(), first.has_next()), (False, True))
+        self.assertEqual(self.names(second), ['Charlie', 'Delta'])
+        self.assertEqual(self.names(last), ['Echo'])
+        self.assertEqual((last.has_previous(), last.has_next()), (True, False))
+        self.assertIsNone(last.next_cursor)
+
+    def test_pages_back_with_before_cursors(self):
+        second = self.paginator.page(after=self.paginator.page().next_cursor)
+        last = self.paginator.page(after=second.next_cursor)
+
+        back = self.paginator.page(before=last.previous_cursor)
+        first = self.paginator.page(before=back.previous_cursor)
+
+        self.assertEqual(self.names(back), ['Charlie', 'Delta'])
+        self.assertEqual((back.has_previous(), back.has_next()), (True, True))
+        self.assertEqual(self.names(first), ['Alpha', 'Bravo'])
+        self.assertFalse(first.has_previous())
+
+    def test_ties_are_broken_by_primary_key_in_descending_order(self):
+        User = get_user_model()
+        users = [User.objects.create(username=f'user{number}', last_name='Smith') for number in range(3)]
+        paginator = KeysetPaginator(User.objects.order_by('-last_name'), per_page=2)
+
+        first = paginator.page()
+        second = paginator.page(after=first.next_cursor)
+
+        self.assertEqual([user.pk for user in first] + [user.pk for user in second],
+                         [user.pk for user in reversed(users)])
+
+    def test_invalid_cursor_is_rejected(self):
+        with self.assertRaises(InvalidCursor):
+            self.paginator.page(after='not-a-cursor')
+
+    def test_related_ordering_cannot_be_keyed(self):
+        self.assertIsNone(keyset_ordering(get_user_model().objects.order_by('groups__name')))
+        with self.assertRaises(ValueError):
+            KeysetPaginator(get_user_model().objects.order_by('groups__name'), per_page=2)
+
+
+class RankedPaginatorTests(TestCase):
+    """Cursor pages follow an outside ranking rather than the queryset's ordering"""
+
+    def setUp(self):
+        self.groups = {name: Group.objects.create(name=name) for name in ['Alpha', 'Bravo', 'Charlie', 'Delta', 'Echo']}
+        ranked = ['Echo', 'Alpha', 'Delta', 'Bravo', 'Charlie']
+        self.paginator = RankedPaginator(Group.objects.exclude(name='Delta'),
+                                         [self.groups[name].pk for name in ranked], per_page=2, count=True)
+
+    def names(self, page):
+        return [group.name for group in page]
+
+    def test_pages_keep_the_ranking_and_skip_filtered_rows(self):
+        first = self.paginator.page()
+        second = self.paginator.page(after=first.next_cursor)
+
+        self.assertEqual(self.names(first), ['Echo', 'Alpha'])
+        self.assertEqual(self.names(second), ['Bravo', 'Charlie'])
+        self.assertEqual((second.has_previous(), second.has_next()), (True, False))
+        self.assertEqual(self.paginator.approximate_count, 4)
+
+    def test_pages_back_with_before_cursors(self):
+        second = self.paginator.page(after=self.paginator.page().next_cursor)
+        first = self.paginator.page(before=second.previous_cursor)
+
+        self.assertEqual(self.names(first), ['Echo', 'Alpha'])
+        self.assertFalse(first.has_previous())
+
+    def test_out_of_range_cursor_is_rejected(self):
+        with self.assertRaises(InvalidCursor):
+            self.paginator.page(after='9')
+
+
+class BlobReferenceCountingTests(TestCase):
+    """Blob reference counts follow the file fields that point at them"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        # Connected from the dashboard signals module, which wsgi.py loads
+        connect_blob_reference_counting()
+        self.first, self.second = [
+            get_user_model().objects.create_user(username=username).profile for username in ('alice', 'bob')
+        ]
+
+    def attach(self, profile, content, name='photo.png'):
+        profile.profile_image = ContentFile(content, name=name)
+        profile.save()
+        return profile.profile_image.name
+
+    def ref_count(self, name):
+        return Blob.objects.get(name=name).ref_count
+
+    def test_shared_content_is_stored_once_and_counted(self):
+        name = self.attach(self.first, b'same photo')
+        self.assertEqual(self.attach(self.second, b'same photo', name='copy.png'), name)
+        self.assertEqual(self.ref_count(name), 2)
+
+        replacement = self.attach(self.second, b'new photo')
+        self.assertEqual((self.ref_count(name), self.ref_count(replacement)), (1, 1))
+
+        self.first.delete()
+        self.assertEqual(self.ref_count(name), 0)
+
+    def test_saving_without_changing_the_file_keeps_the_count(self):
+        name = self.attach(self.first, b'same photo')
+
+        profile = UserProfile.objects.get(pk=self.first.pk)
+        profile.bio = 'Field technician'
+        profile.save()
+
+        self.assertEqual(self.ref_count(name), 1)
+
+
+class ThumbnailTests(TestCase):
+    """Thumbnail queuing and lookup"""
+
+    def setUp(self):
+        cache.clear()
+        self.name = 'blobs/ab/cd/abcd.jpg'
+        self.blob = Blob.objects.create(sha256='abcd', name=self.name, size=10)
+        self.file = mock.Mock()
+        self.file.name = self.name
+        self.file.url = '/media/' + self.name
+
+    def test_broker_outage_is_logged_after_commit(self):
+        with mock.patch.object(generate_image_thumbnails, 'delay', side_effect=OperationalError('down')), \
+                self.assertLogs('applications.dashboard.thumbnails', 'WARNING') as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                queue_thumbnails(self.name)
+
+        self.assertIn(self.name, logs.output[0])
+
+    def test_url_follows_the_blob_flag_without_checking_storage(self):
+        with mock.patch('applications.dashboard.thumbnails.default_storage.exists') as exists:
+            self.assertEqual(thumbnail_url(self.file, 'small'), self.file.url)
+
+            cache.clear()
+            Blob.objects.filter(pk=self.blob.pk).update(width=640, height=480)
+            self.assertEqual(thumbnail_url(self.file, 'small'), '/media/thumbs/small/abcd.webp')
+            with self.assertNumQueries(0):
+                thumbnail_url(self.file, 'large')
 
-# Create your tests here.
+        exists.assert_not_called()
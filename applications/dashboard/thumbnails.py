@@ -0,0 +1,141 @@
+# dashboard/thumbnails.py
+import io
+import logging
+import os
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from kombu.exceptions import OperationalError
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .storage import blob_storage, is_blob_name
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff')
+
+# Longest edge in pixels for each thumbnail size
+THUMBNAIL_SIZES = {
+    'small': 160,
+    'medium': 480,
+    'large': 1280,
+}
+
+THUMBNAIL_ROOT = 'thumbs'
+THUMBNAIL_QUALITY = 80
+
+# Blobs are immutable, so a known "thumbnails ready" answer never goes stale; a "not yet" is re-checked
+THUMBNAIL_PENDING_TIMEOUT = 60
+
+logger = logging.getLogger(__name__)
+
+
+def is_image_name(name):
+    return bool(name) and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def thumbnail_name(name, size):
+    """Storage path of a thumbnail; blobs are named by content, so thumbnails are shared too"""
+    return f"{THUMBNAIL_ROOT}/{size}/{os.path.splitext(os.path.basename(name))[0]}.webp"
+
+
+def _ready_key(name):
+    return f'thumbnails_ready:{name}'
+
+
+def has_thumbnails(name):
+    """
+    True once a blob's thumbnails have been generated.
+
+    generate_thumbnails() records the image's dimensions on its Blob row after
+    writing the thumbnails, so that row is the flag; the answer is cached so
+    pages listing many images don't query or stat storage per image.
+    """
+    from .models import Blob
+
+    ready = cache.get(_ready_key(name))
+    if ready is None:
+        ready = Blob.objects.filter(name=name, width__isnull=False).exists()
+        cache.set(_ready_key(name), ready, None if ready else THUMBNAIL_PENDING_TIMEOUT)
+    return ready
+
+
+def thumbnail_url(file, size='medium'):
+    """URL of a file's generated thumbnail, or of the file itself until the thumbnail exists"""
+    if not file:
+        return ''
+    name = file.name
+    if size in THUMBNAIL_SIZES and is_image_name(name) and is_blob_name(name) and has_thumbnails(name):
+        return default_storage.url(thumbnail_name(name, size))
+    return file.url
+
+
+def delete_thumbnails(name):
+    for size in THUMBNAIL_SIZES:
+        default_storage.delete(thumbnail_name(name, size))
+    cache.delete(_ready_key(name))
+
+
+def queue_thumbnails(name):
+    """Generate a new image blob's thumbnails in the background once the upload is committed"""
+    if is_image_name(name):
+        transaction.on_commit(lambda: _send_thumbnail_task(name))
+
+
+def _send_thumbnail_task(name):
+    from .tasks import generate_image_thumbnails
+
+    # The upload is already committed, so a broker outage must not fail the request;
+    # the original is shown until the generate_thumbnails command catches up
+    try:
+        generate_image_thumbnails.delay(name)
+    except OperationalError:
+        logger.warning("Could not queue thumbnails for %s; run generate_thumbnails to create them", name,
+                       exc_info=True)
+
+
+def generate_thumbnails(name, overwrite=False):
+    """
+    Write the WebP thumbnails for a stored image and record its dimensions.
+
+    The image is turned upright from its EXIF orientation, and the EXIF data
+    (camera, GPS) is left out of the thumbnails, which are what pages show
+    inline. Originals keep their bytes as uploaded: the blob store is keyed by
+    their hash, and a site photo's location is part of the record it is
+    attached to. Returns the original's (width, height), or None when the
+    file is not a readable image.
+    """
+    from .models import Blob
+
+    try:
+        with blob_storage.open(name, 'rb') as source:
+            image = Image.open(source)
+            image.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        return None
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    width, height = image.size
+
+    for size, edge in THUMBNAIL_SIZES.items():
+        thumb_name = thumbnail_name(name, size)
+        if default_storage.exists(thumb_name):
+            if not overwrite:
+                continue
+            default_storage.delete(thumb_name)
+
+        thumb = image.copy()
+        thumb.thumbnail((edge, edge), Image.LANCZOS)
+        buffer = io.BytesIO()
+        thumb.save(buffer, 'WEBP', quality=THUMBNAIL_QUALITY, method=4)
+        # Thumbnails live at fixed paths next to the blobs, outside the content-addressed store
+        default_storage.save(thumb_name, ContentFile(buffer.getvalue()))
+
+    if is_blob_name(name):
+        # The dimensions double as the flag has_thumbnails() reads
+        Blob.objects.filter(name=name).update(width=width, height=height)
+        cache.delete(_ready_key(name))
+    return width, height
@@ -2,15 +2,17 @@ from django.contrib import admin
 from .models import (
     Category, Location, Supplier, Item, StockMovement, StockAdjustment,
     PurchaseOrder, PurchaseOrderItem, InventoryCount, InventoryCountItem, 
-    ItemAttachment
+    ItemAttachment, StockValuationSnapshot, LowStockAlert, StockMovementDaily, ItemLocationBalance,
+    CostLayer, NumberSequence, Kit, KitComponent, SupplierMetrics, SupplierItemPrice
 )
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'parent', 'company', 'icon')
+    list_display = ('name', 'full_name', 'company', 'icon')
     list_filter = ('company',)
-    search_fields = ('name', 'description')
+    search_fields = ('name', 'full_name', 'description')
+    readonly_fields = ('full_name', 'path', 'depth')
 
 
 @admin.register(Location)
@@ -41,19 +43,23 @@ class StockMovementInline(admin.TabularInline):
     max_num = 10
     can_delete = False
 
+    def has_add_permission(self, request, obj=None):
+        # Movements go through the stock service so balances, rollups and costs follow
+        return False
+
 
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'company', 'quantity', 'minimum_stock', 'stock_status', 'location', 'condition')
-    list_filter = ('company', 'category', 'condition', 'is_active', 'location')
+    list_filter = ('company', 'category', 'condition', 'abc_class', 'is_active', 'location')
     search_fields = ('name', 'description', 'sku', 'tags')
-    readonly_fields = ('total_value', 'created_at', 'updated_at')
+    readonly_fields = ('total_value', 'abc_class', 'created_at', 'updated_at')
     fieldsets = (
         ('Basic Information', {
             'fields': ('name', 'description', 'sku', 'category', 'company', 'is_active', 'tags')
         }),
         ('Stock Information', {
-            'fields': ('quantity', 'minimum_stock', 'reorder_quantity', 'location', 'condition')
+            'fields': ('quantity', 'minimum_stock', 'reorder_quantity', 'location', 'condition', 'abc_class')
         }),
         ('Financial Information', {
             'fields': ('unit_price', 'total_value')
@@ -78,6 +84,10 @@ class StockMovementAdmin(admin.ModelAdmin):
     search_fields = ('item__name', 'reference_number', 'job_reference', 'notes')
     date_hierarchy = 'movement_date'
 
+    def has_add_permission(self, request):
+        # Movements go through the stock service so balances, rollups and costs follow
+        return False
+
 
 @admin.register(StockAdjustment)
 class StockAdjustmentAdmin(admin.ModelAdmin):
@@ -141,4 +151,76 @@ class InventoryCountAdmin(admin.ModelAdmin):
             'fields': ('created_by', 'completed_by', 'created_at', 'completed_at')
         }),
     )
-    inlines = [InventoryCountItemInline]
\ No newline at end of file
+    inlines = [InventoryCountItemInline]
+
+
+@admin.register(StockValuationSnapshot)
+class StockValuationSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('snapshot_date', 'category', 'company', 'location', 'item_count', 'total_quantity', 'total_value')
+    list_filter = ('company', 'category', 'location')
+    date_hierarchy = 'snapshot_date'
+
+
+@admin.register(ItemLocationBalance)
+class ItemLocationBalanceAdmin(admin.ModelAdmin):
+    list_display = ('item', 'location', 'quantity', 'updated_at')
+    list_filter = ('location',)
+    search_fields = ('item__name', 'item__sku', 'location__name')
+
+
+@admin.register(StockMovementDaily)
+class StockMovementDailyAdmin(admin.ModelAdmin):
+    list_display = ('date', 'item', 'location', 'movement_type', 'company', 'quantity_in', 'quantity_out', 'value')
+    list_filter = ('movement_type', 'company', 'location')
+    search_fields = ('item__name', 'item__sku')
+    date_hierarchy = 'date'
+
+
+@admin.register(LowStockAlert)
+class LowStockAlertAdmin(admin.ModelAdmin):
+    list_display = ('item', 'level', 'previous_quantity', 'quantity', 'minimum_stock', 'created_at', 'sent_at')
+    list_filter = ('level', 'sent_at')
+    search_fields = ('item__name', 'item__sku')
+
+
+@admin.register(CostLayer)
+class CostLayerAdmin(admin.ModelAdmin):
+    list_display = ('item', 'received_at', 'quantity', 'remaining_quantity', 'unit_cost')
+    search_fields = ('item__name', 'item__sku')
+    date_hierarchy = 'received_at'
+
+
+@admin.register(NumberSequence)
+class NumberSequenceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'prefix', 'next_value', 'updated_at')
+    list_filter = ('name',)
+    search_fields = ('prefix',)
+
+
+class KitComponentInline(admin.TabularInline):
+    model = KitComponent
+    extra = 1
+    autocomplete_fields = ('item',)
+
+
+@admin.register(Kit)
+class KitAdmin(admin.ModelAdmin):
+    list_display = ('name', 'company', 'is_active', 'updated_at')
+    list_filter = ('company', 'is_active')
+    search_fields = ('name', 'description')
+    inlines = [KitComponentInline]
+
+
+@admin.register(SupplierMetrics)
+class SupplierMetricsAdmin(admin.ModelAdmin):
+    list_display = ('supplier', 'average_lead_time_days', 'p90_lead_time_days', 'fill_rate',
+                    'open_order_count', 'open_order_value', 'computed_at')
+    search_fields = ('supplier__name',)
+
+
+@admin.register(SupplierItemPrice)
+class SupplierItemPriceAdmin(admin.ModelAdmin):
+    list_display = ('supplier', 'item', 'line_count', 'last_unit_price', 'average_unit_price',
+                    'price_change', 'last_order_date')
+    list_filter = ('supplier',)
+    search_fields = ('item__name', 'item__sku')
@@ -0,0 +1,101 @@
+# inventory/alerts.py
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mass_mail
+from django.utils import timezone
+
+from .models import Item, LowStockAlert
+
+
+# Severity of each stock level; alerts are only queued when severity increases
+LEVEL_SEVERITY = {'ok': 0, 'low': 1, 'out': 2}
+
+
+def stock_transition(previous_quantity, previous_minimum, quantity, minimum_stock):
+    """Return the new level when stock moved OK->Low, OK->Out or Low->Out, otherwise None"""
+    previous_level = Item.stock_level(previous_quantity, previous_minimum)
+    level = Item.stock_level(quantity, minimum_stock)
+    if LEVEL_SEVERITY[level] > LEVEL_SEVERITY[previous_level]:
+        return level
+    return None
+
+
+def queue_stock_alerts(changes):
+    """
+    Queue digest alerts for the stock changes that crossed into Low or Out.
+
+    `changes` is an iterable of (item_id, previous_quantity, previous_minimum,
+    quantity, minimum_stock). Everything is known by the caller, so this costs a
+    single bulk INSERT and no reads. Returns the queued alerts.
+    """
+    alerts = []
+    for item_id, previous_quantity, previous_minimum, quantity, minimum_stock in changes:
+        level = stock_transition(previous_quantity, previous_minimum, quantity, minimum_stock)
+        if level:
+            alerts.append(LowStockAlert(
+                item_id=item_id,
+                level=level,
+                previous_quantity=previous_quantity,
+                quantity=quantity,
+                minimum_stock=minimum_stock,
+            ))
+    if alerts:
+        LowStockAlert.objects.bulk_create(alerts)
+    return alerts
+
+
+def get_alert_recipients():
+    """Email addresses that receive the low stock digest"""
+    User = get_user_model()
+    return [email for email in User.objects.filter(is_superuser=True, is_active=True).values_list('email', flat=True)
+            if email]
+
+
+def send_low_stock_digest():
+    """
+    Coalesce the queued alerts into one digest email per recipient.
+
+    Alerts are reduced to the most recent one per item, and items that have
+    recovered since are left out. Every pending alert is marked as sent.
+    Returns the number of items included in the digest.
+    """
+    # Pending alerts with each item's current stock, in one query
+    pending = list(LowStockAlert.objects.filter(sent_at__isnull=True).select_related('item').order_by('created_at'))
+    if not pending:
+        return 0
+
+    alert_ids = [alert.pk for alert in pending]
+    latest = {alert.item_id: alert for alert in pending}
+
+    items = [
+        alert.item for alert in latest.values()
+        if Item.stock_level(alert.item.quantity, alert.item.minimum_stock) != 'ok'
+    ]
+    items.sort(key=lambda item: (item.quantity > 0, item.name))
+
+    recipients = get_alert_recipients()
+    if items and recipients:
+        out_count = sum(1 for item in items if item.quantity <= 0)
+        subject = f'Low Stock Digest - {len(items)} item(s), {out_count} out of stock'
+
+        lines = "\n".join(
+            f"            - {'OUT OF STOCK' if item.quantity <= 0 else 'LOW STOCK'}: {item.name}"
+            f" ({item.sku or 'no SKU'}) - {item.quantity} on hand, minimum {item.minimum_stock},"
+            f" reorder {item.reorder_quantity}\n"
+            f"              {settings.SITE_URL}/inventory/items/{item.pk}/"
+            for item in items
+        )
+        message = f"""
+            The following items dropped to low or out of stock since the last digest:
+
+{lines}
+            """
+
+        # One message per recipient, sent over a single connection
+        send_mass_mail(
+            [(subject, message, settings.DEFAULT_FROM_EMAIL, [recipient]) for recipient in recipients],
+            fail_silently=False
+        )
+
+    LowStockAlert.objects.filter(pk__in=alert_ids).update(sent_at=timezone.now())
+    return len(items)
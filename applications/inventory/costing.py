@@ -0,0 +1,356 @@
+# inventory/costing.py
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Item, StockMovement, CostLayer
+from .writes import pending_changes, update_items
+
+
+COSTING_METHODS = ('fifo', 'average')
+
+UNIT_COST_PLACES = Decimal('0.0001')
+AMOUNT_PLACES = Decimal('0.01')
+
+# Movements that move stock between locations without changing its cost; they are
+# only stamped with the cost they moved at
+UNCOSTED_MOVEMENTS = ('transfer',)
+
+# Movements whose unit price is the cost of the stock they bring in
+PRICED_RECEIPTS = ('in', 'return')
+
+# Movements the old movement form recorded as the new stock level rather than the change
+ABSOLUTE_MOVEMENTS = ('adjustment', 'count')
+
+RECOMPUTE_BATCH_SIZE = 2000
+
+
+def get_costing_method():
+    """Costing method from INVENTORY_COSTING_METHOD: 'fifo' (default) or 'average'"""
+    method = getattr(settings, 'INVENTORY_COSTING_METHOD', 'fifo')
+    return method if method in COSTING_METHODS else 'fifo'
+
+
+class ItemCost:
+    """
+    Running cost of one item's stock.
+
+    Keeps a weighted average cost and, for FIFO, the open cost layers. Stock on
+    hand that no layer accounts for (stock from before costing started) is
+    turned into an opening layer at the current average cost, so FIFO issues
+    always have layers to draw from.
+    """
+
+    def __init__(self, item_id, method, average_cost=None, layers=None):
+        self.item_id = item_id
+        self.method = method
+        self.average_cost = average_cost or Decimal('0')
+        self.layers = list(layers or [])
+        self.changed_layers = {}
+        self.new_layers = []
+
+    def _add_layer(self, quantity, unit_cost, received_at, movement_id=None, opening=False):
+        layer = CostLayer(
+            item_id=self.item_id,
+            movement_id=movement_id,
+            received_at=received_at,
+            quantity=quantity,
+            remaining_quantity=quantity,
+            unit_cost=unit_cost,
+        )
+        if opening:
+            self.layers.insert(0, layer)
+        else:
+            self.layers.append(layer)
+        self.new_layers.append(layer)
+
+    def _take_from_layers(self, quantity):
+        """Consume the oldest layers first and return their cost"""
+        cost = Decimal('0')
+        for layer in self.layers:
+            if not quantity:
+                break
+            if not layer.remaining_quantity:
+                continue
+            taken = min(quantity, layer.remaining_quantity)
+            layer.remaining_quantity -= taken
+            if layer.pk:
+                self.changed_layers[layer.pk] = layer
+            cost += taken * layer.unit_cost
+            quantity -= taken
+        # Anything no layer covers is issued at the average cost
+        return cost + quantity * self.average_cost
+
+    def sync(self, on_hand, received_at):
+        """Bring FIFO layers in line with the quantity on hand before a movement"""
+        if self.method != 'fifo':
+            return
+        layered = sum(layer.remaining_quantity for layer in self.layers)
+        if on_hand > layered:
+            self._add_layer(on_hand - layered, self.average_cost.quantize(UNIT_COST_PLACES), received_at, opening=True)
+        elif on_hand < layered:
+            self._take_from_layers(layered - max(on_hand, 0))
+
+    def receive(self, movement, quantity, on_hand_before, unit_cost):
+        """Add received stock at a unit cost and return its cost"""
+        unit_cost = Decimal(unit_cost).quantize(UNIT_COST_PLACES)
+        if self.method == 'fifo':
+            self._add_layer(quantity, unit_cost, movement.movement_date, movement_id=movement.pk)
+
+        on_hand_before = max(on_hand_before, 0)
+        self.average_cost = (on_hand_before * self.average_cost + quantity * unit_cost) / (on_hand_before + quantity)
+        return quantity * unit_cost
+
+    def issue(self, quantity):
+        """Remove issued stock and return its cost"""
+        if self.method == 'fifo':
+            return self._take_from_layers(quantity)
+        return quantity * self.average_cost
+
+    def settle(self, on_hand):
+        """Return the value of the stock on hand, updating the average cost per unit"""
+        if self.method == 'fifo':
+            value = sum((layer.remaining_quantity * layer.unit_cost for layer in self.layers), Decimal('0'))
+            if on_hand > 0:
+                self.average_cost = value / on_hand
+            return value
+        return max(on_hand, 0) * self.average_cost
+
+
+def cost_movement(state, movement, fallback_price=None):
+    """Cost one movement against an item's running cost, setting its unit_cost and cost_amount"""
+    quantity = movement.quantity
+    if not quantity:
+        return False
+
+    if not state.average_cost and fallback_price:
+        state.average_cost = Decimal(fallback_price)
+    if movement.movement_type in UNCOSTED_MOVEMENTS:
+        # The stock keeps its cost; note what it moved at without drawing on the layers
+        state.sync(movement.stock_after, movement.movement_date)
+        movement.unit_cost = state.average_cost.quantize(UNIT_COST_PLACES)
+        movement.cost_amount = (abs(quantity) * state.average_cost).quantize(AMOUNT_PLACES)
+        return True
+
+    on_hand_before = movement.stock_after - quantity
+    state.sync(on_hand_before, movement.movement_date)
+
+    if quantity > 0:
+        if movement.movement_type in PRICED_RECEIPTS and movement.unit_price is not None:
+            unit_cost = movement.unit_price
+        else:
+            unit_cost = state.average_cost
+        amount = state.receive(movement, quantity, on_hand_before, unit_cost)
+    else:
+        amount = state.issue(-quantity)
+
+    movement.cost_amount = amount.quantize(AMOUNT_PLACES)
+    movement.unit_cost = (amount / abs(quantity)).quantize(UNIT_COST_PLACES)
+    return True
+
+
+def _item_values(states, on_hand):
+    """Item rows carrying the settled average cost and stock value for bulk_update"""
+    items = []
+    for item_id, state in states.items():
+        value = state.settle(on_hand[item_id])
+        items.append(Item(
+            pk=item_id,
+            average_cost=state.average_cost.quantize(UNIT_COST_PLACES),
+            total_value=value.quantize(AMOUNT_PLACES),
+        ))
+    return items
+
+
+def _save_layers(states):
+    CostLayer.objects.bulk_create([layer for state in states.values() for layer in state.new_layers])
+    CostLayer.objects.bulk_update(
+        [layer for state in states.values() for layer in state.changed_layers.values()],
+        ['remaining_quantity']
+    )
+
+
+def cost_movements(movements):
+    """
+    Cost newly recorded movements incrementally.
+
+    The items' running costs and open FIFO layers are loaded once, the movements
+    are costed in ledger order in memory, and movements, layers and item values
+    are written back with bulk operations. Item total_value becomes the value
+    of the stock at cost rather than at the last receipt price; the item write
+    joins any open coalesce_item_writes() block.
+    """
+    movements = sorted(
+        [movement for movement in movements if movement.quantity],
+        key=lambda movement: (movement.item_id, movement.movement_date, movement.pk or 0)
+    )
+    if not movements:
+        return
+
+    method = get_costing_method()
+    item_ids = {movement.item_id for movement in movements}
+
+    with transaction.atomic():
+        items = {}
+        for pk, average_cost, unit_price in Item.objects.select_for_update().filter(
+                pk__in=item_ids).values_list('pk', 'average_cost', 'unit_price'):
+            # Costs from earlier movements in the same unit of work aren't written yet. The unit price
+            # is taken as stored, from before the receipts being costed, since it values the opening stock
+            items[pk] = (pending_changes(pk).get('average_cost', average_cost), unit_price)
+
+        layers = defaultdict(list)
+        if method == 'fifo':
+            for layer in CostLayer.objects.filter(item_id__in=item_ids, remaining_quantity__gt=0).order_by(
+                    'received_at', 'id'):
+                layers[layer.item_id].append(layer)
+
+        states, on_hand = {}, {}
+        for movement in movements:
+            state = states.get(movement.item_id)
+            if state is None:
+                average_cost, unit_price = items[movement.item_id]
+                state = states[movement.item_id] = ItemCost(
+                    movement.item_id, method, average_cost if average_cost is not None else unit_price,
+                    layers[movement.item_id]
+                )
+            cost_movement(state, movement, items[movement.item_id][1])
+            on_hand[movement.item_id] = movement.stock_after
+
+        _save_layers(states)
+        StockMovement.objects.bulk_update(movements, ['unit_cost', 'cost_amount'])
+        update_items({
+            item.pk: {'average_cost': item.average_cost, 'total_value': item.total_value}
+            for item in _item_values(states, on_hand)
+        })
+
+
+def recompute_costs(progress_callback=None):
+    """
+    Rebuild every cost from the whole ledger in one streaming pass.
+
+    Movements are read in (item, movement_date) order in chunks, so only one
+    item's running cost is held at a time. Cost layers are rebuilt from
+    scratch and movements and items are written back in batches; items with
+    no movements are valued as opening stock at their unit price. Adjustment
+    and count rows from the old movement form stored the new absolute
+    quantity instead of the change, so those are rewritten as deltas against
+    the item's running balance. Returns a summary dict.
+    """
+    method = get_costing_method()
+    items = {
+        pk: (quantity, unit_price)
+        for pk, quantity, unit_price in Item.objects.values_list('pk', 'quantity', 'unit_price')
+    }
+    summary = {'items': 0, 'movements': 0, 'normalised': 0}
+
+    with transaction.atomic():
+        CostLayer.objects.all().delete()
+
+        costed, normalised, item_rows = [], [], []
+        seen = set()
+        state = None
+        stock_before = None
+
+        def finish_item(state):
+            # Settle against the current quantity, which the last movement should match
+            quantity = items[state.item_id][0]
+            state.sync(quantity, timezone.now())
+            states = {state.item_id: state}
+            _save_layers(states)
+            item_rows.extend(_item_values(states, {state.item_id: quantity}))
+            summary['items'] += 1
+
+        def flush(final=False):
+            nonlocal costed, normalised, item_rows
+            flushed = False
+            if costed and (final or len(costed) >= RECOMPUTE_BATCH_SIZE):
+                StockMovement.objects.bulk_update(costed, ['unit_cost', 'cost_amount'])
+                summary['movements'] += len(costed)
+                costed, flushed = [], True
+            if normalised and (final or len(normalised) >= RECOMPUTE_BATCH_SIZE):
+                StockMovement.objects.bulk_update(normalised, ['quantity'])
+                summary['normalised'] += len(normalised)
+                normalised, flushed = [], True
+            if item_rows and (final or len(item_rows) >= RECOMPUTE_BATCH_SIZE):
+                Item.objects.bulk_update(item_rows, ['average_cost', 'total_value'])
+                item_rows, flushed = [], True
+            if flushed and progress_callback:
+                progress_callback(summary)
+
+        movements = StockMovement.objects.order_by('item_id', 'movement_date', 'id').only(
+            'pk', 'item_id', 'quantity', 'movement_type', 'movement_date', 'stock_after', 'unit_price'
+        ).iterator(chunk_size=RECOMPUTE_BATCH_SIZE)
+
+        for movement in movements:
+            if state is None or state.item_id != movement.item_id:
+                if state is not None:
+                    finish_item(state)
+                unit_price = items[movement.item_id][1]
+                state = ItemCost(movement.item_id, method, unit_price)
+                seen.add(movement.item_id)
+                stock_before = None
+
+            # A legacy absolute row records the new level as its quantity
+            if (movement.movement_type in ABSOLUTE_MOVEMENTS and stock_before is not None
+                    and movement.quantity == movement.stock_after
+                    and movement.quantity != movement.stock_after - stock_before):
+                movement.quantity = movement.stock_after - stock_before
+                normalised.append(movement)
+            stock_before = movement.stock_after
+
+            if cost_movement(state, movement, items[movement.item_id][1]):
+                costed.append(movement)
+            flush()
+
+        if state is not None:
+            finish_item(state)
+
+        # Items that never moved are valued as they stand
+        for item_id, (quantity, unit_price) in items.items():
+            if item_id in seen:
+                continue
+            if unit_price is None:
+                item_rows.append(Item(pk=item_id, average_cost=None, total_value=None))
+                summary['items'] += 1
+            else:
+                finish_item(ItemCost(item_id, method, unit_price))
+            flush()
+
+        flush(final=True)
+
+    return summary
+
+
+def _cost_sum(movement_type):
+    return Coalesce(
+        Sum('cost_amount', filter=Q(movement_type=movement_type)),
+        Value(Decimal('0')),
+        output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+
+
+def cost_of_goods_by_job(movements=None):
+    """
+    Cost of stock issued to each job reference, net of returns.
+
+    Returns rows of job_reference, issued_cost, returned_cost, net_cost and
+    movement_count from one grouped query over the costed movements.
+    """
+    movements = StockMovement.objects.all() if movements is None else movements
+    return movements.exclude(job_reference='').filter(
+        movement_type__in=['out', 'return']
+    ).values('job_reference').annotate(
+        issued_cost=_cost_sum('out'),
+        returned_cost=_cost_sum('return'),
+        movement_count=Count('id'),
+    ).annotate(
+        net_cost=ExpressionWrapper(
+            F('issued_cost') - F('returned_cost'),
+            output_field=DecimalField(max_digits=14, decimal_places=2)
+        )
+    ).order_by('job_reference')
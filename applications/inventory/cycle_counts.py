@@ -0,0 +1,216 @@
+# inventory/cycle_counts.py
+from collections import Counter
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .models import Item, StockMovementDaily, Location, InventoryCount, InventoryCountItem
+from .sequences import allocate_numbers
+from .services import stock_at_location
+
+
+# Days between counts for each class
+CYCLE_COUNT_INTERVALS = {
+    'A': 7,
+    'B': 30,
+    'C': 90,
+}
+
+CYCLE_COUNT_NOTE = 'Cycle count generated by the ABC scheduler'
+
+# Counts create adjustments, so they would feed back into the velocity that schedules them
+VELOCITY_EXCLUDED_MOVEMENTS = ('adjustment',)
+
+
+# Class letters by rank, 0 being the most important
+ABC_CLASSES = np.array(['A', 'B', 'C'])
+
+
+def pareto_ranks(scores, a_share=0.8, b_share=0.95):
+    """
+    Class rank (0 = A, 1 = B, 2 = C) for each score by where it falls in the cumulative share of the total.
+
+    The highest scores that make up the first `a_share` of the total are A,
+    those up to `b_share` are B and the rest, with every zero score, are C.
+    """
+    ranks = np.full(len(scores), 2, dtype=np.int8)
+    total = scores.sum()
+    if total <= 0:
+        return ranks
+
+    order = np.argsort(-scores, kind='stable')
+    ranked_scores = scores[order]
+
+    # Share of the total held by the items ranked above each item
+    before = (np.cumsum(ranked_scores) - ranked_scores) / total
+    ranked = np.where(before < a_share, 0, np.where(before < b_share, 1, 2))
+    ranked[ranked_scores <= 0] = 2
+    ranks[order] = ranked
+    return ranks
+
+
+class ABCClassifier:
+    """
+    Classify every active item as A, B or C by stock value and movement velocity.
+
+    Stock values come from Item.total_value and velocity from the number of
+    movements per item over the lookback window in the daily movement rollup,
+    both loaded once into NumPy arrays. Each measure gets its own Pareto split
+    and an item takes the better of its two classes, so a cheap item that is
+    picked all the time is counted as often as an expensive one.
+    """
+
+    def __init__(self, lookback_days=90, a_share=0.8, b_share=0.95):
+        self.lookback_days = lookback_days
+        self.a_share = a_share
+        self.b_share = b_share
+        self.today = timezone.localdate()
+
+    def load_items(self):
+        """Return (sorted item ids, stock values, current classes) for active items"""
+        item_ids, values, current = [], [], []
+        for pk, total_value, abc_class in Item.objects.filter(is_active=True).order_by('pk').values_list(
+                'pk', 'total_value', 'abc_class').iterator(chunk_size=5000):
+            item_ids.append(pk)
+            values.append(float(total_value or 0))
+            current.append(abc_class)
+        return np.asarray(item_ids, dtype=np.int64), np.asarray(values, dtype=np.float64), current
+
+    def load_velocity(self, item_ids):
+        """Movements per item over the lookback window, aligned with the sorted item ids"""
+        start = self.today - timezone.timedelta(days=self.lookback_days - 1)
+        rows = StockMovementDaily.objects.filter(
+            date__gte=start,
+            movement_count__gt=0
+        ).exclude(
+            movement_type__in=VELOCITY_EXCLUDED_MOVEMENTS
+        ).values_list('item_id', 'movement_count').iterator(chunk_size=5000)
+
+        velocity = np.zeros(len(item_ids))
+        rows = np.fromiter((value for row in rows for value in row), dtype=np.int64).reshape(-1, 2)
+        if not len(rows) or not len(item_ids):
+            return velocity
+
+        # Rollup rows of items that are no longer active are dropped
+        positions = np.minimum(np.searchsorted(item_ids, rows[:, 0]), len(item_ids) - 1)
+        known = item_ids[positions] == rows[:, 0]
+        np.add.at(velocity, positions[known], rows[known, 1].astype(np.float64))
+        return velocity
+
+    def classify(self):
+        """Return (item ids, classes, current classes) for every active item"""
+        item_ids, values, current = self.load_items()
+        if not len(item_ids):
+            return item_ids, ABC_CLASSES[:0], current
+
+        value_ranks = pareto_ranks(np.maximum(values, 0), self.a_share, self.b_share)
+        velocity_ranks = pareto_ranks(self.load_velocity(item_ids), self.a_share, self.b_share)
+        return item_ids, ABC_CLASSES[np.minimum(value_ranks, velocity_ranks)], current
+
+    def run(self):
+        """Classify the catalogue and save the classes that changed. Returns the number of items per class"""
+        item_ids, classes, current = self.classify()
+
+        changed = [
+            Item(pk=int(item_id), abc_class=str(abc_class))
+            for item_id, abc_class, previous in zip(item_ids, classes, current)
+            if abc_class != previous
+        ]
+        Item.objects.bulk_update(changed, ['abc_class'], batch_size=1000)
+
+        summary = {abc_class: 0 for abc_class in CYCLE_COUNT_INTERVALS}
+        summary.update(Counter(str(abc_class) for abc_class in classes))
+        summary['changed'] = len(changed)
+        return summary
+
+
+class CycleCountScheduler:
+    """
+    Raise the night's cycle counts, one small count per location.
+
+    An item is due when it has never been counted or its last count is older
+    than its class interval; unclassified items follow the slowest interval.
+    Due items are taken A first and then longest uncounted, up to `max_items`
+    per location, so each session covers a slice of the location and the rest
+    roll over to the next nights. Items already on an open count are skipped.
+    """
+
+    def __init__(self, max_items=40, intervals=None):
+        self.max_items = max_items
+        self.intervals = intervals or CYCLE_COUNT_INTERVALS
+        self.today = timezone.localdate()
+
+    def due_items(self):
+        """Due items in the order they should be counted"""
+        due = Q(last_counted_date__isnull=True) | Q(
+            abc_class='',
+            last_counted_date__lte=self.today - timezone.timedelta(days=max(self.intervals.values()))
+        )
+        for abc_class, days in self.intervals.items():
+            due |= Q(abc_class=abc_class, last_counted_date__lte=self.today - timezone.timedelta(days=days))
+
+        return Item.objects.filter(
+            due,
+            is_active=True,
+            location__is_active=True
+        ).exclude(
+            inventorycountitem__inventory_count__status='in_progress'
+        ).annotate(
+            class_rank=Case(
+                When(abc_class='A', then=Value(0)),
+                When(abc_class='B', then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField()
+            )
+        ).order_by('class_rank', F('last_counted_date').asc(nulls_first=True), 'pk')
+
+    def plan(self):
+        """Return {location id: [(item id, quantity)]} with at most max_items per location"""
+        batches = {}
+        for item_id, location_id, quantity in self.due_items().values_list(
+                'pk', 'location_id', 'quantity').iterator(chunk_size=5000):
+            batch = batches.setdefault(location_id, [])
+            if len(batch) < self.max_items:
+                batch.append((item_id, quantity))
+        return batches
+
+    def create_counts(self, batches):
+        """Create an in-progress count per location batch with bulk inserts. Returns the counts"""
+        if not batches:
+            return []
+
+        companies = dict(Location.objects.filter(pk__in=batches).values_list('pk', 'company'))
+        with transaction.atomic():
+            # Reserve the count references in one block per company
+            numbers = {
+                company: iter(allocate_numbers('inventory_count', count=count, company=company))
+                for company, count in Counter(companies[location_id] for location_id in batches).items()
+            }
+
+            counts = InventoryCount.objects.bulk_create([
+                InventoryCount(
+                    count_reference=next(numbers[companies[location_id]]),
+                    location_id=location_id,
+                    company=companies[location_id],
+                    count_date=self.today,
+                    notes=CYCLE_COUNT_NOTE,
+                )
+                for location_id in batches
+            ])
+
+            # Each count expects the stock held at its own location, not the item totals
+            lines = []
+            for count, items in zip(counts, batches.values()):
+                stock = stock_at_location([item_id for item_id, quantity in items], count.location_id)
+                lines.extend(
+                    InventoryCountItem(inventory_count=count, item_id=item_id, expected_quantity=stock[item_id])
+                    for item_id, quantity in items
+                )
+            InventoryCountItem.objects.bulk_create(lines)
+        return counts
+
+    def run(self):
+        """Plan and create the night's cycle counts. Returns the created counts"""
+        return self.create_counts(self.plan())
@@ -0,0 +1,87 @@
+# inventory/exports.py
+import csv
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+
+# (header, values_list lookup) for stock movement exports
+MOVEMENT_EXPORT_COLUMNS = (
+    ('Date', 'movement_date'),
+    ('Item', 'item__name'),
+    ('SKU', 'item__sku'),
+    ('Company', 'item__company'),
+    ('Type', 'movement_type'),
+    ('Quantity', 'quantity'),
+    ('Stock After', 'stock_after'),
+    ('Unit Price', 'unit_price'),
+    ('From Location', 'source_location__name'),
+    ('To Location', 'destination_location__name'),
+    ('Reference', 'reference_number'),
+    ('Job Reference', 'job_reference'),
+    ('Notes', 'notes'),
+)
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object that hands each written line straight back to the csv writer"""
+
+    def write(self, value):
+        return value
+
+
+def movement_export_rows(queryset):
+    """Yield export rows for movements, reading only the needed columns in chunks"""
+    lookups = [lookup for header, lookup in MOVEMENT_EXPORT_COLUMNS]
+    for row in queryset.values_list(*lookups).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        # Spreadsheets can't hold timezone-aware datetimes
+        yield (timezone.localtime(row[0]).replace(tzinfo=None),) + row[1:]
+
+
+def stream_csv(filename, header, rows):
+    """Stream rows to the client as CSV without building the file in memory"""
+    writer = csv.writer(Echo())
+
+    def generate():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(generate(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def stream_xlsx(filename, header, rows):
+    """Write rows to a write-only workbook on disk and stream the file back"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+    worksheet.append(header)
+    for row in rows:
+        worksheet.append(row)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+
+def export_movements(queryset, export_format, filename_base):
+    """Return a streamed CSV or XLSX download of the given movements"""
+    header = [header for header, lookup in MOVEMENT_EXPORT_COLUMNS]
+    rows = movement_export_rows(queryset)
+
+    if export_format == 'xlsx':
+        return stream_xlsx(f'{filename_base}.xlsx', header, rows)
+    return stream_csv(f'{filename_base}.csv', header, rows)
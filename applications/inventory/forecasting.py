@@ -0,0 +1,230 @@
+# inventory/forecasting.py
+import math
+from collections import Counter
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Item, StockMovementDaily, PurchaseOrder, PurchaseOrderItem, SupplierMetrics
+from .sequences import allocate_numbers
+from .supplier_metrics import lead_time_stats
+from .summary import invalidate_dashboard_summary
+
+
+# Statuses whose outstanding lines count as stock already on order
+OPEN_PO_STATUSES = ['draft', 'submitted', 'approved', 'ordered', 'partially_received']
+
+DRAFT_PO_NOTE = 'Generated by the reorder engine'
+
+
+class ReorderEngine:
+    """
+    Forecast consumption from the movement ledger and raise draft purchase orders.
+
+    'Out' totals for the lookback window are loaded once from the daily movement
+    rollup into NumPy arrays and binned into an item x day demand matrix. Daily
+    demand rate (a blend of the recent window and the full lookback), its
+    variability, supplier lead times and safety stock are then computed for the
+    whole catalogue with vectorized operations. Items whose stock plus open orders fall to the reorder point get a
+    line on a draft purchase order for their supplier.
+    """
+
+    def __init__(self, lookback_days=180, recent_days=30, review_days=30, service_z=1.65,
+                 default_lead_time_days=14):
+        self.lookback_days = lookback_days
+        self.recent_days = recent_days
+        self.review_days = review_days
+        self.service_z = service_z
+        self.default_lead_time_days = default_lead_time_days
+        self.today = timezone.localdate()
+
+    def load_demand(self):
+        """Return (item ids, item x day demand matrix) for the lookback window, read from the daily rollup"""
+        start = self.today - timezone.timedelta(days=self.lookback_days - 1)
+        rows = StockMovementDaily.objects.filter(
+            movement_type='out',
+            date__gte=start,
+            quantity_out__gt=0
+        ).values_list('item_id', 'date', 'quantity_out').iterator(chunk_size=5000)
+
+        item_ids, days, quantities = [], [], []
+        for item_id, date, quantity in rows:
+            item_ids.append(item_id)
+            days.append((date - start).days)
+            quantities.append(quantity)
+
+        if not item_ids:
+            return np.array([], dtype=np.int64), np.zeros((0, self.lookback_days))
+
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        unique_ids, rows_index = np.unique(item_ids, return_inverse=True)
+        days = np.clip(np.asarray(days, dtype=np.int64), 0, self.lookback_days - 1)
+
+        # Rollup rows for other locations on the same day add together
+        demand = np.zeros((len(unique_ids), self.lookback_days))
+        np.add.at(demand, (rows_index, days), np.asarray(quantities, dtype=np.float64))
+        return unique_ids, demand
+
+    def load_lead_times(self):
+        """
+        Return {supplier id: (mean lead time days, p90 lead time days)}.
+
+        Read from the precomputed supplier metrics, falling back to the order
+        history when they haven't been computed yet.
+        """
+        lead_times = {
+            supplier_id: (average, p90)
+            for supplier_id, average, p90 in SupplierMetrics.objects.filter(
+                average_lead_time_days__isnull=False
+            ).values_list('supplier_id', 'average_lead_time_days', 'p90_lead_time_days')
+        }
+        if lead_times or SupplierMetrics.objects.exists():
+            return lead_times
+        return {supplier_id: (average, p90) for supplier_id, (_, average, p90) in lead_time_stats().items()}
+
+    def forecast(self):
+        """
+        Compute reorder parameters for every item with recent consumption.
+
+        Returns a dict of item id -> {'daily_rate', 'lead_time', 'safety_stock',
+        'reorder_point', 'order_up_to'}.
+        """
+        item_ids, demand = self.load_demand()
+        if not len(item_ids):
+            return {}
+
+        # Rolling consumption: blend the most recent window with the full lookback
+        recent = demand[:, -self.recent_days:].mean(axis=1)
+        long_run = demand.mean(axis=1)
+        daily_rate = 0.5 * recent + 0.5 * long_run
+        daily_std = demand.std(axis=1)
+
+        # Lead time per item from its supplier's delivery history
+        item_suppliers = dict(Item.objects.filter(pk__in=item_ids.tolist()).values_list('pk', 'supplier_id'))
+        supplier_lead_times = self.load_lead_times()
+        lead_time = np.array([
+            supplier_lead_times.get(item_suppliers.get(int(item_id)), (self.default_lead_time_days,))[0]
+            for item_id in item_ids
+        ], dtype=np.float64)
+
+        safety_stock = self.service_z * daily_std * np.sqrt(np.maximum(lead_time, 1))
+        reorder_point = daily_rate * lead_time + safety_stock
+        order_up_to = reorder_point + daily_rate * self.review_days
+
+        return {
+            int(item_id): {
+                'daily_rate': float(daily_rate[index]),
+                'lead_time': float(lead_time[index]),
+                'safety_stock': float(safety_stock[index]),
+                'reorder_point': float(reorder_point[index]),
+                'order_up_to': float(order_up_to[index]),
+            }
+            for index, item_id in enumerate(item_ids)
+        }
+
+    def on_order_quantities(self):
+        """Outstanding quantity per item on open purchase orders, in one grouped query"""
+        return dict(
+            PurchaseOrderItem.objects.filter(
+                purchase_order__status__in=OPEN_PO_STATUSES
+            ).values('item_id').annotate(
+                outstanding=Sum(F('quantity_ordered') - F('quantity_received'))
+            ).values_list('item_id', 'outstanding')
+        )
+
+    def suggest(self, forecast=None):
+        """Return a list of (item, quantity, parameters) that should be reordered now"""
+        forecast = self.forecast() if forecast is None else forecast
+        if not forecast:
+            return []
+
+        on_order = self.on_order_quantities()
+        suggestions = []
+        items = Item.objects.filter(pk__in=list(forecast), is_active=True, supplier__isnull=False).only(
+            'pk', 'name', 'quantity', 'reorder_quantity', 'unit_price', 'supplier', 'company'
+        )
+        for item in items:
+            parameters = forecast[item.pk]
+            position = item.quantity + (on_order.get(item.pk) or 0)
+            if position > parameters['reorder_point']:
+                continue
+
+            quantity = max(math.ceil(parameters['order_up_to'] - position), item.reorder_quantity)
+            if quantity > 0:
+                suggestions.append((item, quantity, parameters))
+        return suggestions
+
+    def update_stock_levels(self, forecast):
+        """Write forecast reorder points and quantities onto items' minimum_stock and reorder_quantity"""
+        items = [
+            Item(
+                pk=item_id,
+                minimum_stock=math.ceil(parameters['reorder_point']),
+                reorder_quantity=math.ceil(parameters['daily_rate'] * self.review_days),
+            )
+            for item_id, parameters in forecast.items()
+        ]
+        Item.objects.bulk_update(items, ['minimum_stock', 'reorder_quantity'], batch_size=1000)
+        invalidate_dashboard_summary()
+
+    def create_draft_orders(self, suggestions):
+        """
+        Create one draft purchase order per supplier and company, with orders and lines bulk-inserted.
+
+        Order numbers are reserved from the purchase order sequence in one block
+        per company up front, so the orders can go in with a single INSERT.
+        """
+        grouped = {}
+        for item, quantity, parameters in suggestions:
+            company = item.company if item.company in ('wisp', 'fno') else 'wisp'
+            grouped.setdefault((item.supplier_id, company), []).append((item, quantity))
+        if not grouped:
+            return []
+
+        with transaction.atomic():
+            numbers = {
+                company: iter(allocate_numbers('purchase_order', count=count, company=company))
+                for company, count in Counter(company for _, company in grouped).items()
+            }
+
+            orders, order_lines = [], []
+            for (supplier_id, company), lines in grouped.items():
+                po_items = [
+                    PurchaseOrderItem(
+                        item=item,
+                        quantity_ordered=quantity,
+                        unit_price=item.unit_price or 0,
+                        line_total=quantity * (item.unit_price or 0),
+                    )
+                    for item, quantity in lines
+                ]
+                subtotal = sum(po_item.line_total for po_item in po_items)
+                orders.append(PurchaseOrder(
+                    order_number=next(numbers[company]),
+                    supplier_id=supplier_id,
+                    company=company,
+                    status='draft',
+                    subtotal=subtotal,
+                    total=subtotal,
+                    notes=DRAFT_PO_NOTE,
+                ))
+                order_lines.append(po_items)
+
+            orders = PurchaseOrder.objects.bulk_create(orders)
+            for purchase_order, po_items in zip(orders, order_lines):
+                for po_item in po_items:
+                    po_item.purchase_order = purchase_order
+            PurchaseOrderItem.objects.bulk_create([po_item for po_items in order_lines for po_item in po_items])
+
+            # Bulk writes skip the save signals
+            invalidate_dashboard_summary()
+        return orders
+
+    def run(self, update_levels=False):
+        """Forecast the whole catalogue and raise draft orders. Returns the created orders"""
+        forecast = self.forecast()
+        if update_levels:
+            self.update_stock_levels(forecast)
+        return self.create_draft_orders(self.suggest(forecast))
@@ -1,10 +1,16 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
 from django import forms
+from django.db.models import Q
+from django.urls import reverse_lazy
 from django.utils import timezone
 from .models import (
     Category, Location, Supplier, Item, StockMovement, StockAdjustment,
     PurchaseOrder, PurchaseOrderItem, InventoryCount, InventoryCountItem,
-    ItemAttachment
+    ItemAttachment, Kit, KitComponent
 )
+from .services import stock_at_location
 
 
 class CategoryForm(forms.ModelForm):
@@ -256,6 +262,129 @@ class PurchaseOrderItemForm(forms.ModelForm):
         return instance
 
 
+class PurchaseOrderLinesForm(forms.Form):
+    """Form for adding many lines to a purchase order from a pasted list or a supplier quote"""
+    lines = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 12}),
+        help_text='One item per line: SKU or supplier part number, quantity and an optional unit price, '
+                  'separated by tabs, commas or semicolons'
+    )
+    file = forms.FileField(
+        required=False,
+        help_text='Supplier quote as CSV or XLSX with sku (or supplier_part_number), quantity and unit_price columns'
+    )
+
+    def __init__(self, *args, **kwargs):
+        self.purchase_order = kwargs.pop('purchase_order')
+        super().__init__(*args, **kwargs)
+
+        # Add Bootstrap classes
+        self.fields['lines'].widget.attrs['class'] = 'form-control font-monospace'
+        self.fields['file'].widget.attrs['class'] = 'form-control'
+
+    def _pasted_rows(self, text):
+        """(label, identifier, quantity, unit price) for each pasted line, skipping a header line"""
+        rows = []
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            separator = '\t' if '\t' in line else ';' if ';' in line else ','
+            values = [value.strip() for value in line.split(separator)] + ['', '']
+            rows.append((f'Line {line_number}', values[0], values[1], values[2]))
+
+        # A pasted spreadsheet usually starts with its column headings
+        if rows and not rows[0][2].isdigit():
+            rows = rows[1:]
+        return rows
+
+    def _quote_rows(self, file):
+        """(label, identifier, quantity, unit price) for each row of an uploaded quote"""
+        from .importers import read_rows
+
+        return [
+            (
+                f'Row {row_number}',
+                str(row.get('sku') or row.get('supplier_part_number') or row.get('part_number') or '').strip(),
+                str(row.get('quantity') or row.get('qty') or '').strip(),
+                str(row.get('unit_price') or row.get('price') or '').strip(),
+            )
+            for row_number, row in read_rows(file, file.name)
+        ]
+
+    def clean_file(self):
+        file = self.cleaned_data.get('file')
+        if file and not file.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError('Upload a .csv or .xlsx file.')
+        return file
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+
+        rows = []
+        if cleaned_data.get('lines'):
+            rows += self._pasted_rows(cleaned_data['lines'])
+        if cleaned_data.get('file'):
+            rows += self._quote_rows(cleaned_data['file'])
+        if not rows:
+            raise forms.ValidationError('Paste at least one line or upload a supplier quote')
+
+        # Resolve every SKU and supplier part number in one query
+        identifiers = {identifier for _, identifier, _, _ in rows if identifier}
+        by_sku, by_part_number, by_own_part_number = defaultdict(list), defaultdict(list), defaultdict(list)
+        for item in Item.objects.filter(is_active=True).filter(
+                Q(sku__in=identifiers) | Q(supplier_part_number__in=identifiers)).order_by('name'):
+            if item.sku:
+                by_sku[item.sku].append(item)
+            if item.supplier_part_number:
+                by_part_number[item.supplier_part_number].append(item)
+                if item.supplier_id == self.purchase_order.supplier_id:
+                    by_own_part_number[item.supplier_part_number].append(item)
+
+        errors = []
+        quantities = {}
+        for label, identifier, quantity, unit_price in rows:
+            # A SKU wins over a part number, and the order's own supplier over other suppliers
+            matches = by_sku.get(identifier) or by_own_part_number.get(identifier) or by_part_number.get(identifier)
+            if not matches:
+                errors.append(f'{label}: no active item with SKU or part number "{identifier}"')
+                continue
+            if len(matches) > 1:
+                names = ', '.join(item.name for item in matches)
+                errors.append(f'{label}: "{identifier}" matches more than one active item ({names})')
+                continue
+            item = matches[0]
+            try:
+                quantity = int(quantity)
+                if quantity < 1:
+                    raise ValueError
+            except ValueError:
+                errors.append(f'{label}: quantity must be a whole number above zero')
+                continue
+            try:
+                unit_price = Decimal(unit_price.replace(',', '')) if unit_price else None
+                if unit_price is not None and (not unit_price.is_finite() or unit_price < 0):
+                    raise InvalidOperation
+            except InvalidOperation:
+                errors.append(f'{label}: "{unit_price}" is not a valid unit price')
+                continue
+
+            # The same item at the same price becomes one line
+            key = (item.pk, unit_price)
+            if key in quantities:
+                quantities[key][1] += quantity
+            else:
+                quantities[key] = [item, quantity, unit_price]
+
+        if errors:
+            raise forms.ValidationError(errors)
+
+        cleaned_data['parsed_lines'] = [tuple(line) for line in quantities.values()]
+        return cleaned_data
+
+
 class InventoryCountForm(forms.ModelForm):
     """Form for creating inventory counts"""
 
@@ -317,8 +446,10 @@ class InventoryCountItemForm(forms.ModelForm):
         if self.inventory_count and not instance.pk:
             instance.inventory_count = self.inventory_count
 
-            # Set expected quantity from current item quantity
-            instance.expected_quantity = instance.item.quantity
+            # Expect the stock held at the counted location, not the item's total
+            instance.expected_quantity = stock_at_location(
+                [instance.item_id], self.inventory_count.location_id
+            )[instance.item_id]
 
         # Calculate discrepancy
         if instance.counted_quantity is not None:
@@ -366,7 +497,13 @@ class ItemFilterForm(forms.Form):
         choices=STOCK_STATUS_CHOICES,
         required=False
     )
-    search = forms.CharField(required=False)
+    search = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={
+            'autocomplete': 'off',
+            'data-search-url': reverse_lazy('inventory:item_search'),
+        })
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -460,4 +597,133 @@ class ReceiveItemsForm(forms.Form):
 
             # If the item has a default location, preselect it
             if self.po_item.item.location:
-                self.fields['location'].initial = self.po_item.item.location.pk
\ No newline at end of file
+                self.fields['location'].initial = self.po_item.item.location.pk
+
+
+class ReceivePurchaseOrderForm(forms.Form):
+    """Form for receiving a whole delivery against a purchase order"""
+    location = forms.ModelChoiceField(
+        queryset=Location.objects.filter(is_active=True),
+        required=False,
+        empty_label="Item's default location"
+    )
+    receive_all = forms.BooleanField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        self.purchase_order = kwargs.pop('purchase_order')
+        super().__init__(*args, **kwargs)
+
+        self.fields['location'].widget.attrs['class'] = 'form-select'
+
+        # One quantity field per outstanding line
+        self.outstanding_lines = [
+            line for line in self.purchase_order.items.select_related('item')
+            if not line.is_fully_received()
+        ]
+        for line in self.outstanding_lines:
+            remaining = line.quantity_ordered - line.quantity_received
+            self.fields[f'receive_{line.pk}'] = forms.IntegerField(
+                min_value=0,
+                max_value=remaining,
+                required=False,
+                label=line.item.name,
+                help_text=f'Maximum: {remaining}',
+                widget=forms.NumberInput(attrs={'class': 'form-control'})
+            )
+            line.receive_field = self[f'receive_{line.pk}']
+
+    def clean(self):
+        cleaned_data = super().clean()
+
+        # Receive everything outstanding, or only the lines with a quantity entered
+        quantities = {}
+        for line in self.outstanding_lines:
+            if cleaned_data.get('receive_all'):
+                quantities[line.pk] = line.quantity_ordered - line.quantity_received
+            elif cleaned_data.get(f'receive_{line.pk}'):
+                quantities[line.pk] = cleaned_data[f'receive_{line.pk}']
+
+        if not quantities:
+            raise forms.ValidationError('Enter a quantity for at least one item')
+
+        cleaned_data['quantities'] = quantities
+        return cleaned_data
+
+    def add_receipt_error(self, error):
+        """Attach an OverReceiptError to the quantity field of the line it was raised for"""
+        field = f'receive_{error.line.pk}'
+        self.add_error(field if field in self.fields else None, str(error))
+
+
+class ItemImportForm(forms.Form):
+    """Form for uploading a CSV or XLSX file of items and opening quantities"""
+    file = forms.FileField(help_text='CSV or XLSX with a header row')
+    dry_run = forms.BooleanField(required=False, initial=True, help_text='Validate only, nothing is saved')
+    start_row = forms.IntegerField(min_value=2, required=False, help_text='Resume from this spreadsheet row')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Add Bootstrap classes
+        self.fields['file'].widget.attrs['class'] = 'form-control'
+        self.fields['start_row'].widget.attrs['class'] = 'form-control'
+        self.fields['dry_run'].widget.attrs['class'] = 'form-check-input'
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if not file.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError('Upload a .csv or .xlsx file.')
+        return file
+
+
+class KitForm(forms.ModelForm):
+    """Form for creating and editing kits"""
+
+    class Meta:
+        model = Kit
+        fields = ['name', 'description', 'company', 'is_active']
+        widgets = {
+            'description': forms.Textarea(attrs={'rows': 3}),
+        }
+
+
+class KitComponentForm(forms.ModelForm):
+    """Form for adding an item to a kit"""
+
+    class Meta:
+        model = KitComponent
+        fields = ['item', 'quantity']
+
+    def __init__(self, *args, **kwargs):
+        self.kit = kwargs.pop('kit', None)
+        super().__init__(*args, **kwargs)
+
+        # Only show active items
+        self.fields['item'].queryset = Item.objects.filter(is_active=True)
+        self.fields['item'].widget.attrs['class'] = 'form-select'
+        self.fields['quantity'].widget.attrs['class'] = 'form-control'
+
+    def clean_item(self):
+        item = self.cleaned_data['item']
+        if self.kit and self.kit.components.filter(item=item).exists():
+            raise forms.ValidationError('This item is already in the kit; change its quantity instead.')
+        return item
+
+
+class IssueKitForm(forms.Form):
+    """Form for issuing a number of kits to a job"""
+    kits = forms.IntegerField(min_value=1, initial=1, label='Number of kits')
+    job_reference = forms.CharField(max_length=100)
+    source_location = forms.ModelChoiceField(
+        queryset=Location.objects.filter(is_active=True),
+        required=False,
+        empty_label="Items' default locations"
+    )
+    notes = forms.CharField(required=False, widget=forms.Textarea(attrs={'rows': 2}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Add Bootstrap classes
+        for field_name, field in self.fields.items():
+            field.widget.attrs['class'] = 'form-select' if isinstance(field, forms.ModelChoiceField) else 'form-control'
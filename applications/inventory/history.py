@@ -0,0 +1,53 @@
+# inventory/history.py
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Item, StockMovement
+from .services import NON_QUANTITY_MOVEMENTS
+
+
+def stock_as_of(at, items=None):
+    """
+    Annotate items with their stock level at a point in time.
+
+    Adds `quantity_as_of` and `value_as_of` (at the current unit price) to every
+    item in `items` (all items by default) in a single query. Each item is
+    answered from the movement ledger with correlated lookups on the
+    (item, movement_date) index: the stock_after of its latest movement at or
+    before `at`, else the balance just before its first later movement, else its
+    current quantity when it has never moved. Items created after `at` are left out.
+    """
+    items = Item.objects.all() if items is None else items
+
+    latest_before = StockMovement.objects.filter(
+        item=OuterRef('pk'),
+        movement_date__lte=at
+    ).order_by('-movement_date', '-id').values('stock_after')[:1]
+
+    # Stock before the first later movement, for items whose history starts after `at`
+    first_after = StockMovement.objects.filter(
+        item=OuterRef('pk'),
+        movement_date__gt=at
+    ).order_by('movement_date', 'id').annotate(
+        opening=Case(
+            When(movement_type__in=NON_QUANTITY_MOVEMENTS, then=F('stock_after')),
+            default=F('stock_after') - F('quantity'),
+            output_field=IntegerField()
+        )
+    ).values('opening')[:1]
+
+    return items.filter(created_at__lte=at).annotate(
+        quantity_as_of=Coalesce(
+            Subquery(latest_before, output_field=IntegerField()),
+            Subquery(first_after, output_field=IntegerField()),
+            F('quantity'),
+            output_field=IntegerField()
+        )
+    ).annotate(
+        value_as_of=ExpressionWrapper(
+            F('quantity_as_of') * Coalesce(F('unit_price'), Value(Decimal('0'))),
+            output_field=DecimalField(max_digits=14, decimal_places=2)
+        )
+    )
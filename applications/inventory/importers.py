@@ -0,0 +1,363 @@
+# inventory/importers.py
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .alerts import queue_stock_alerts
+from .models import Category, Location, Supplier, Item, StockMovement
+from .search import get_search_backend
+from .services import apply_location_deltas, movement_location_deltas, movements_recorded
+from .summary import invalidate_dashboard_summary
+from .writes import coalesce_item_writes, update_items
+
+
+# Columns understood by the importer; only name is required
+IMPORT_COLUMNS = (
+    'name', 'sku', 'description', 'category', 'company', 'supplier', 'supplier_part_number',
+    'location', 'quantity', 'minimum_stock', 'reorder_quantity', 'unit_price', 'condition', 'tags', 'notes',
+)
+
+# Item field written from each column other than quantity
+COLUMN_FIELDS = {
+    'name': 'name', 'sku': 'sku', 'description': 'description', 'company': 'company', 'condition': 'condition',
+    'supplier_part_number': 'supplier_part_number', 'tags': 'tags', 'notes': 'notes',
+    'minimum_stock': 'minimum_stock', 'reorder_quantity': 'reorder_quantity', 'unit_price': 'unit_price',
+    'category': 'category_id', 'supplier': 'supplier_id', 'location': 'location_id',
+}
+
+COMPANY_CODES = {code for code, label in Item.company.field.choices}
+CONDITION_CODES = {code for code, label in Item.CONDITION_CHOICES}
+
+OPENING_BALANCE_REFERENCE = 'Opening balance'
+
+
+def _normalise_header(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def _clean(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def read_rows(file, file_name):
+    """Yield (row number, row dict) from a CSV or XLSX upload without loading it all at once"""
+    if file_name.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_normalise_header(value) for value in next(rows, [])]
+        for row_number, values in enumerate(rows, start=2):
+            if any(value not in (None, '') for value in values):
+                yield row_number, dict(zip(header, values))
+        workbook.close()
+    else:
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        reader = csv.reader(text)
+        header = [_normalise_header(value) for value in next(reader, [])]
+        for row_number, values in enumerate(reader, start=2):
+            if any(value.strip() for value in values):
+                yield row_number, dict(zip(header, values))
+
+
+class ImportResult:
+    """Outcome of an import run"""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.created = 0
+        self.updated = 0
+        self.movements = 0
+        self.rows = 0
+        self.last_row = None
+        self.errors = []
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+
+class ItemImporter:
+    """
+    Chunked importer for items, their categories, suppliers, locations and opening quantities.
+
+    Foreign keys are resolved through in-memory lookup maps loaded once up front,
+    so a chunk costs a handful of bulk statements regardless of its size. Each
+    chunk is committed on its own, so a failed run can resume from the row after
+    `result.last_row`. Items are matched on SKU; rows without one are always new.
+    Existing items are locked while their chunk is written and only the cells
+    filled in on a row change them; a quantity is recorded as an adjustment
+    against the item's stock at that moment.
+    """
+
+    def __init__(self, performed_by=None, dry_run=False, start_row=1, chunk_size=1000,
+                 create_missing=True, progress_callback=None):
+        self.performed_by = performed_by
+        self.dry_run = dry_run
+        self.start_row = start_row
+        self.chunk_size = chunk_size
+        self.create_missing = create_missing
+        self.progress_callback = progress_callback
+        self.result = ImportResult(dry_run)
+
+        # Lookup maps, keyed by lower-cased name
+        self.categories = {}
+        for category in Category.objects.only('pk', 'name', 'full_name'):
+            self.categories.setdefault(category.name.lower(), category.pk)
+            if category.full_name:
+                self.categories[category.full_name.lower()] = category.pk
+        self.suppliers = {name.lower(): pk for pk, name in Supplier.objects.values_list('pk', 'name')}
+        self.locations = {name.lower(): pk for pk, name in Location.objects.values_list('pk', 'name')}
+        self.items_by_sku = {
+            sku.lower(): pk for pk, sku in Item.objects.exclude(sku='').values_list('pk', 'sku')
+        }
+
+    def run(self, rows):
+        chunk = []
+        for row_number, row in rows:
+            if row_number < self.start_row:
+                continue
+            chunk.append((row_number, row))
+            if len(chunk) >= self.chunk_size:
+                self.process_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.process_chunk(chunk)
+        return self.result
+
+    # Validation
+
+    def _parse_int(self, row, field, errors):
+        value = _clean(row.get(field))
+        if not value:
+            return 0
+        try:
+            number = int(Decimal(value))
+        except (InvalidOperation, ValueError):
+            errors.append(f"{field} '{value}' is not a number")
+            return 0
+        if number < 0:
+            errors.append(f"{field} cannot be negative")
+        return number
+
+    def _parse_price(self, row, errors):
+        value = _clean(row.get('unit_price')).replace(',', '')
+        if not value:
+            return None
+        try:
+            return Decimal(value).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            errors.append(f"unit_price '{value}' is not a valid amount")
+            return None
+
+    def _resolve(self, lookup, value, label, errors, pending):
+        """Resolve a name through a lookup map, queuing it for creation if allowed"""
+        if not value:
+            return None
+        key = value.lower()
+        if key in lookup:
+            return lookup[key]
+        if self.create_missing:
+            pending.setdefault(key, value)
+            return key
+        errors.append(f"{label} '{value}' does not exist")
+        return None
+
+    def validate_chunk(self, chunk):
+        """Validate a chunk, returning the cleaned rows and the names that still need creating"""
+        cleaned = []
+        pending = {'category': {}, 'supplier': {}, 'location': {}}
+        seen_skus = set()
+
+        for row_number, row in chunk:
+            errors = []
+            name = _clean(row.get('name'))
+            if not name:
+                errors.append('name is required')
+
+            sku = _clean(row.get('sku'))
+            if sku:
+                if sku.lower() in seen_skus:
+                    errors.append(f"SKU '{sku}' appears more than once in this chunk")
+                seen_skus.add(sku.lower())
+
+            company = _clean(row.get('company')).lower() or 'wisp'
+            if company not in COMPANY_CODES:
+                errors.append(f"company '{company}' must be one of {', '.join(sorted(COMPANY_CODES))}")
+
+            condition = _clean(row.get('condition')).lower() or 'new'
+            if condition not in CONDITION_CODES:
+                errors.append(f"condition '{condition}' must be one of {', '.join(sorted(CONDITION_CODES))}")
+
+            values = {
+                'name': name,
+                'sku': sku,
+                'description': _clean(row.get('description')),
+                'company': company,
+                'condition': condition,
+                'supplier_part_number': _clean(row.get('supplier_part_number')),
+                'tags': _clean(row.get('tags')),
+                'notes': _clean(row.get('notes')),
+                'quantity': self._parse_int(row, 'quantity', errors),
+                'minimum_stock': self._parse_int(row, 'minimum_stock', errors),
+                'reorder_quantity': self._parse_int(row, 'reorder_quantity', errors),
+                'unit_price': self._parse_price(row, errors),
+                'category': self._resolve(self.categories, _clean(row.get('category')), 'Category', errors,
+                                          pending['category']),
+                'supplier': self._resolve(self.suppliers, _clean(row.get('supplier')), 'Supplier', errors,
+                                          pending['supplier']),
+                'location': self._resolve(self.locations, _clean(row.get('location')), 'Location', errors,
+                                          pending['location']),
+                # Columns with a value on this row; blank cells leave an existing item's value alone
+                'present': {column for column in IMPORT_COLUMNS if _clean(row.get(column))},
+            }
+
+            if errors:
+                for message in errors:
+                    self.result.add_error(row_number, message)
+            else:
+                cleaned.append((row_number, values))
+
+        return cleaned, pending
+
+    # Writing
+
+    def create_missing_references(self, pending):
+        """Create unknown categories, suppliers and locations once each and add them to the maps"""
+        # Category names may be full paths ('Radio > Antennas'), so create each missing level
+        for key, name in pending['category'].items():
+            parent_id = None
+            parts = []
+            for part in [part.strip() for part in name.split(Category.NAME_SEPARATOR.strip()) if part.strip()]:
+                parts.append(part)
+                full_key = Category.NAME_SEPARATOR.join(parts).lower()
+                if full_key not in self.categories:
+                    category = Category(name=part, parent_id=parent_id)
+                    category.save()
+                    self.categories[full_key] = category.pk
+                parent_id = self.categories[full_key]
+            self.categories[key] = parent_id
+
+        suppliers = Supplier.objects.bulk_create([Supplier(name=name) for name in pending['supplier'].values()])
+        for supplier in suppliers:
+            self.suppliers[supplier.name.lower()] = supplier.pk
+
+        locations = Location.objects.bulk_create([Location(name=name) for name in pending['location'].values()])
+        for location in locations:
+            self.locations[location.name.lower()] = location.pk
+
+    def _reference_id(self, lookup, value):
+        # Values are either resolved pks or keys of rows created this chunk
+        return lookup.get(value, value) if isinstance(value, str) else value
+
+    def process_chunk(self, chunk):
+        cleaned, pending = self.validate_chunk(chunk)
+        self.result.rows += len(chunk)
+        self.result.last_row = chunk[-1][0]
+
+        if self.dry_run:
+            for row_number, values in cleaned:
+                if values['sku'] and values['sku'].lower() in self.items_by_sku:
+                    self.result.updated += 1
+                else:
+                    self.result.created += 1
+            self._report_progress()
+            return
+
+        now = timezone.now()
+        with transaction.atomic(), coalesce_item_writes():
+            self.create_missing_references(pending)
+
+            # Lock the chunk's existing items, so quantities change from the stock they hold now
+            existing = {
+                pk: (quantity, minimum_stock, location_id)
+                for pk, quantity, minimum_stock, location_id in Item.objects.select_for_update().filter(pk__in=[
+                    self.items_by_sku[values['sku'].lower()]
+                    for row_number, values in cleaned
+                    if values['sku'] and values['sku'].lower() in self.items_by_sku
+                ]).values_list('pk', 'quantity', 'minimum_stock', 'location_id')
+            }
+
+            new_items, updates, movements, changes = [], {}, [], []
+            for row_number, values in cleaned:
+                fields = {field: values[column] for column, field in COLUMN_FIELDS.items()}
+                fields.update(
+                    category_id=self._reference_id(self.categories, values['category']),
+                    supplier_id=self._reference_id(self.suppliers, values['supplier']),
+                    location_id=self._reference_id(self.locations, values['location']),
+                )
+                pk = self.items_by_sku.get(values['sku'].lower()) if values['sku'] else None
+
+                if pk in existing:
+                    previous_quantity, previous_minimum, location_id = existing[pk]
+                    item_changes = {
+                        field: fields[field] for column, field in COLUMN_FIELDS.items() if column in values['present']
+                    }
+                    item_changes['updated_at'] = now
+
+                    # Record the change to the opening balance as an adjustment
+                    quantity = previous_quantity
+                    if 'quantity' in values['present'] and values['quantity'] != previous_quantity:
+                        quantity = values['quantity']
+                        item_changes['quantity'] = quantity
+                        movements.append(self._opening_movement(
+                            pk, item_changes.get('location_id', location_id), quantity - previous_quantity,
+                            'adjustment', now, quantity, values['unit_price']
+                        ))
+                    updates[pk] = item_changes
+                    minimum_stock = item_changes.get('minimum_stock', previous_minimum)
+                    changes.append((pk, previous_quantity, previous_minimum, quantity, minimum_stock))
+                    existing[pk] = (quantity, minimum_stock, item_changes.get('location_id', location_id))
+                else:
+                    item = Item(quantity=values['quantity'], **fields)
+                    # Stocked items are valued by the costing engine from their opening movement
+                    if not item.quantity and item.unit_price is not None:
+                        item.total_value = Decimal('0')
+                    new_items.append(item)
+
+            Item.objects.bulk_create(new_items)
+            for item in new_items:
+                if item.sku:
+                    self.items_by_sku[item.sku.lower()] = item.pk
+                if item.quantity:
+                    movements.append(self._opening_movement(
+                        item.pk, item.location_id, item.quantity, 'in', now, item.quantity, item.unit_price
+                    ))
+
+            update_items(updates)
+            StockMovement.objects.bulk_create(movements)
+            movements_recorded(movements)
+            apply_location_deltas(movement_location_deltas(movements))
+            queue_stock_alerts(changes)
+
+            # Bulk writes skip the save signals, so index the chunk and refresh the dashboard directly
+            get_search_backend().index_items([item.pk for item in new_items] + list(updates))
+            invalidate_dashboard_summary()
+
+        self.result.created += len(new_items)
+        self.result.updated += len(updates)
+        self.result.movements += len(movements)
+        self._report_progress()
+
+    def _opening_movement(self, item_id, location_id, quantity, movement_type, movement_date, stock_after,
+                          unit_price):
+        return StockMovement(
+            item_id=item_id,
+            quantity=quantity,
+            movement_type=movement_type,
+            movement_date=movement_date,
+            destination_location_id=location_id if quantity > 0 else None,
+            source_location_id=location_id if quantity < 0 else None,
+            performed_by=self.performed_by,
+            reference_number=OPENING_BALANCE_REFERENCE,
+            stock_after=stock_after,
+            unit_price=unit_price,
+        )
+
+    def _report_progress(self):
+        if self.progress_callback:
+            self.progress_callback(self.result)
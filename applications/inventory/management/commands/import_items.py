@@ -0,0 +1,62 @@
+import csv
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.inventory.importers import ItemImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import inventory items, categories, suppliers and opening quantities from a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file with a header row')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the file without saving anything')
+        parser.add_argument('--start-row', type=int, default=1, help='Resume from this spreadsheet row')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows validated and written per batch')
+        parser.add_argument('--no-create', action='store_true',
+                            help='Reject rows whose category, supplier or location does not exist')
+        parser.add_argument('--user', help='Username recorded on the opening stock movements')
+        parser.add_argument('--error-report', help='Write row errors to this CSV file')
+
+    def handle(self, *args, **options):
+        performed_by = None
+        if options['user']:
+            try:
+                performed_by = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+
+        def report_progress(result):
+            self.stdout.write(f'Processed up to row {result.last_row} ({result.created} created, '
+                              f'{result.updated} updated, {len(result.errors)} errors)')
+
+        importer = ItemImporter(
+            performed_by=performed_by,
+            dry_run=options['dry_run'],
+            start_row=options['start_row'],
+            chunk_size=options['chunk_size'],
+            create_missing=not options['no_create'],
+            progress_callback=report_progress,
+        )
+
+        try:
+            with open(options['path'], 'rb') as file:
+                result = importer.run(read_rows(file, options['path']))
+        except Exception:
+            if importer.result.last_row:
+                self.stderr.write(f'Import stopped after row {importer.result.last_row}; '
+                                  f'resume with --start-row {importer.result.last_row + 1}')
+            raise
+
+        if options['error_report'] and result.errors:
+            with open(options['error_report'], 'w', newline='') as report:
+                writer = csv.writer(report)
+                writer.writerow(['row', 'error'])
+                writer.writerows(result.errors)
+
+        prefix = 'Dry run: ' if result.dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{result.rows} rows read, {result.created} created, {result.updated} updated, '
+            f'{result.movements} opening movements, {len(result.errors)} errors'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from applications.inventory.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized path and full name of every inventory category'
+
+    def handle(self, *args, **options):
+        changed = Category.rebuild_tree()
+        self.stdout.write(self.style.SUCCESS(f'Category tree rebuilt: {changed} categories updated'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from applications.inventory.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the inventory item full-text search index'
+
+    def handle(self, *args, **options):
+        indexed = get_search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt: {indexed} items indexed'))
@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.inventory.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the daily stock movement rollup from the raw movements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last date to rebuild (YYYY-MM-DD)')
+
+    def parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"'{value}' is not a valid date, use YYYY-MM-DD")
+
+    def handle(self, *args, **options):
+        date_from = self.parse_date(options['date_from'])
+        date_to = self.parse_date(options['date_to'])
+
+        written = rebuild_rollups(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(f'Movement rollup rebuilt: {written} daily rows written'))
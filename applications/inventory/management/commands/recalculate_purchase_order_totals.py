@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from applications.inventory.services import recalculate_purchase_order_totals
+
+
+class Command(BaseCommand):
+    help = 'Recompute purchase order subtotals and totals from their lines, repairing any drift'
+
+    def handle(self, *args, **options):
+        repaired = recalculate_purchase_order_totals()
+        self.stdout.write(self.style.SUCCESS(f'Purchase order totals recalculated: {repaired} orders repaired'))
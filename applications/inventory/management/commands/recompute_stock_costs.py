@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from applications.inventory.costing import get_costing_method, recompute_costs
+
+
+class Command(BaseCommand):
+    help = 'Recompute movement costs, cost layers and item stock values from the whole movement ledger'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Costing method: {get_costing_method()}')
+
+        summary = recompute_costs(
+            progress_callback=lambda summary: self.stdout.write(
+                f"  {summary['items']} items, {summary['movements']} movements costed"
+            )
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Stock costs recomputed: {summary['items']} items, {summary['movements']} movements"
+        ))
+        if summary['normalised']:
+            self.stdout.write(self.style.WARNING(
+                f"{summary['normalised']} legacy adjustment/count movements rewritten as changes; "
+                f"run rebuild_movement_rollups to bring the daily rollups in line"
+            ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from applications.inventory.services import reconcile_location_balances
+
+
+class Command(BaseCommand):
+    help = 'Seed or repair per-location stock balances so they add up to each item quantity'
+
+    def handle(self, *args, **options):
+        corrected = reconcile_location_balances()
+        self.stdout.write(self.style.SUCCESS(f'Location balances reconciled: {corrected} items corrected'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from applications.inventory.supplier_metrics import PRICE_TREND_DAYS, refresh_supplier_metrics
+
+
+class Command(BaseCommand):
+    help = 'Recompute supplier lead times, fill rates, open order value and item price trends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--price-trend-days', type=int, default=PRICE_TREND_DAYS,
+                            help='Days of order lines to include in the item price trends')
+
+    def handle(self, *args, **options):
+        summary = refresh_supplier_metrics(options['price_trend_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Supplier metrics refreshed: {summary['suppliers']} suppliers, {summary['item_prices']} item prices"
+        ))
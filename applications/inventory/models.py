@@ -1,7 +1,16 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.urls import reverse
+from django.core.files.storage import storages
+
+
+def attachment_storage():
+    """Storage for uploaded attachments, configured as STORAGES['attachments']"""
+    return storages['attachments']
 
 
 class Category(models.Model):
@@ -17,6 +26,14 @@ class Category(models.Model):
     color = models.CharField(max_length=20, default='#3498db')  # Hex color code
     icon = models.CharField(max_length=50, default='fa-boxes')  # FontAwesome icon
 
+    # Materialized tree, maintained on save (e.g., '000001/000004/')
+    path = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
+    full_name = models.CharField(max_length=500, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    PATH_SEPARATOR = '/'
+    NAME_SEPARATOR = ' > '
+
     class Meta:
         verbose_name = 'Category'
         verbose_name_plural = 'Categories'
@@ -25,12 +42,98 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        # A category can't be moved underneath itself
+        if self.pk and self.parent_id and self.path and self.parent.path.startswith(self.path):
+            raise ValidationError('A category cannot be its own parent or sub-category.')
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.update_tree()
+
+    def delete(self, *args, **kwargs):
+        # Children become top-level categories, so re-root their subtrees first
+        for child in self.children.all():
+            child.parent = None
+            child.save()
+        return super().delete(*args, **kwargs)
+
+    def get_path_segment(self):
+        return f"{self.pk:06d}{self.PATH_SEPARATOR}"
+
+    def update_tree(self):
+        """Recompute this category's path and full name and rewrite its subtree in one UPDATE"""
+        if self.parent_id:
+            parent = Category.objects.only('path', 'full_name', 'depth').get(pk=self.parent_id)
+            path = parent.path + self.get_path_segment()
+            full_name = f"{parent.full_name}{self.NAME_SEPARATOR}{self.name}"
+            depth = parent.depth + 1
+        else:
+            path = self.get_path_segment()
+            full_name = self.name
+            depth = 0
+
+        old_path, old_full_name, old_depth = self.path, self.full_name, self.depth
+        if (path, full_name, depth) == (old_path, old_full_name, old_depth):
+            return
+
+        Category.objects.filter(pk=self.pk).update(path=path, full_name=full_name, depth=depth)
+        self.path, self.full_name, self.depth = path, full_name, depth
+
+        # Swap the old prefix for the new one on every descendant
+        if old_path:
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(path), Substr('path', len(old_path) + 1)),
+                full_name=Concat(Value(full_name), Substr('full_name', len(old_full_name) + 1)),
+                depth=F('depth') + (depth - old_depth),
+            )
+
     def get_full_name(self):
         """Get full category path (e.g., 'Electronics > Networking > Routers')"""
+        if self.full_name:
+            return self.full_name
         if self.parent:
-            return f"{self.parent.get_full_name()} > {self.name}"
+            return f"{self.parent.get_full_name()}{self.NAME_SEPARATOR}{self.name}"
         return self.name
 
+    def get_descendants(self, include_self=True):
+        """All categories in this subtree, in one indexed query"""
+        queryset = Category.objects.filter(path__startswith=self.path)
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset
+
+    @classmethod
+    def rebuild_tree(cls):
+        """Recompute every path and full name from the parent links. Returns the number of rows changed."""
+        categories = {category.pk: category for category in cls.objects.all()}
+        resolved = {}
+
+        def resolve(category, seen=()):
+            if category.pk in resolved:
+                return resolved[category.pk]
+            parent = categories.get(category.parent_id)
+            # Break cycles and dangling parents by treating the category as a root
+            if parent is None or parent.pk in seen or parent.pk == category.pk:
+                result = (category.get_path_segment(), category.name, 0)
+            else:
+                parent_path, parent_name, parent_depth = resolve(parent, seen + (category.pk,))
+                result = (parent_path + category.get_path_segment(),
+                          f"{parent_name}{cls.NAME_SEPARATOR}{category.name}",
+                          parent_depth + 1)
+            resolved[category.pk] = result
+            return result
+
+        changed = []
+        for category in categories.values():
+            path, full_name, depth = resolve(category)
+            if (category.path, category.full_name, category.depth) != (path, full_name, depth):
+                category.path, category.full_name, category.depth = path, full_name, depth
+                changed.append(category)
+
+        cls.objects.bulk_update(changed, ['path', 'full_name', 'depth'], batch_size=500)
+        return len(changed)
+
 
 class Location(models.Model):
     """Locations where inventory items can be stored"""
@@ -82,6 +185,11 @@ class Item(models.Model):
         ('damaged', 'Damaged'),
         ('broken', 'Broken'),
     )
+    ABC_CLASS_CHOICES = (
+        ('A', 'A - count weekly'),
+        ('B', 'B - count monthly'),
+        ('C', 'C - count quarterly'),
+    )
 
     # Basic item information
     name = models.CharField(max_length=255)
@@ -102,11 +210,15 @@ class Item(models.Model):
     reorder_quantity = models.PositiveIntegerField(default=0, help_text="Suggested quantity to reorder")
     location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True, related_name='items')
     condition = models.CharField(max_length=20, choices=CONDITION_CHOICES, default='new')
+    abc_class = models.CharField(max_length=1, choices=ABC_CLASS_CHOICES, blank=True,
+                                 help_text="Value and velocity class, set nightly; drives the cycle count frequency")
 
     # Financial information
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     total_value = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True,
                                       help_text="Total value of current stock")
+    average_cost = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True,
+                                       help_text="Cost per unit of stock on hand, kept by the costing engine")
 
     # Supplier information
     supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True, related_name='items')
@@ -132,6 +244,10 @@ class Item(models.Model):
             models.Index(fields=['company', 'category']),
             models.Index(fields=['quantity']),
             models.Index(fields=['is_active']),
+            models.Index(fields=['sku']),
+            models.Index(fields=['supplier_part_number']),
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['abc_class', 'last_counted_date']),
         ]
 
     def __str__(self):
@@ -140,12 +256,29 @@ class Item(models.Model):
     def get_absolute_url(self):
         return reverse('inventory:item_detail', kwargs={'pk': self.pk})
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded stock so saves can detect level transitions without a SELECT
+        instance._loaded_stock = (instance.__dict__.get('quantity'), instance.__dict__.get('minimum_stock'))
+        return instance
+
     def save(self, *args, **kwargs):
-        # Calculate total value
-        if self.unit_price is not None:
-            self.total_value = self.quantity * self.unit_price
+        # Calculate total value, at cost once the costing engine has valued the item
+        unit_cost = self.average_cost if self.average_cost is not None else self.unit_price
+        if unit_cost is not None:
+            self.total_value = self.quantity * unit_cost
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def stock_level(quantity, minimum_stock):
+        """Return 'out', 'low' or 'ok' for a quantity against a minimum stock level"""
+        if quantity <= 0:
+            return 'out'
+        if quantity <= minimum_stock:
+            return 'low'
+        return 'ok'
+
     def is_low_stock(self):
         """Check if item is below minimum stock level"""
         return self.quantity <= self.minimum_stock
@@ -165,6 +298,31 @@ class Item(models.Model):
         return []
 
 
+class ItemLocationBalance(models.Model):
+    """Quantity of an item held at one location; an item's quantity is the sum of its balances"""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='location_balances')
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='item_balances', help_text="Empty for stock not yet assigned a location")
+    quantity = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Item Location Balance'
+        verbose_name_plural = 'Item Location Balances'
+        ordering = ['item__name']
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'location'], name='unique_item_location_balance'),
+            models.UniqueConstraint(fields=['item'], condition=models.Q(location__isnull=True),
+                                    name='unique_item_unassigned_balance'),
+        ]
+        indexes = [
+            models.Index(fields=['location', 'quantity']),
+        ]
+
+    def __str__(self):
+        return f"{self.item} @ {self.location or 'Unassigned'}: {self.quantity}"
+
+
 class StockMovement(models.Model):
     """Record of stock movements (in/out)"""
     MOVEMENT_TYPES = (
@@ -213,13 +371,20 @@ class StockMovement(models.Model):
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
                                      help_text="Unit price at time of movement")
 
+    # Costing information, filled in by the costing engine
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True,
+                                    help_text="Cost per unit received or issued")
+    cost_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True,
+                                      help_text="Cost of the stock received or issued")
+
     class Meta:
         verbose_name = 'Stock Movement'
         verbose_name_plural = 'Stock Movements'
         ordering = ['-movement_date']
         indexes = [
-            models.Index(fields=['movement_date']),
+            models.Index(fields=['movement_date', 'id']),
             models.Index(fields=['movement_type']),
+            models.Index(fields=['item', 'movement_date']),
         ]
 
     def __str__(self):
@@ -248,6 +413,9 @@ class StockAdjustment(models.Model):
         verbose_name = 'Stock Adjustment'
         verbose_name_plural = 'Stock Adjustments'
         ordering = ['-adjustment_date']
+        indexes = [
+            models.Index(fields=['adjustment_date', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.item.name}: adjusted by {self.adjustment_quantity}"
@@ -271,7 +439,8 @@ class PurchaseOrder(models.Model):
         ('cancelled', 'Cancelled'),
     )
 
-    order_number = models.CharField(max_length=100, unique=True)
+    order_number = models.CharField(max_length=100, unique=True, blank=True,
+                                    help_text="Leave blank to number the order automatically")
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='purchase_orders')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
     order_date = models.DateField(null=True, blank=True)
@@ -327,9 +496,42 @@ class PurchaseOrder(models.Model):
         return reverse('inventory:purchase_order_detail', kwargs={'pk': self.pk})
 
     def save(self, *args, **kwargs):
-        # Calculate total
-        self.total = self.subtotal + self.tax + self.shipping
-        super().save(*args, **kwargs)
+        # Number new orders from the per-company, per-year sequence
+        if not self.order_number:
+            from .sequences import next_number
+            self.order_number = next_number('purchase_order', company=self.company)
+
+        with transaction.atomic():
+            if not self._state.adding:
+                # The lines keep the stored subtotal current, so use it rather than write back this copy
+                stored_subtotal = PurchaseOrder.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'subtotal', flat=True
+                ).first()
+                if stored_subtotal is not None:
+                    self.subtotal = stored_subtotal
+
+            # Calculate total
+            self.total = self.subtotal + self.tax + self.shipping
+            super().save(*args, **kwargs)
+
+    def add_to_subtotal(self, amount):
+        """Shift the subtotal and total by a line amount with one UPDATE, without reading the other lines"""
+        if not amount:
+            return
+        PurchaseOrder.objects.filter(pk=self.pk).update(
+            subtotal=F('subtotal') + amount,
+            total=F('total') + amount,
+            updated_at=timezone.now(),
+        )
+        self.subtotal += amount
+        self.total += amount
+
+    def recalculate_totals(self):
+        """Recompute the subtotal and total from the lines, repairing any drift"""
+        from .services import recalculate_purchase_order_totals
+
+        recalculate_purchase_order_totals(PurchaseOrder.objects.filter(pk=self.pk))
+        self.subtotal, self.total = PurchaseOrder.objects.filter(pk=self.pk).values_list('subtotal', 'total').get()
 
     def is_editable(self):
         """Check if PO is still editable"""
@@ -350,6 +552,18 @@ class PurchaseOrder(models.Model):
             self.order_date = timezone.now().date()
             self.save()
 
+    def receive_items(self, quantities, location=None, performed_by=None):
+        """
+        Receive several lines at once, given a mapping of line pk to quantity received.
+
+        Returns the created movements. Raises OverReceiptError, naming the line and
+        its outstanding quantity, if any line would be over-received; nothing is
+        received in that case.
+        """
+        from .services import receive_purchase_order
+
+        return receive_purchase_order(self, quantities, location, performed_by)
+
 
 class PurchaseOrderItem(models.Model):
     """Line items for purchase orders"""
@@ -368,56 +582,47 @@ class PurchaseOrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity_ordered} x {self.item.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored line total so a save only moves the order total by the difference
+        instance._loaded_line_total = instance.__dict__.get('line_total')
+        return instance
+
     def save(self, *args, **kwargs):
         # Calculate line total
         self.line_total = self.quantity_ordered * self.unit_price
-        super().save(*args, **kwargs)
 
-        # Update purchase order subtotal
-        po = self.purchase_order
-        po.subtotal = sum(item.line_total for item in po.items.all())
-        po.save()
+        if self._state.adding:
+            previous_total = 0
+        else:
+            previous_total = getattr(self, '_loaded_line_total', None)
+            if previous_total is None:
+                previous_total = PurchaseOrderItem.objects.filter(pk=self.pk).values_list(
+                    'line_total', flat=True
+                ).first() or 0
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            # Update purchase order subtotal by the change in this line only
+            self.purchase_order.add_to_subtotal(self.line_total - previous_total)
+        self._loaded_line_total = self.line_total
+
+    def delete(self, *args, **kwargs):
+        stored_total = getattr(self, '_loaded_line_total', None)
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self.purchase_order.add_to_subtotal(-(self.line_total if stored_total is None else stored_total))
+        return result
 
     def is_fully_received(self):
         """Check if item is fully received"""
         return self.quantity_received >= self.quantity_ordered
 
     def receive_items(self, quantity, location, performed_by=None):
-        """Receive items and update inventory"""
-        if quantity <= 0 or quantity > (self.quantity_ordered - self.quantity_received):
-            return False
-
-        # Update received quantity
-        self.quantity_received += quantity
-        self.save()
-
-        # Update item stock
-        self.item.quantity += quantity
-        self.item.last_received_date = timezone.now().date()
-        self.item.save()
-
-        # Create stock movement
-        StockMovement.objects.create(
-            item=self.item,
-            quantity=quantity,
-            movement_type='in',
-            reference_number=f"PO #{self.purchase_order.order_number}",
-            destination_location=location,
-            performed_by=performed_by,
-            stock_after=self.item.quantity,
-            unit_price=self.unit_price
-        )
-
-        # Update purchase order status
-        po = self.purchase_order
-        if all(item.is_fully_received() for item in po.items.all()):
-            po.status = 'fully_received'
-            po.actual_delivery_date = timezone.now().date()
-        else:
-            po.status = 'partially_received'
-        po.save()
-
-        return True
+        """Receive items and update inventory. Raises OverReceiptError past the outstanding quantity"""
+        return self.purchase_order.receive_items({self.pk: quantity}, location, performed_by)
 
 
 class InventoryCount(models.Model):
@@ -428,7 +633,8 @@ class InventoryCount(models.Model):
         ('cancelled', 'Cancelled'),
     )
 
-    count_reference = models.CharField(max_length=100, unique=True)
+    count_reference = models.CharField(max_length=100, unique=True, blank=True,
+                                       help_text="Leave blank to number the count automatically")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_progress')
     count_date = models.DateField(default=timezone.now)
     location = models.ForeignKey(Location, on_delete=models.CASCADE)
@@ -467,57 +673,22 @@ class InventoryCount(models.Model):
     def __str__(self):
         return f"Count #{self.count_reference} - {self.count_date}"
 
+    def save(self, *args, **kwargs):
+        # Number new counts from the per-company, per-year sequence
+        if not self.count_reference:
+            from .sequences import next_number
+            self.count_reference = next_number('inventory_count', company=self.company)
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('inventory:count_detail', kwargs={'pk': self.pk})
 
-    def mark_as_completed(self, completed_by):
+    def mark_as_completed(self, completed_by, progress_callback=None):
         """Mark count as completed and process adjustments"""
-        if self.status == 'in_progress':
-            self.status = 'completed'
-            self.completed_by = completed_by
-            self.completed_at = timezone.now()
-            self.save()
+        from .services import complete_inventory_count
 
-            # Process count items and create adjustments
-            for count_item in self.items.all():
-                item = count_item.item
-                previous_quantity = item.quantity
-
-                # Create adjustment if there's a discrepancy
-                if count_item.counted_quantity != previous_quantity:
-                    # Create stock adjustment
-                    adjustment = StockAdjustment.objects.create(
-                        item=item,
-                        previous_quantity=previous_quantity,
-                        new_quantity=count_item.counted_quantity,
-                        adjustment_quantity=count_item.counted_quantity - previous_quantity,
-                        performed_by=completed_by,
-                        reason=f"Inventory Count #{self.count_reference}",
-                        notes=count_item.notes
-                    )
-
-                    # Create stock movement
-                    movement_type = 'adjustment'
-                    StockMovement.objects.create(
-                        item=item,
-                        quantity=adjustment.adjustment_quantity,
-                        movement_type=movement_type,
-                        reference_number=f"Count #{self.count_reference}",
-                        source_location=self.location if adjustment.adjustment_quantity < 0 else None,
-                        destination_location=self.location if adjustment.adjustment_quantity > 0 else None,
-                        performed_by=completed_by,
-                        stock_after=count_item.counted_quantity,
-                        notes=count_item.notes
-                    )
-
-                    # Update item quantity
-                    item.quantity = count_item.counted_quantity
-                    item.last_counted_date = self.count_date
-                    item.save()
-                else:
-                    # Just update the last counted date
-                    item.last_counted_date = self.count_date
-                    item.save()
+        if self.status == 'in_progress':
+            return complete_inventory_count(self, completed_by, progress_callback)
 
 
 class InventoryCountItem(models.Model):
@@ -555,7 +726,7 @@ class InventoryCountItem(models.Model):
 class ItemAttachment(models.Model):
     """File attachments for inventory items"""
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='attachments')
-    file = models.FileField(upload_to='inventory_attachments/%Y/%m/')
+    file = models.FileField(upload_to='inventory_attachments/%Y/%m/', storage=attachment_storage)
     file_name = models.CharField(max_length=255)
     file_size = models.PositiveIntegerField()  # Size in bytes
     file_type = models.CharField(max_length=100)  # MIME type
@@ -572,4 +743,238 @@ class ItemAttachment(models.Model):
         ordering = ['-uploaded_at']
 
     def __str__(self):
-        return self.file_name
\ No newline at end of file
+        return self.file_name
+
+
+class StockValuationSnapshot(models.Model):
+    """Daily stock valuation per category, company and location for historical reporting"""
+    snapshot_date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='valuation_snapshots')
+    company = models.CharField(max_length=10, choices=[
+        ('wisp', 'WISP'),
+        ('fno', 'FNO'),
+        ('both', 'Both'),
+    ])
+    location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='valuation_snapshots')
+    item_count = models.PositiveIntegerField(default=0)
+    total_quantity = models.PositiveIntegerField(default=0)
+    total_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Stock Valuation Snapshot'
+        verbose_name_plural = 'Stock Valuation Snapshots'
+        ordering = ['-snapshot_date']
+        unique_together = ['snapshot_date', 'category', 'company', 'location']
+        indexes = [
+            models.Index(fields=['snapshot_date', 'company']),
+        ]
+
+    def __str__(self):
+        return f"{self.snapshot_date} - {self.category or 'Uncategorised'} ({self.get_company_display()}): {self.total_value}"
+
+
+class CostLayer(models.Model):
+    """FIFO cost layer: stock received at one unit cost that has not been issued yet"""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='cost_layers')
+    movement = models.ForeignKey(StockMovement, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='cost_layers')
+    received_at = models.DateTimeField()
+    quantity = models.PositiveIntegerField(help_text="Quantity received into this layer")
+    remaining_quantity = models.PositiveIntegerField(help_text="Quantity not yet issued")
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=4)
+
+    class Meta:
+        verbose_name = 'Cost Layer'
+        verbose_name_plural = 'Cost Layers'
+        ordering = ['item', 'received_at', 'id']
+        indexes = [
+            models.Index(fields=['item', 'remaining_quantity']),
+        ]
+
+    def __str__(self):
+        return f"{self.item} - {self.remaining_quantity}/{self.quantity} @ {self.unit_cost}"
+
+
+class StockMovementDaily(models.Model):
+    """Daily totals of stock movements per item, location, movement type and company"""
+    date = models.DateField()
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='daily_movements')
+    location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='daily_movements')
+    movement_type = models.CharField(max_length=20, choices=StockMovement.MOVEMENT_TYPES)
+    company = models.CharField(max_length=10, choices=[
+        ('wisp', 'WISP'),
+        ('fno', 'FNO'),
+        ('both', 'Both'),
+    ])
+    movement_count = models.PositiveIntegerField(default=0)
+    quantity_in = models.PositiveIntegerField(default=0)
+    quantity_out = models.PositiveIntegerField(default=0)
+    value = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                help_text="Value of stock moved at the movements' unit costs")
+
+    class Meta:
+        verbose_name = 'Daily Stock Movement'
+        verbose_name_plural = 'Daily Stock Movements'
+        ordering = ['-date']
+        unique_together = ('date', 'item', 'location', 'movement_type', 'company')
+        indexes = [
+            models.Index(fields=['date', 'company']),
+            models.Index(fields=['item', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.item} - {self.get_movement_type_display()}"
+
+
+class LowStockAlert(models.Model):
+    """Queued low/out of stock transition, sent to recipients in a periodic digest"""
+    LEVEL_CHOICES = (
+        ('low', 'Low Stock'),
+        ('out', 'Out of Stock'),
+    )
+
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='low_stock_alerts')
+    level = models.CharField(max_length=10, choices=LEVEL_CHOICES)
+    previous_quantity = models.PositiveIntegerField()
+    quantity = models.PositiveIntegerField()
+    minimum_stock = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['sent_at', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.item} - {self.get_level_display()}"
+
+
+class NumberSequence(models.Model):
+    """Counter behind generated document numbers, one row per sequence and prefix (company and year)"""
+    name = models.CharField(max_length=50)
+    prefix = models.CharField(max_length=50)
+    next_value = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Number Sequence'
+        verbose_name_plural = 'Number Sequences'
+        ordering = ['name', 'prefix']
+        unique_together = ('name', 'prefix')
+
+    def __str__(self):
+        return f"{self.name} {self.prefix} (next {self.next_value})"
+
+
+class Kit(models.Model):
+    """Bill of materials: a set of items issued together, e.g. everything for one tower install"""
+    name = models.CharField(max_length=200, unique=True)
+    description = models.TextField(blank=True)
+    company = models.CharField(max_length=10, choices=[
+        ('wisp', 'WISP'),
+        ('fno', 'FNO'),
+        ('both', 'Both'),
+    ], default='both')
+    is_active = models.BooleanField(default=True)
+
+    # Tracking information
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='created_kits'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Kit'
+        verbose_name_plural = 'Kits'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def get_absolute_url(self):
+        return reverse('inventory:kit_detail', kwargs={'pk': self.pk})
+
+
+class KitComponent(models.Model):
+    """One item of a kit and how many of it go into each kit"""
+    kit = models.ForeignKey(Kit, on_delete=models.CASCADE, related_name='components')
+    item = models.ForeignKey(Item, on_delete=models.PROTECT, related_name='kit_components')
+    quantity = models.PositiveIntegerField(default=1, help_text="Quantity per kit")
+
+    class Meta:
+        verbose_name = 'Kit Component'
+        verbose_name_plural = 'Kit Components'
+        ordering = ['item__name']
+        unique_together = ['kit', 'item']
+
+    def __str__(self):
+        return f"{self.quantity} x {self.item.name}"
+
+
+class SupplierMetrics(models.Model):
+    """Supplier delivery and spend figures, refreshed periodically from the purchase order history"""
+    supplier = models.OneToOneField(Supplier, on_delete=models.CASCADE, related_name='metrics')
+
+    # Lead time from order date to actual delivery date, in days
+    delivered_order_count = models.PositiveIntegerField(default=0)
+    average_lead_time_days = models.FloatField(null=True, blank=True)
+    p90_lead_time_days = models.FloatField(null=True, blank=True)
+
+    # Quantity received against quantity ordered on received orders
+    quantity_ordered = models.PositiveIntegerField(default=0)
+    quantity_received = models.PositiveIntegerField(default=0)
+    fill_rate = models.DecimalField(max_digits=5, decimal_places=4, null=True, blank=True,
+                                    help_text="Share of the ordered quantity that was received")
+
+    # Orders still open
+    order_count = models.PositiveIntegerField(default=0)
+    open_order_count = models.PositiveIntegerField(default=0)
+    open_order_value = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                           help_text="Value still to be delivered on open orders, before tax and shipping")
+    last_order_date = models.DateField(null=True, blank=True)
+
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Supplier Metrics'
+        verbose_name_plural = 'Supplier Metrics'
+        ordering = ['supplier__name']
+
+    def __str__(self):
+        return f"{self.supplier} metrics"
+
+
+class SupplierItemPrice(models.Model):
+    """Price trend of one item from one supplier over the analysis window"""
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='item_prices')
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='supplier_prices')
+    line_count = models.PositiveIntegerField(default=0)
+    first_unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    last_unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    average_unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    min_unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    max_unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    price_change = models.DecimalField(max_digits=8, decimal_places=4, null=True, blank=True,
+                                       help_text="Change from the first to the last price, as a fraction")
+    last_order_date = models.DateField(null=True, blank=True)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Supplier Item Price'
+        verbose_name_plural = 'Supplier Item Prices'
+        ordering = ['supplier', 'item__name']
+        unique_together = ('supplier', 'item')
+
+    def __str__(self):
+        return f"{self.supplier} - {self.item}: {self.last_unit_price}"
@@ -0,0 +1,251 @@
+# inventory/rollups.py
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Abs, Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Item, StockMovement, StockMovementDaily
+
+
+ROLLUP_BATCH_SIZE = 2000
+
+
+def day_start(date):
+    """Aware datetime for the start of a local date, for index-friendly movement_date ranges"""
+    return timezone.make_aware(timezone.datetime.combine(date, timezone.datetime.min.time()))
+
+
+def movement_date_range(date_from=None, date_to=None):
+    """Filter kwargs selecting movements on or between two local dates without wrapping the column"""
+    filters = {}
+    if date_from:
+        filters['movement_date__gte'] = day_start(date_from)
+    if date_to:
+        filters['movement_date__lt'] = day_start(date_to + timezone.timedelta(days=1))
+    return filters
+
+
+def rollup_key(movement, company):
+    """(date, item, location, movement_type, company) for a movement"""
+    if movement.quantity < 0:
+        location_id = movement.source_location_id or movement.destination_location_id
+    else:
+        location_id = movement.destination_location_id or movement.source_location_id
+    return (
+        timezone.localtime(movement.movement_date).date(),
+        movement.item_id,
+        location_id,
+        movement.movement_type,
+        company,
+    )
+
+
+def has_source_leg(movement):
+    """True for a transfer whose outflow from its source location is rolled up as well as its arrival"""
+    return (movement.movement_type == 'transfer' and movement.quantity > 0
+            and movement.source_location_id is not None and movement.destination_location_id is not None)
+
+
+def movement_unit_cost(movement):
+    """Unit value of a movement: its cost when costed, else its own unit price"""
+    for value in (movement.unit_cost, movement.unit_price):
+        if value is not None:
+            return value
+    return Decimal('0')
+
+
+def record_movements(movements):
+    """
+    Add new movements to the daily rollup.
+
+    Movements are totalled per rollup key in memory first, existing rollup rows
+    are incremented with F() expressions in one bulk UPDATE and missing ones are
+    bulk-inserted, so a delivery or count of any size costs a few statements.
+    A transfer is rolled up at both ends: counted once where it arrives, and as
+    an outflow from where it left. Values use each movement's own unit cost, so
+    they match rebuild_rollups().
+    """
+    movements = [movement for movement in movements if movement.quantity]
+    if not movements:
+        return
+
+    companies = dict(Item.objects.filter(
+        pk__in={movement.item_id for movement in movements}
+    ).values_list('pk', 'company'))
+
+    totals = defaultdict(lambda: [0, 0, 0, Decimal('0')])
+    for movement in movements:
+        company = companies.get(movement.item_id, 'wisp')
+        value = abs(movement.quantity) * movement_unit_cost(movement)
+        total = totals[rollup_key(movement, company)]
+        total[0] += 1
+        if movement.quantity > 0:
+            total[1] += movement.quantity
+        else:
+            total[2] += -movement.quantity
+        total[3] += value
+
+        if has_source_leg(movement):
+            date, item_id, location_id, movement_type, company = rollup_key(movement, company)
+            source = totals[(date, item_id, movement.source_location_id, movement_type, company)]
+            source[2] += movement.quantity
+            source[3] += value
+
+    try:
+        with transaction.atomic():
+            _apply_totals(totals)
+    except IntegrityError:
+        # A concurrent writer created one of the rows first; they all exist now
+        with transaction.atomic():
+            _apply_totals(totals)
+
+
+def _apply_totals(totals):
+    dates = {key[0] for key in totals}
+    item_ids = {key[1] for key in totals}
+    existing = {
+        (row.date, row.item_id, row.location_id, row.movement_type, row.company): row
+        for row in StockMovementDaily.objects.select_for_update().filter(date__in=dates, item_id__in=item_ids)
+    }
+
+    updates, creates = [], []
+    for key, (count, quantity_in, quantity_out, value) in totals.items():
+        row = existing.get(key)
+        if row:
+            row.movement_count = F('movement_count') + count
+            row.quantity_in = F('quantity_in') + quantity_in
+            row.quantity_out = F('quantity_out') + quantity_out
+            row.value = F('value') + value
+            updates.append(row)
+        else:
+            date, item_id, location_id, movement_type, company = key
+            creates.append(StockMovementDaily(
+                date=date,
+                item_id=item_id,
+                location_id=location_id,
+                movement_type=movement_type,
+                company=company,
+                movement_count=count,
+                quantity_in=quantity_in,
+                quantity_out=quantity_out,
+                value=value,
+            ))
+
+    StockMovementDaily.objects.bulk_update(updates, ['movement_count', 'quantity_in', 'quantity_out', 'value'])
+    StockMovementDaily.objects.bulk_create(creates)
+
+
+def rebuild_rollups(date_from=None, date_to=None):
+    """
+    Recompute the daily rollup from the raw movements, optionally for a date range.
+
+    The grouping happens in the database in aggregate queries and rows are
+    inserted in batches. Transfers get a second, outflow-only row at their
+    source location, and values use each movement's unit cost, as
+    record_movements() does. Returns the number of rollup rows written.
+    """
+    movements = StockMovement.objects.filter(**movement_date_range(date_from, date_to)).exclude(quantity=0)
+    value = Coalesce(
+        Sum(Abs('quantity') * Coalesce('unit_cost', 'unit_price', Value(Decimal('0'))),
+            output_field=DecimalField(max_digits=14, decimal_places=2)),
+        Value(Decimal('0')),
+        output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+    rows = movements.annotate(
+        day=TruncDate('movement_date'),
+        location=Case(
+            When(quantity__lt=0, then=Coalesce('source_location_id', 'destination_location_id')),
+            default=Coalesce('destination_location_id', 'source_location_id'),
+            output_field=IntegerField()
+        ),
+    ).values('day', 'item', 'location', 'movement_type', 'item__company').annotate(
+        movement_count=Count('id'),
+        quantity_in=Coalesce(Sum('quantity', filter=Q(quantity__gt=0)), 0),
+        quantity_out=Coalesce(Sum(Abs('quantity'), filter=Q(quantity__lt=0)), 0),
+        value=value,
+    ).order_by()
+    source_legs = movements.filter(
+        movement_type='transfer',
+        quantity__gt=0,
+        source_location__isnull=False,
+        destination_location__isnull=False
+    ).annotate(
+        day=TruncDate('movement_date'),
+        location=F('source_location_id'),
+    ).values('day', 'item', 'location', 'movement_type', 'item__company').annotate(
+        quantity_out=Sum('quantity'),
+        value=value,
+    ).order_by()
+
+    written = 0
+    with transaction.atomic():
+        existing = StockMovementDaily.objects.all()
+        if date_from:
+            existing = existing.filter(date__gte=date_from)
+        if date_to:
+            existing = existing.filter(date__lte=date_to)
+        existing.delete()
+
+        # Transfer rows are held back until their source legs are merged in
+        batch, transfers = [], {}
+        for row in rows.iterator(chunk_size=ROLLUP_BATCH_SIZE):
+            rollup = StockMovementDaily(
+                date=row['day'],
+                item_id=row['item'],
+                location_id=row['location'],
+                movement_type=row['movement_type'],
+                company=row['item__company'],
+                movement_count=row['movement_count'],
+                quantity_in=row['quantity_in'],
+                quantity_out=row['quantity_out'],
+                value=row['value'],
+            )
+            if rollup.movement_type == 'transfer':
+                transfers[(rollup.date, rollup.item_id, rollup.location_id, rollup.company)] = rollup
+                continue
+            batch.append(rollup)
+            if len(batch) >= ROLLUP_BATCH_SIZE:
+                StockMovementDaily.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+
+        for row in source_legs.iterator(chunk_size=ROLLUP_BATCH_SIZE):
+            key = (row['day'], row['item'], row['location'], row['item__company'])
+            rollup = transfers.setdefault(key, StockMovementDaily(
+                date=row['day'],
+                item_id=row['item'],
+                location_id=row['location'],
+                movement_type='transfer',
+                company=row['item__company'],
+                movement_count=0,
+                quantity_in=0,
+                quantity_out=0,
+                value=Decimal('0'),
+            ))
+            rollup.quantity_out += row['quantity_out']
+            rollup.value += row['value']
+
+        batch.extend(transfers.values())
+        StockMovementDaily.objects.bulk_create(batch, batch_size=ROLLUP_BATCH_SIZE)
+        written += len(batch)
+
+    return written
+
+
+def movement_totals_by_type(rollups):
+    """Movement count and items moved per movement type, from rollup rows"""
+    return rollups.values('movement_type').annotate(
+        count=Sum('movement_count'),
+        total_items=Sum(
+            Case(
+                When(movement_type__in=['in', 'out'], then=F('quantity_in') + F('quantity_out')),
+                # A transfer's source row only mirrors what arrived at its destination
+                When(movement_type='transfer', then=F('quantity_in')),
+                default=F('quantity_in') - F('quantity_out'),
+                output_field=IntegerField()
+            )
+        )
+    ).order_by('movement_type')
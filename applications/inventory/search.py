@@ -0,0 +1,151 @@
+# inventory/search.py
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Item
+
+
+# Item columns kept in the search index, plus the supplier name
+INDEXED_FIELDS = ('name', 'description', 'sku', 'supplier_part_number', 'tags')
+INDEXED_COLUMNS = INDEXED_FIELDS + ('supplier__name',)
+
+# Most hits a search returns, best first
+SEARCH_RESULT_LIMIT = 1000
+
+
+class BaseSearchBackend:
+    """Interface for inventory item search backends"""
+
+    def index_items(self, item_ids):
+        """Add or refresh the given items in the index"""
+
+    def remove_items(self, item_ids):
+        """Drop the given items from the index"""
+
+    def rebuild(self):
+        """Re-index the whole catalogue. Returns the number of items indexed"""
+        return 0
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Return matching item pks, best match first"""
+        raise NotImplementedError
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Fallback backend that searches the item table directly, for databases without FTS"""
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        condition = Q()
+        for term in query.split():
+            condition &= (
+                Q(name__icontains=term) |
+                Q(description__icontains=term) |
+                Q(sku__icontains=term) |
+                Q(supplier_part_number__icontains=term) |
+                Q(tags__icontains=term) |
+                Q(supplier__name__icontains=term)
+            )
+        if not condition:
+            return []
+        return list(Item.objects.filter(condition).order_by('name').values_list('pk', flat=True)[:limit])
+
+
+class SqliteFTS5Backend(BaseSearchBackend):
+    """SQLite FTS5 index keyed by item pk, ranked with bm25 and prefix-indexed for search-as-you-type"""
+    table = 'inventory_item_fts'
+
+    # bm25 weights per column: name, description, sku, supplier part number, tags, supplier name
+    weights = (10.0, 1.0, 8.0, 5.0, 3.0, 2.0)
+    batch_size = 2000
+
+    def __init__(self):
+        self._ready = False
+
+    def ensure_table(self):
+        if self._ready:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                "name, description, sku, supplier_part_number, tags, supplier_name, "
+                "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+        self._ready = True
+
+    def _write(self, cursor, rows):
+        cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {self.table} (rowid, name, description, sku, supplier_part_number, tags, supplier_name) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            [tuple('' if value is None else value for value in row) for row in rows]
+        )
+
+    def index_items(self, item_ids):
+        self.ensure_table()
+        rows = list(Item.objects.filter(pk__in=item_ids).values_list('pk', *INDEXED_COLUMNS))
+        missing = set(item_ids) - {row[0] for row in rows}
+        with connection.cursor() as cursor:
+            if rows:
+                self._write(cursor, rows)
+            if missing:
+                cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(pk,) for pk in missing])
+
+    def remove_items(self, item_ids):
+        self.ensure_table()
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(pk,) for pk in item_ids])
+
+    def rebuild(self):
+        self.ensure_table()
+        indexed = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            batch = []
+            for row in Item.objects.order_by('pk').values_list('pk', *INDEXED_COLUMNS).iterator(
+                    chunk_size=self.batch_size):
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self._write(cursor, batch)
+                    indexed += len(batch)
+                    batch = []
+            if batch:
+                self._write(cursor, batch)
+                indexed += len(batch)
+        return indexed
+
+    @staticmethod
+    def build_match(query):
+        """Turn free text into an FTS5 expression where every word must match as a prefix"""
+        terms = re.findall(r'\w+', query)
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        match = self.build_match(query)
+        if not match:
+            return []
+        self.ensure_table()
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, {weights}) LIMIT %s",
+                [match, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the configured backend (INVENTORY_SEARCH_BACKEND), defaulting to FTS5 on SQLite"""
+    global _backend
+    if _backend is None:
+        default = 'applications.inventory.search.SqliteFTS5Backend' if connection.vendor == 'sqlite' \
+            else 'applications.inventory.search.DatabaseSearchBackend'
+        _backend = import_string(getattr(settings, 'INVENTORY_SEARCH_BACKEND', default))()
+    return _backend
@@ -0,0 +1,75 @@
+# inventory/sequences.py
+import re
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import NumberSequence, PurchaseOrder, InventoryCount
+
+
+# Digits in the running part of a number, e.g. PO-WISP-2026-00042
+NUMBER_WIDTH = 5
+
+# Prefix format, model and numbered field for each sequence
+SEQUENCES = {
+    'purchase_order': ('PO-{company}-{year}-', PurchaseOrder, 'order_number'),
+    'inventory_count': ('CNT-{company}-{year}-', InventoryCount, 'count_reference'),
+}
+
+
+def sequence_prefix(name, company=None, year=None):
+    """Prefix of a sequence for a company and year; each prefix is numbered on its own"""
+    prefix_format = SEQUENCES[name][0]
+    return prefix_format.format(company=(company or 'all').upper(), year=year or timezone.now().year)
+
+
+def format_number(prefix, value):
+    return f"{prefix}{value:0{NUMBER_WIDTH}d}"
+
+
+def _highest_existing(name, prefix):
+    """Highest number already used under a prefix, so a new sequence starts past hand-entered numbers"""
+    _, model, field = SEQUENCES[name]
+    pattern = re.compile(re.escape(prefix) + r'(\d+)$')
+
+    highest = 0
+    for number in model.objects.filter(**{f'{field}__startswith': prefix}).values_list(field, flat=True).iterator():
+        match = pattern.match(number)
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return highest
+
+
+def allocate_numbers(name, count=1, company=None, year=None):
+    """
+    Reserve a block of consecutive numbers from a sequence and return them formatted.
+
+    The counter is moved past the whole block with one UPDATE, which holds the
+    sequence row until the caller's transaction ends, so concurrent callers
+    never get the same number and bulk generation never has to retry on the
+    unique constraint. A block is only released again if that transaction
+    rolls back.
+    """
+    if count < 1:
+        return []
+
+    prefix = sequence_prefix(name, company, year)
+    with transaction.atomic():
+        # The first number under a new prefix creates its counter; get_or_create absorbs a concurrent create
+        sequence, _ = NumberSequence.objects.get_or_create(
+            name=name,
+            prefix=prefix,
+            defaults={'next_value': lambda: _highest_existing(name, prefix) + 1},
+        )
+
+        rows = NumberSequence.objects.filter(pk=sequence.pk)
+        rows.update(next_value=F('next_value') + count, updated_at=timezone.now())
+        end = rows.values_list('next_value', flat=True).get()
+
+    return [format_number(prefix, value) for value in range(end - count, end)]
+
+
+def next_number(name, company=None, year=None):
+    """The next single number from a sequence"""
+    return allocate_numbers(name, 1, company, year)[0]
@@ -0,0 +1,842 @@
+# inventory/services.py
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .alerts import queue_stock_alerts
+from .costing import cost_movements
+from .models import (
+    Item, ItemLocationBalance, StockMovement, StockAdjustment, PurchaseOrder, PurchaseOrderItem, InventoryCount,
+    InventoryCountItem, StockValuationSnapshot
+)
+from .rollups import record_movements
+from .summary import invalidate_dashboard_summary
+from .writes import coalesce_item_writes, pending_changes, update_item, update_items
+
+
+# Sent once after a count's adjustments are committed, with instance and adjusted_item_ids
+inventory_count_completed = Signal()
+
+
+# Movement types that leave the item's total quantity unchanged
+NON_QUANTITY_MOVEMENTS = ('transfer',)
+
+
+def movements_recorded(movements):
+    """Feed newly saved movements into the costing engine and then, valued at their cost, the daily rollup"""
+    cost_movements(movements)
+    record_movements(movements)
+
+
+class InsufficientStockError(Exception):
+    """Raised when a movement would take an item's stock below zero"""
+
+    def __init__(self, item, requested, available):
+        self.item = item
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Not enough stock for {item}: requested {requested}, available {available}")
+
+
+def _refresh_balance(item):
+    """Read the committed balance back onto the in-memory item"""
+    quantity, minimum_stock, unit_price, total_value = Item.objects.filter(pk=item.pk).values_list(
+        'quantity', 'minimum_stock', 'unit_price', 'total_value'
+    ).get()
+    item.quantity = quantity
+    item.minimum_stock = minimum_stock
+    item.unit_price = unit_price
+    item.total_value = total_value
+    item._loaded_stock = (quantity, minimum_stock)
+    return quantity
+
+
+def apply_stock_movement(item, quantity, movement_type, performed_by=None, **movement_fields):
+    """
+    Apply a signed quantity change to an item and record the movement.
+
+    The item row is locked and its balance checked before it changes, so
+    concurrent movements on the same item can never lose an update or take
+    stock below zero. The movement is written in the same transaction with the
+    new balance, and the item's location balances, daily rollup and cost
+    layers are updated with it; transfers only move stock between location
+    balances. The new quantity and
+    the other item fields the movement changes (prices, dates, cost) are
+    written in one UPDATE by coalesce_item_writes() when the block ends.
+    """
+    with transaction.atomic(), coalesce_item_writes():
+        if movement_type in NON_QUANTITY_MOVEMENTS:
+            # Move the stock between the two locations; the source must hold enough of it
+            apply_location_deltas([
+                (item.pk, _location_for(-quantity, source_location=movement_fields.get('source_location')), -quantity),
+                (item.pk, _location_for(quantity, destination_location=movement_fields.get('destination_location')),
+                 quantity),
+            ], strict=True)
+            stock_after = _refresh_balance(item)
+        elif quantity == 0:
+            stock_after = _refresh_balance(item)
+        else:
+            previous_quantity = lock_item(item)
+            if previous_quantity + quantity < 0:
+                raise InsufficientStockError(item, -quantity, previous_quantity)
+
+            # The row is locked, so the new balance can be queued as a plain value
+            stock_after = previous_quantity + quantity
+            changes = {'quantity': stock_after, 'updated_at': timezone.now()}
+            if movement_type == 'in':
+                changes['last_received_date'] = timezone.now().date()
+                # Keep the receipt price for historical reference; costing still
+                # reads the stored price, so opening stock is valued before it
+                if movement_fields.get('unit_price'):
+                    changes['unit_price'] = movement_fields['unit_price']
+            update_item(item, **changes)
+            item._loaded_stock = (stock_after, item.minimum_stock)
+
+            apply_location_deltas([(item.pk, _location_for(quantity, **_movement_locations(movement_fields)), quantity)])
+            queue_stock_alerts([
+                (item.pk, previous_quantity, item.minimum_stock, stock_after, item.minimum_stock)
+            ])
+
+        movement = StockMovement.objects.create(
+            item=item,
+            quantity=quantity,
+            movement_type=movement_type,
+            performed_by=performed_by,
+            stock_after=stock_after,
+            **movement_fields
+        )
+        movements_recorded([movement])
+        return movement
+
+
+def _movement_locations(movement_fields):
+    return {
+        'source_location': movement_fields.get('source_location'),
+        'destination_location': movement_fields.get('destination_location'),
+    }
+
+
+def _location_for(quantity, source_location=None, destination_location=None):
+    """Location a signed movement applies to: where stock arrives, or where it is taken from"""
+    location = destination_location if quantity > 0 else source_location
+    return getattr(location, 'pk', location)
+
+
+def movement_location_deltas(movements):
+    """(item_id, location_id, quantity) location changes for a list of movements"""
+    return [
+        (movement.item_id,
+         _location_for(movement.quantity, movement.source_location_id, movement.destination_location_id),
+         movement.quantity)
+        for movement in movements
+    ]
+
+
+def stock_at_location(item_ids, location_id, lock=False):
+    """
+    How many of each item are held at one location, as {item_id: quantity}.
+
+    Stock from before balances were tracked counts as being at the item's own
+    location, the same way apply_location_deltas() places it. With `lock`, the
+    items and their balances are locked for the rest of the transaction.
+    """
+    items = Item.objects.filter(pk__in=item_ids)
+    balances = ItemLocationBalance.objects.filter(item_id__in=item_ids)
+    if lock:
+        items, balances = items.select_for_update(), balances.select_for_update()
+
+    held = defaultdict(dict)
+    for item_id, balance_location_id, quantity in balances.values_list('item_id', 'location_id', 'quantity'):
+        held[item_id][balance_location_id] = quantity
+
+    stock = {}
+    for pk, quantity, home in items.values_list('pk', 'quantity', 'location_id'):
+        quantity = pending_changes(pk).get('quantity', quantity)
+        stock[pk] = held[pk].get(location_id, 0)
+        if home == location_id:
+            stock[pk] += max(quantity - sum(held[pk].values()), 0)
+    return stock
+
+
+def apply_location_deltas(deltas, strict=False):
+    """
+    Apply signed quantity changes to per-location balances after the item totals have changed.
+
+    `deltas` is an iterable of (item_id, location_id, quantity); a location of
+    None means the item's own location (or unassigned stock when it has none).
+    Items and their balances are locked and read in two queries. Stock held
+    before balances were tracked is treated as being at the item's own
+    location, so every item's balances always add up to its quantity.
+    Decreases come from the named location first and, unless `strict`, the rest
+    from the item's other locations. A strict decrease larger than the
+    location's balance raises InsufficientStockError.
+    """
+    deltas = [(item_id, location_id, quantity) for item_id, location_id, quantity in deltas if quantity]
+    if not deltas:
+        return
+
+    item_ids = {item_id for item_id, location_id, quantity in deltas}
+    items = {}
+    for pk, quantity, location_id in Item.objects.select_for_update().filter(
+            pk__in=item_ids).values_list('pk', 'quantity', 'location_id'):
+        # A new total still waiting in coalesce_item_writes() is the one the deltas apply to
+        items[pk] = (pending_changes(pk).get('quantity', quantity), location_id)
+
+    rows = defaultdict(dict)
+    for balance in ItemLocationBalance.objects.select_for_update().filter(item_id__in=item_ids):
+        rows[balance.item_id][balance.location_id] = balance
+    quantities = {item_id: {location_id: row.quantity for location_id, row in rows[item_id].items()}
+                  for item_id in item_ids}
+
+    net = defaultdict(int)
+    for item_id, location_id, quantity in deltas:
+        net[item_id] += quantity
+
+    # Stock from before balances were tracked sits at the item's own location
+    for item_id in item_ids:
+        total, home = items[item_id]
+        untracked = total - net[item_id] - sum(quantities[item_id].values())
+        if untracked > 0:
+            quantities[item_id][home] = quantities[item_id].get(home, 0) + untracked
+
+    for item_id, location_id, quantity in deltas:
+        home = items[item_id][1]
+        location_id = location_id or home
+        balances = quantities[item_id]
+
+        if quantity > 0:
+            balances[location_id] = balances.get(location_id, 0) + quantity
+            continue
+
+        needed = -quantity
+        available = balances.get(location_id, 0)
+        if strict and available < needed:
+            raise InsufficientStockError(Item.objects.get(pk=item_id), needed, available)
+
+        taken = min(needed, available)
+        balances[location_id] = available - taken
+        needed -= taken
+
+        # Take the rest from the item's own location, then the fullest ones
+        for other in sorted(balances, key=lambda key: (key != home, -balances[key])):
+            if not needed:
+                break
+            taken = min(needed, balances[other])
+            balances[other] -= taken
+            needed -= taken
+
+    updates, creates = [], []
+    for item_id, balances in quantities.items():
+        for location_id, quantity in balances.items():
+            row = rows[item_id].get(location_id)
+            if row is None:
+                if quantity:
+                    creates.append(ItemLocationBalance(item_id=item_id, location_id=location_id, quantity=quantity))
+            elif row.quantity != quantity:
+                row.quantity = quantity
+                row.updated_at = timezone.now()
+                updates.append(row)
+
+    ItemLocationBalance.objects.bulk_update(updates, ['quantity', 'updated_at'])
+    ItemLocationBalance.objects.bulk_create(creates)
+
+
+def reconcile_location_balances(batch_size=1000):
+    """
+    Bring every item's location balances in line with its quantity.
+
+    Missing stock is added at the item's own location and surplus is taken off
+    its balances, so the balances add up to the item quantity. Also seeds the
+    balances for stock that existed before they were tracked. Returns the
+    number of items corrected.
+    """
+    corrected = 0
+    item_ids = list(Item.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(item_ids), batch_size):
+        batch = item_ids[start:start + batch_size]
+        with transaction.atomic():
+            totals = dict(
+                ItemLocationBalance.objects.filter(item_id__in=batch).values('item_id').annotate(
+                    total=Sum('quantity')
+                ).values_list('item_id', 'total')
+            )
+            # The difference is applied as a change the item total already reflects
+            differences = [
+                (pk, None, quantity - (totals.get(pk) or 0))
+                for pk, quantity in Item.objects.filter(pk__in=batch).values_list('pk', 'quantity')
+            ]
+            apply_location_deltas(differences)
+            corrected += sum(1 for pk, location_id, difference in differences if difference)
+    return corrected
+
+
+def transfer_stock(item, quantity, source_location, destination_location, performed_by=None, **movement_fields):
+    """Move stock between two locations in one transaction; the item total is unchanged"""
+    return apply_stock_movement(
+        item,
+        quantity,
+        'transfer',
+        performed_by=performed_by,
+        source_location=source_location,
+        destination_location=destination_location,
+        **movement_fields
+    )
+
+
+def location_stock(location):
+    """Items held at a location with their quantities, in one query"""
+    return ItemLocationBalance.objects.filter(
+        location=location,
+        quantity__gt=0,
+        item__is_active=True
+    ).select_related('item', 'item__category').order_by('item__name')
+
+
+def lock_item(item):
+    """Lock the item row for the current transaction, read its stock levels onto the item and return its quantity"""
+    item.quantity, item.minimum_stock = Item.objects.select_for_update().filter(pk=item.pk).values_list(
+        'quantity', 'minimum_stock'
+    ).get()
+    return item.quantity
+
+
+def set_stock_level(item, new_quantity, movement_type='adjustment', performed_by=None,
+                    counted_date=None, **movement_fields):
+    """
+    Set an item to an absolute quantity (counts and adjustments) and record the difference.
+
+    The item row is locked for the duration of the transaction so the recorded
+    difference is taken against the balance that is actually replaced. The
+    difference is rolled up and costed like any other movement, and the new
+    quantity is written with the movement's cost in one UPDATE.
+    Returns the movement, or None when the quantity did not change.
+    """
+    with transaction.atomic(), coalesce_item_writes():
+        previous_quantity = lock_item(item)
+
+        update_item(
+            item,
+            quantity=new_quantity,
+            last_counted_date=counted_date or timezone.now().date(),
+            updated_at=timezone.now(),
+        )
+        item._loaded_stock = (new_quantity, item.minimum_stock)
+
+        difference = new_quantity - previous_quantity
+        if difference == 0:
+            return None
+
+        apply_location_deltas([(item.pk, _location_for(difference, **_movement_locations(movement_fields)), difference)])
+        queue_stock_alerts([(item.pk, previous_quantity, item.minimum_stock, new_quantity, item.minimum_stock)])
+
+        movement = StockMovement.objects.create(
+            item=item,
+            quantity=difference,
+            movement_type=movement_type,
+            performed_by=performed_by,
+            stock_after=new_quantity,
+            **movement_fields
+        )
+        movements_recorded([movement])
+        return movement
+
+
+class KitShortageError(Exception):
+    """
+    Raised when stock on hand can't cover a kit issue.
+
+    `shortages` lists every short component as (item id, item name, required,
+    available), so the whole shortfall can be reported at once.
+    """
+
+    def __init__(self, kit, kits, shortages):
+        self.kit = kit
+        self.kits = kits
+        self.shortages = shortages
+        details = '; '.join(
+            f"{name}: need {required}, have {available}" for _, name, required, available in shortages
+        )
+        super().__init__(f"Not enough stock to issue {kits} x {kit}: {details}")
+
+
+def kit_requirements(kit, kits=1):
+    """Quantity of each item needed for `kits` kits, as {item_id: quantity}"""
+    requirements = defaultdict(int)
+    for item_id, quantity in kit.components.values_list('item_id', 'quantity'):
+        requirements[item_id] += quantity * kits
+    return dict(requirements)
+
+
+def issue_kit(kit, kits, job_reference='', source_location=None, performed_by=None, notes=''):
+    """
+    Issue `kits` complete kits to a job as one batch of stock out movements.
+
+    Every component is locked and checked against its stock in one query, and
+    nothing is issued unless all of them can be; otherwise KitShortageError
+    lists each short component. The movements are written with one bulk
+    INSERT and the item balances with one bulk UPDATE, together with their
+    cost, instead of a save and signal cascade per component. Stock is taken
+    from `source_location` first, then the items' other locations.
+    Returns the created movements.
+    """
+    requirements = kit_requirements(kit, kits)
+    if kits < 1 or not requirements:
+        return []
+
+    now = timezone.now()
+    reference_number = f"Kit {kit.name} x {kits}"
+
+    with transaction.atomic(), coalesce_item_writes():
+        # Lock and read every component in one query
+        balances = {
+            pk: (quantity, minimum_stock, name)
+            for pk, quantity, minimum_stock, name in Item.objects.select_for_update().filter(
+                pk__in=requirements
+            ).values_list('pk', 'quantity', 'minimum_stock', 'name')
+        }
+
+        shortages = [
+            (item_id, balances[item_id][2], required, balances[item_id][0])
+            for item_id, required in requirements.items()
+            if required > balances[item_id][0]
+        ]
+        if shortages:
+            raise KitShortageError(kit, kits, sorted(shortages, key=lambda shortage: shortage[1]))
+
+        movements, items, changes = [], {}, []
+        for item_id, required in requirements.items():
+            quantity, minimum_stock, name = balances[item_id]
+            stock_after = quantity - required
+
+            # The rows are locked, so the new balances can be written as plain values
+            items[item_id] = {'quantity': stock_after, 'updated_at': now}
+            changes.append((item_id, quantity, minimum_stock, stock_after, minimum_stock))
+            movements.append(StockMovement(
+                item_id=item_id,
+                quantity=-required,
+                movement_type='out',
+                movement_date=now,
+                source_location=source_location,
+                reference_number=reference_number,
+                job_reference=job_reference,
+                performed_by=performed_by,
+                stock_after=stock_after,
+                notes=notes,
+            ))
+
+        update_items(items)
+        movements = StockMovement.objects.bulk_create(movements)
+        movements_recorded(movements)
+        apply_location_deltas(movement_location_deltas(movements))
+        queue_stock_alerts(changes)
+
+        # Bulk writes skip the save signals, so refresh the dashboard here
+        invalidate_dashboard_summary()
+
+    return movements
+
+
+def add_purchase_order_lines(purchase_order, lines):
+    """
+    Add many lines to a purchase order with one INSERT and one totals UPDATE.
+
+    `lines` is an iterable of (item, quantity, unit_price); a unit price of
+    None falls back to the item's own price. The order total moves by the sum
+    of the new lines, so the cost doesn't grow with the lines already on it.
+    Returns the created lines.
+    """
+    po_items = []
+    for item, quantity, unit_price in lines:
+        if unit_price is None:
+            unit_price = item.unit_price or 0
+        po_items.append(PurchaseOrderItem(
+            purchase_order=purchase_order,
+            item=item,
+            quantity_ordered=quantity,
+            unit_price=unit_price,
+            line_total=quantity * unit_price,
+        ))
+    if not po_items:
+        return []
+
+    with transaction.atomic():
+        po_items = PurchaseOrderItem.objects.bulk_create(po_items)
+        purchase_order.add_to_subtotal(sum(po_item.line_total for po_item in po_items))
+
+    return po_items
+
+
+def recalculate_purchase_order_totals(purchase_orders=None):
+    """
+    Recompute purchase order subtotals and totals from their lines, repairing any drift.
+
+    The line totals are summed per order in one grouped subquery, and only the
+    orders whose stored subtotal or total differ are written back, with one
+    bulk UPDATE. Returns the number of orders repaired.
+    """
+    purchase_orders = PurchaseOrder.objects.all() if purchase_orders is None else purchase_orders
+    money = DecimalField(max_digits=12, decimal_places=2)
+    line_totals = PurchaseOrderItem.objects.filter(purchase_order=OuterRef('pk')).order_by().values(
+        'purchase_order'
+    ).annotate(total=Sum('line_total')).values('total')
+
+    with transaction.atomic():
+        repaired = []
+        for pk, subtotal, tax, shipping, total, lines_subtotal in purchase_orders.select_for_update().annotate(
+                lines_subtotal=Coalesce(Subquery(line_totals, output_field=money), Value(Decimal('0')),
+                                        output_field=money)
+        ).values_list('pk', 'subtotal', 'tax', 'shipping', 'total', 'lines_subtotal').iterator(chunk_size=2000):
+            expected_total = lines_subtotal + tax + shipping
+            if subtotal != lines_subtotal or total != expected_total:
+                repaired.append(PurchaseOrder(
+                    pk=pk, subtotal=lines_subtotal, total=expected_total, updated_at=timezone.now()
+                ))
+        PurchaseOrder.objects.bulk_update(repaired, ['subtotal', 'total', 'updated_at'], batch_size=1000)
+
+    return len(repaired)
+
+
+class OverReceiptError(Exception):
+    """Raised when a receipt exceeds the quantity still outstanding on a purchase order line"""
+
+    def __init__(self, line, quantity):
+        self.line = line
+        self.quantity = quantity
+        remaining = line.quantity_ordered - line.quantity_received
+        super().__init__(f"Cannot receive {quantity} x {line.item}: only {remaining} outstanding")
+
+
+def receive_purchase_order(purchase_order, quantities, location=None, performed_by=None):
+    """
+    Receive a whole delivery against a purchase order in one transaction.
+
+    `quantities` maps purchase order line pks to the quantity received now; zero
+    quantities are skipped. The movements are written with one bulk INSERT and
+    each item's new balance, price, dates and cost with one bulk UPDATE when the
+    coalesce_item_writes() block ends; the order status is worked out once at
+    the end. Lines without a location fall back to the item's own location.
+    Returns the created movements.
+    """
+    quantities = {int(pk): int(quantity) for pk, quantity in quantities.items() if quantity}
+    if not quantities:
+        return []
+
+    today = timezone.now().date()
+    reference_number = f"PO #{purchase_order.order_number}"
+
+    with transaction.atomic(), coalesce_item_writes():
+        # Lock the lines so concurrent receipts can't over-receive them
+        lines = list(
+            purchase_order.items.select_for_update().select_related('item').filter(pk__in=quantities)
+        )
+
+        received_by_item = defaultdict(int)
+        for line in lines:
+            quantity = quantities[line.pk]
+            if quantity < 0 or quantity > line.quantity_ordered - line.quantity_received:
+                raise OverReceiptError(line, quantity)
+            line.quantity_received += quantity
+            received_by_item[line.item_id] += quantity
+
+        # Lock and read every item on the delivery in one query
+        running, items = {}, {}
+        for pk, quantity, last_ordered_date in Item.objects.select_for_update().filter(
+                pk__in=received_by_item).values_list('pk', 'quantity', 'last_ordered_date'):
+            running[pk] = quantity
+            items[pk] = {'quantity': quantity + received_by_item[pk], 'last_received_date': today,
+                         'updated_at': timezone.now()}
+            if not last_ordered_date and purchase_order.order_date:
+                items[pk]['last_ordered_date'] = purchase_order.order_date
+
+        # Last line price wins, as for single receipts
+        for line in lines:
+            items[line.item_id]['unit_price'] = line.unit_price
+        update_items(items)
+
+        # Work out stock_after per movement from the locked balances
+        movements = []
+        for line in lines:
+            quantity = quantities[line.pk]
+            running[line.item_id] += quantity
+            movements.append(StockMovement(
+                item_id=line.item_id,
+                quantity=quantity,
+                movement_type='in',
+                reference_number=reference_number,
+                destination_location=location or line.item.location,
+                performed_by=performed_by,
+                stock_after=running[line.item_id],
+                unit_price=line.unit_price,
+            ))
+        movements = StockMovement.objects.bulk_create(movements)
+        movements_recorded(movements)
+        apply_location_deltas(movement_location_deltas(movements))
+
+        # Received quantities don't change line totals, so skip the per-line save cascade
+        PurchaseOrderItem.objects.bulk_update(lines, ['quantity_received'])
+
+        # Update purchase order status once for the whole delivery
+        if purchase_order.items.filter(quantity_received__lt=F('quantity_ordered')).exists():
+            purchase_order.status = 'partially_received'
+        else:
+            purchase_order.status = 'fully_received'
+            purchase_order.actual_delivery_date = today
+        # Only the receipt fields, so an earlier copy of the totals isn't written back
+        purchase_order.save(update_fields=['status', 'actual_delivery_date', 'updated_at'])
+
+    return movements
+
+
+def complete_inventory_count(inventory_count, completed_by, progress_callback=None, batch_size=500):
+    """
+    Complete an inventory count and apply every discrepancy in bulk.
+
+    All counted items and their balances at the count's location are locked
+    and read up front, the discrepancies against that location's stock are
+    worked out in a single pass and only the differences change the item
+    totals. Adjustments, movements and item balances are written with bulk
+    operations in batches of `batch_size`; each item's new balance and cost
+    go out in a single UPDATE at the end. `progress_callback`
+    is called with (processed, total) after each batch. Per-item save signals are
+    skipped; a single inventory_count_completed signal is sent once committed.
+    Returns a summary dict.
+    """
+    reference = inventory_count.count_reference
+    count_date = inventory_count.count_date
+    location = inventory_count.location
+
+    with transaction.atomic(), coalesce_item_writes():
+        count_items = list(
+            InventoryCountItem.objects.filter(
+                inventory_count=inventory_count,
+                counted_quantity__isnull=False
+            ).values_list('item_id', 'counted_quantity', 'notes')
+        )
+        total = len(count_items)
+
+        # Lock and read every counted item in one query
+        balances = {
+            pk: (quantity, minimum_stock)
+            for pk, quantity, minimum_stock in Item.objects.select_for_update().filter(
+                inventorycountitem__inventory_count=inventory_count
+            ).values_list('pk', 'quantity', 'minimum_stock')
+        }
+        # The count only covers the stock held at the counted location
+        counted_stock = stock_at_location(balances, location.pk, lock=True)
+
+        adjusted_item_ids = []
+        now = timezone.now()
+        for start in range(0, total, batch_size):
+            adjustments, movements, items, changes = [], [], {}, []
+
+            for item_id, counted_quantity, notes in count_items[start:start + batch_size]:
+                previous_quantity, minimum_stock = balances[item_id]
+                difference = counted_quantity - counted_stock[item_id]
+                if difference == 0:
+                    continue
+
+                new_quantity = previous_quantity + difference
+                adjusted_item_ids.append(item_id)
+                changes.append((item_id, previous_quantity, minimum_stock, new_quantity, minimum_stock))
+                adjustments.append(StockAdjustment(
+                    item_id=item_id,
+                    previous_quantity=previous_quantity,
+                    new_quantity=new_quantity,
+                    adjustment_quantity=difference,
+                    adjustment_date=now,
+                    performed_by=completed_by,
+                    reason=f"Inventory Count #{reference}",
+                    notes=notes
+                ))
+                movements.append(StockMovement(
+                    item_id=item_id,
+                    quantity=difference,
+                    movement_type='adjustment',
+                    movement_date=now,
+                    reference_number=f"Count #{reference}",
+                    source_location=location if difference < 0 else None,
+                    destination_location=location if difference > 0 else None,
+                    performed_by=completed_by,
+                    stock_after=new_quantity,
+                    notes=notes
+                ))
+                # total_value is set by the costing engine when the movement is recorded
+                items[item_id] = {'quantity': new_quantity, 'updated_at': now}
+
+            StockAdjustment.objects.bulk_create(adjustments)
+            StockMovement.objects.bulk_create(movements)
+            update_items(items)
+            movements_recorded(movements)
+            apply_location_deltas(movement_location_deltas(movements))
+            queue_stock_alerts(changes)
+
+            if progress_callback:
+                progress_callback(min(start + batch_size, total), total)
+
+        # Every counted item gets its last counted date in one UPDATE
+        Item.objects.filter(inventorycountitem__inventory_count=inventory_count).update(last_counted_date=count_date)
+
+        inventory_count.status = 'completed'
+        inventory_count.completed_by = completed_by
+        inventory_count.completed_at = now
+        inventory_count.save()
+
+        # Bulk writes skip the save signals, so refresh the dashboard here
+        invalidate_dashboard_summary()
+
+        # Notify once, after the whole count is committed
+        transaction.on_commit(lambda: inventory_count_completed.send(
+            sender=inventory_count.__class__,
+            instance=inventory_count,
+            adjusted_item_ids=adjusted_item_ids
+        ))
+
+    return {'counted': total, 'adjusted': len(adjusted_item_ids)}
+
+
+def record_count_scans(inventory_count, scans, counted_by=None):
+    """
+    Apply a batch of scanner submissions to an in-progress count.
+
+    Each scan is a dict with a `sku` (matched against SKU or supplier part
+    number), an optional `quantity` (default 1), a `mode` of 'add' (default) or
+    'set', and optional `notes` and `scan_id` echoed back. All codes are resolved
+    in one query, scans are applied in order in memory, and the count lines are
+    upserted with one bulk UPDATE and one bulk INSERT. Returns a result per scan.
+    """
+    results = []
+    valid = []
+    for index, scan in enumerate(scans):
+        result = {'scan_id': scan.get('scan_id', index), 'sku': str(scan.get('sku') or '').strip()}
+        results.append(result)
+        try:
+            quantity = int(scan.get('quantity', 1))
+        except (TypeError, ValueError):
+            quantity = -1
+        mode = scan.get('mode', 'add')
+
+        if not result['sku']:
+            result['status'] = 'invalid'
+            result['error'] = 'SKU is required'
+        elif quantity < 0 or mode not in ('add', 'set'):
+            result['status'] = 'invalid'
+            result['error'] = 'Quantity must be a whole number of zero or more and mode add or set'
+        else:
+            valid.append((result, quantity, mode, str(scan.get('notes') or '')))
+
+    codes = {result['sku'] for result, quantity, mode, notes in valid}
+    matches = defaultdict(set)
+    items = {}
+    for item in Item.objects.filter(Q(sku__in=codes) | Q(supplier_part_number__in=codes)).only(
+        'pk', 'name', 'sku', 'supplier_part_number'
+    ):
+        items[item.pk] = item
+        for code in (item.sku, item.supplier_part_number):
+            if code in codes:
+                matches[code].add(item.pk)
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Serialize batches for the same count so concurrent scanners can't create duplicate lines
+        InventoryCount.objects.select_for_update().filter(pk=inventory_count.pk).values_list('pk', flat=True).get()
+
+        lines = {
+            line.item_id: line
+            for line in InventoryCountItem.objects.filter(
+                inventory_count=inventory_count,
+                item_id__in=items
+            )
+        }
+        new_lines, touched = {}, set()
+        expected = stock_at_location([pk for pk in items if pk not in lines], inventory_count.location_id)
+
+        for result, quantity, mode, notes in valid:
+            item_ids = matches.get(result['sku'], set())
+            if not item_ids:
+                result['status'] = 'unknown_sku'
+                continue
+            if len(item_ids) > 1:
+                result['status'] = 'ambiguous'
+                result['error'] = 'SKU matches more than one item'
+                continue
+
+            item = items[next(iter(item_ids))]
+            line = lines.get(item.pk)
+            if line is None:
+                line = InventoryCountItem(
+                    inventory_count=inventory_count,
+                    item=item,
+                    expected_quantity=expected[item.pk],
+                )
+                lines[item.pk] = new_lines[item.pk] = line
+
+            if mode == 'set' or line.counted_quantity is None:
+                line.counted_quantity = quantity
+            else:
+                line.counted_quantity += quantity
+            line.discrepancy = line.counted_quantity - line.expected_quantity
+            line.counted_by = counted_by
+            line.counted_at = now
+            if notes:
+                line.notes = notes
+            touched.add(item.pk)
+
+            result.update({
+                'status': 'ok',
+                'item_id': item.pk,
+                'item': item.name,
+                'counted_quantity': line.counted_quantity,
+            })
+
+        InventoryCountItem.objects.bulk_update(
+            [lines[item_id] for item_id in touched if item_id not in new_lines],
+            ['counted_quantity', 'discrepancy', 'counted_by', 'counted_at', 'notes']
+        )
+        InventoryCountItem.objects.bulk_create(new_lines.values())
+
+    return results
+
+
+def valued_items():
+    """Active items that carry a stock value; the live valuation report and snapshots both count these"""
+    return Item.objects.filter(is_active=True).exclude(total_value=None)
+
+
+def take_valuation_snapshot(snapshot_date=None):
+    """
+    Store the day's stock valuation per category, company and location.
+
+    The valued items are aggregated once; re-running for the same date
+    replaces that day's rows. Returns the number of rows written.
+    """
+    snapshot_date = snapshot_date or timezone.now().date()
+
+    rows = valued_items().values('category', 'company', 'location').annotate(
+        item_count=Count('id'),
+        total_quantity=Sum('quantity'),
+        total_value=Coalesce(Sum('total_value'), Value(0), output_field=DecimalField(max_digits=14, decimal_places=2)),
+    ).order_by()
+
+    snapshots = [
+        StockValuationSnapshot(
+            snapshot_date=snapshot_date,
+            category_id=row['category'],
+            company=row['company'],
+            location_id=row['location'],
+            item_count=row['item_count'],
+            total_quantity=row['total_quantity'] or 0,
+            total_value=row['total_value'],
+        )
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        StockValuationSnapshot.objects.filter(snapshot_date=snapshot_date).delete()
+        StockValuationSnapshot.objects.bulk_create(snapshots)
+
+    return len(snapshots)
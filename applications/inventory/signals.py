@@ -1,10 +1,16 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models import F
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
 from threading import Thread
-from .models import Item, StockMovement, PurchaseOrder, PurchaseOrderItem, StockAdjustment
+from .models import Item, StockMovement, PurchaseOrder, PurchaseOrderItem, StockAdjustment, Supplier
+from .alerts import queue_stock_alerts
+from .search import get_search_backend, INDEXED_FIELDS
+from .services import inventory_count_completed
+from .summary import invalidate_dashboard_summary
+from .writes import update_item
 
 
 def send_email_async(subject, message, from_email, recipient_list):
@@ -19,74 +25,51 @@ def send_email_async(subject, message, from_email, recipient_list):
 
 
 @receiver(post_save, sender=Item)
-def check_low_stock_notifications(sender, instance, **kwargs):
-    """Send notifications when an item falls below minimum stock level"""
-    if instance.is_low_stock():
-        # Prepare recipients list - could be fetched from settings or user preferences
-        # For now, just send to superusers or defined stock managers
-        recipients = []
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        superusers = User.objects.filter(is_superuser=True)
-        recipients.extend([user.email for user in superusers if user.email])
+def queue_low_stock_alert(sender, instance, created, update_fields=None, **kwargs):
+    """Queue a digest alert when a save moves an item from OK to Low or from Low to Out"""
+    # Saves that don't touch stock levels can't change the item's state
+    if update_fields is not None and not {'quantity', 'minimum_stock'} & set(update_fields):
+        return
 
-        if recipients:
-            # Determine level of urgency
-            if instance.quantity == 0:
-                subject = f'URGENT: Item Out of Stock - {instance.name}'
-                urgency = 'OUT OF STOCK'
-            else:
-                subject = f'Low Stock Alert - {instance.name}'
-                urgency = 'LOW STOCK'
-
-            # Prepare message
-            message = f"""
-            {urgency}: {instance.name}
+    previous_quantity, previous_minimum = getattr(instance, '_loaded_stock', (None, None))
+    instance._loaded_stock = (instance.quantity, instance.minimum_stock)
+    if created or previous_quantity is None or previous_minimum is None:
+        return
 
-            Current Stock: {instance.quantity}
-            Minimum Stock: {instance.minimum_stock}
-            Location: {instance.location}
+    queue_stock_alerts([(
+        instance.pk, previous_quantity, previous_minimum, instance.quantity, instance.minimum_stock
+    )])
 
-            Details:
-            Company: {instance.get_company_display()}
-            SKU: {instance.sku}
-            Category: {instance.category}
 
-            Reorder Information:
-            Suggested Reorder Quantity: {instance.reorder_quantity}
-            Supplier: {instance.supplier}
-            Supplier Part Number: {instance.supplier_part_number}
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=StockMovement)
+@receiver(post_save, sender=PurchaseOrder)
+def refresh_dashboard_summary(sender, **kwargs):
+    """Invalidate the cached inventory dashboard when stock or orders change"""
+    invalidate_dashboard_summary()
 
-            Click here to view the item: {settings.SITE_URL}/inventory/items/{instance.pk}/
-            """
 
-            # Send email asynchronously
-            send_email_async(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                recipients
-            )
+@receiver(post_save, sender=Item)
+def update_item_search_index(sender, instance, update_fields=None, **kwargs):
+    """Keep the search index in sync when an item's searchable text changes"""
+    # Stock-only saves (movements, counts) don't touch indexed text
+    if update_fields is not None and not set(update_fields) & set(INDEXED_FIELDS + ('supplier',)):
+        return
+    get_search_backend().index_items([instance.pk])
 
 
-@receiver(post_save, sender=StockMovement)
-def update_item_on_movement(sender, instance, created, **kwargs):
-    """Update item details when a stock movement is recorded"""
-    if created:
-        item = instance.item
-
-        # Update last ordered or received date if applicable
-        if instance.movement_type == 'in':
-            item.last_received_date = timezone.now().date()
+@receiver(post_delete, sender=Item)
+def remove_item_from_search_index(sender, instance, **kwargs):
+    """Drop deleted items from the search index"""
+    get_search_backend().remove_items([instance.pk])
 
-        # Save unit price for historical reference if provided
-        if instance.unit_price:
-            # Only update the unit price if it's a stock in movement
-            if instance.movement_type == 'in':
-                item.unit_price = instance.unit_price
 
-        # Save the item
-        item.save()
+@receiver(post_save, sender=Supplier)
+def update_supplier_items_search_index(sender, instance, created, **kwargs):
+    """Re-index a supplier's items since the supplier name is searchable"""
+    if not created:
+        get_search_backend().index_items(list(instance.items.values_list('pk', flat=True)))
 
 
 @receiver(post_save, sender=PurchaseOrder)
@@ -134,10 +117,10 @@ def purchase_order_status_change(sender, instance, **kwargs):
             )
 
 
-@receiver(post_save, sender=PurchaseOrderItem)
+@receiver(pre_save, sender=PurchaseOrderItem)
 def purchase_order_item_received(sender, instance, **kwargs):
     """Update item when purchase order items are received"""
-    # Check if item was received (by comparing with previous quantity received)
+    # Check if item was received (by comparing with the stored quantity before it is overwritten)
     try:
         old_instance = PurchaseOrderItem.objects.get(pk=instance.pk)
         old_quantity_received = old_instance.quantity_received
@@ -148,24 +131,60 @@ def purchase_order_item_received(sender, instance, **kwargs):
     if instance.quantity_received > old_quantity_received:
         # Update item's last ordered date if not already set
         item = instance.item
+        changes = {'last_received_date': timezone.now().date(), 'updated_at': timezone.now()}
         if not item.last_ordered_date:
-            item.last_ordered_date = instance.purchase_order.order_date
+            changes['last_ordered_date'] = instance.purchase_order.order_date
 
-        # Update last received date
-        item.last_received_date = timezone.now().date()
-
-        # Save the item
-        item.save()
+        update_item(item, **changes)
 
 
 @receiver(post_save, sender=StockAdjustment)
 def update_item_on_adjustment(sender, instance, created, **kwargs):
     """Update item details when a stock adjustment is recorded"""
     if created:
-        item = instance.item
-
         # Update last counted date
-        item.last_counted_date = timezone.now().date()
+        update_item(instance.item, last_counted_date=timezone.now().date(), updated_at=timezone.now())
+
+
+@receiver(inventory_count_completed)
+def send_inventory_count_summary(sender, instance, adjusted_item_ids, **kwargs):
+    """Send one summary email for a completed count instead of an alert per item"""
+    from django.contrib.auth import get_user_model
+    User = get_user_model()
+    recipients = [email for email in User.objects.filter(is_superuser=True).values_list('email', flat=True) if email]
+
+    if not recipients:
+        return
 
-        # Save the item
-        item.save()
\ No newline at end of file
+    # Items the count left at or below minimum stock, in one query
+    low_items = Item.objects.filter(
+        pk__in=adjusted_item_ids,
+        quantity__lte=F('minimum_stock')
+    ).only('name', 'quantity', 'minimum_stock')
+
+    low_lines = "\n".join(
+        f"            - {item.name}: {item.quantity} (minimum {item.minimum_stock})" for item in low_items
+    ) or "            None"
+
+    subject = f'Inventory Count #{instance.count_reference} Completed'
+    message = f"""
+            Inventory Count #{instance.count_reference} has been completed.
+
+            Location: {instance.location}
+            Count Date: {instance.count_date}
+            Completed By: {instance.completed_by}
+            Items Adjusted: {len(adjusted_item_ids)}
+
+            Items at or below minimum stock after the count:
+{low_lines}
+
+            Click here to view the count: {settings.SITE_URL}/inventory/counts/{instance.pk}/
+            """
+
+    # Send email asynchronously
+    send_email_async(
+        subject,
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        recipients
+    )
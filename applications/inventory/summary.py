@@ -0,0 +1,68 @@
+# inventory/summary.py
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Item, StockMovement, PurchaseOrder
+
+
+DASHBOARD_CACHE_KEY = 'inventory_dashboard_summary'
+
+# Safety net only; saves invalidate the summary as soon as they commit
+DASHBOARD_CACHE_TIMEOUT = 60 * 15
+
+LOW_STOCK = Q(quantity__gt=0, quantity__lte=F('minimum_stock'))
+
+
+def _value_sum(company):
+    return Coalesce(
+        Sum('total_value', filter=Q(company=company)),
+        Value(0),
+        output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+
+
+def compute_dashboard_summary():
+    """
+    Build the inventory KPIs with one conditional aggregation over active items.
+
+    The short lists shown on the dashboard (low stock, recent movements, pending
+    purchase orders) are stored alongside so the whole page is one cache read.
+    """
+    summary = Item.objects.filter(is_active=True).aggregate(
+        total_items=Count('id'),
+        wisp_item_count=Count('id', filter=Q(company='wisp')),
+        fno_item_count=Count('id', filter=Q(company='fno')),
+        low_stock_count=Count('id', filter=LOW_STOCK),
+        out_of_stock_count=Count('id', filter=Q(quantity=0)),
+        wisp_stock_value=_value_sum('wisp'),
+        fno_stock_value=_value_sum('fno'),
+    )
+
+    summary['low_stock_items'] = list(
+        Item.objects.filter(LOW_STOCK, is_active=True).select_related('category', 'location')[:5]
+    )
+    summary['recent_movements'] = list(
+        StockMovement.objects.select_related('item').order_by('-movement_date')[:10]
+    )
+    summary['recent_purchase_orders'] = list(
+        PurchaseOrder.objects.filter(
+            status__in=['ordered', 'partially_received']
+        ).select_related('supplier').order_by('-order_date')[:5]
+    )
+    return summary
+
+
+def get_dashboard_summary():
+    """Return the cached dashboard summary, rebuilding it on a miss"""
+    summary = cache.get(DASHBOARD_CACHE_KEY)
+    if summary is None:
+        summary = compute_dashboard_summary()
+        cache.set(DASHBOARD_CACHE_KEY, summary, DASHBOARD_CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate_dashboard_summary():
+    """Drop the cached summary once the current transaction commits"""
+    transaction.on_commit(lambda: cache.delete(DASHBOARD_CACHE_KEY))
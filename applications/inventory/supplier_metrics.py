@@ -0,0 +1,188 @@
+# inventory/supplier_metrics.py
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, DateField, DecimalField, F, Max, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import PurchaseOrder, PurchaseOrderItem, Supplier, SupplierMetrics, SupplierItemPrice
+
+
+# Orders committed to but not yet fully delivered
+OPEN_ORDER_STATUSES = ('submitted', 'approved', 'ordered', 'partially_received')
+
+# Orders whose received quantities count towards the fill rate
+RECEIVED_ORDER_STATUSES = ('partially_received', 'fully_received')
+
+PRICE_TREND_DAYS = 365
+
+PRICE_PLACES = Decimal('0.01')
+RATE_PLACES = Decimal('0.0001')
+
+
+def lead_time_stats():
+    """Return {supplier id: (delivered orders, mean lead time days, p90 lead time days)} from delivered orders"""
+    rows = PurchaseOrder.objects.filter(
+        order_date__isnull=False,
+        actual_delivery_date__isnull=False
+    ).exclude(status='cancelled').values_list('supplier_id', 'order_date', 'actual_delivery_date')
+
+    suppliers, lead_times = [], []
+    for supplier_id, order_date, delivery_date in rows:
+        suppliers.append(supplier_id)
+        lead_times.append(max((delivery_date - order_date).days, 0))
+
+    if not suppliers:
+        return {}
+
+    suppliers = np.asarray(suppliers, dtype=np.int64)
+    lead_times = np.asarray(lead_times, dtype=np.float64)
+    order = np.argsort(suppliers, kind='stable')
+    suppliers, lead_times = suppliers[order], lead_times[order]
+    unique_suppliers, starts = np.unique(suppliers, return_index=True)
+
+    result = {}
+    for supplier_id, group in zip(unique_suppliers, np.split(lead_times, starts[1:])):
+        result[int(supplier_id)] = (len(group), float(group.mean()), float(np.percentile(group, 90)))
+    return result
+
+
+def order_stats():
+    """Order counts and last order date per supplier, in one grouped query"""
+    return {
+        row['supplier_id']: row
+        for row in PurchaseOrder.objects.exclude(status='cancelled').values('supplier_id').annotate(
+            order_count=Count('id'),
+            last_order_date=Max('order_date'),
+            open_order_count=Count('id', filter=Q(status__in=OPEN_ORDER_STATUSES)),
+        ).order_by()
+    }
+
+
+def outstanding_stats():
+    """Value of the quantities still to be delivered on open orders per supplier, in one grouped query"""
+    return dict(
+        PurchaseOrderItem.objects.filter(
+            purchase_order__status__in=OPEN_ORDER_STATUSES,
+            quantity_received__lt=F('quantity_ordered')
+        ).values('purchase_order__supplier_id').annotate(
+            value=Sum(
+                (F('quantity_ordered') - F('quantity_received')) * F('unit_price'),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            )
+        ).order_by().values_list('purchase_order__supplier_id', 'value')
+    )
+
+
+def fill_stats():
+    """(quantity ordered, quantity received) per supplier on received orders, in one grouped query"""
+    return {
+        supplier_id: (ordered or 0, received or 0)
+        for supplier_id, ordered, received in PurchaseOrderItem.objects.filter(
+            purchase_order__status__in=RECEIVED_ORDER_STATUSES
+        ).values('purchase_order__supplier_id').annotate(
+            ordered=Sum('quantity_ordered'),
+            received=Sum('quantity_received'),
+        ).order_by().values_list('purchase_order__supplier_id', 'ordered', 'received')
+    }
+
+
+def price_trends(since):
+    """
+    Price figures per (supplier id, item id) from the order lines placed since a date.
+
+    The lines are read once in supplier, item and date order, so the first and
+    last price of each pair fall out of the same pass as the count, average,
+    minimum and maximum. Orders without an order date count from when they
+    were created.
+    """
+    rows = PurchaseOrderItem.objects.exclude(purchase_order__status='cancelled').annotate(
+        order_day=Coalesce(
+            'purchase_order__order_date', TruncDate('purchase_order__created_at'), output_field=DateField()
+        )
+    ).filter(order_day__gte=since).order_by(
+        'purchase_order__supplier_id', 'item_id', 'order_day', 'id'
+    ).values_list('purchase_order__supplier_id', 'item_id', 'order_day', 'unit_price').iterator(chunk_size=5000)
+
+    trends = {}
+    for supplier_id, item_id, order_day, unit_price in rows:
+        trend = trends.get((supplier_id, item_id))
+        if trend is None:
+            trend = trends[(supplier_id, item_id)] = {
+                'line_count': 0,
+                'total': Decimal('0'),
+                'first_unit_price': unit_price,
+                'min_unit_price': unit_price,
+                'max_unit_price': unit_price,
+            }
+        trend['line_count'] += 1
+        trend['total'] += unit_price
+        trend['last_unit_price'] = unit_price
+        trend['last_order_date'] = order_day
+        trend['min_unit_price'] = min(trend['min_unit_price'], unit_price)
+        trend['max_unit_price'] = max(trend['max_unit_price'], unit_price)
+    return trends
+
+
+def refresh_supplier_metrics(price_trend_days=PRICE_TREND_DAYS):
+    """
+    Recompute the supplier metrics and item price trends tables.
+
+    Every figure comes from a handful of grouped queries over the purchase
+    order history, and both tables are replaced in one transaction, so the
+    supplier pages and the reorder engine read precomputed rows instead of
+    aggregating orders per request. Returns a summary dict.
+    """
+    now = timezone.now()
+    lead_times = lead_time_stats()
+    orders = order_stats()
+    outstanding = outstanding_stats()
+    fills = fill_stats()
+    trends = price_trends(timezone.localdate() - timezone.timedelta(days=price_trend_days - 1))
+
+    metrics = []
+    for supplier_id in Supplier.objects.values_list('pk', flat=True):
+        delivered, average_lead_time, p90_lead_time = lead_times.get(supplier_id, (0, None, None))
+        order_row = orders.get(supplier_id, {})
+        ordered, received = fills.get(supplier_id, (0, 0))
+        metrics.append(SupplierMetrics(
+            supplier_id=supplier_id,
+            delivered_order_count=delivered,
+            average_lead_time_days=average_lead_time,
+            p90_lead_time_days=p90_lead_time,
+            quantity_ordered=ordered,
+            quantity_received=received,
+            fill_rate=(Decimal(received) / Decimal(ordered)).quantize(RATE_PLACES) if ordered else None,
+            order_count=order_row.get('order_count', 0),
+            open_order_count=order_row.get('open_order_count', 0),
+            open_order_value=(outstanding.get(supplier_id) or Decimal('0')).quantize(PRICE_PLACES),
+            last_order_date=order_row.get('last_order_date'),
+            computed_at=now,
+        ))
+
+    prices = []
+    for (supplier_id, item_id), trend in trends.items():
+        first, last = trend['first_unit_price'], trend['last_unit_price']
+        prices.append(SupplierItemPrice(
+            supplier_id=supplier_id,
+            item_id=item_id,
+            line_count=trend['line_count'],
+            first_unit_price=first,
+            last_unit_price=last,
+            average_unit_price=(trend['total'] / trend['line_count']).quantize(PRICE_PLACES),
+            min_unit_price=trend['min_unit_price'],
+            max_unit_price=trend['max_unit_price'],
+            price_change=((last - first) / first).quantize(RATE_PLACES) if first else None,
+            last_order_date=trend['last_order_date'],
+            computed_at=now,
+        ))
+
+    with transaction.atomic():
+        SupplierMetrics.objects.all().delete()
+        SupplierMetrics.objects.bulk_create(metrics, batch_size=1000)
+        SupplierItemPrice.objects.all().delete()
+        SupplierItemPrice.objects.bulk_create(prices, batch_size=1000)
+
+    return {'suppliers': len(metrics), 'item_prices': len(prices)}
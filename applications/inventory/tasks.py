@@ -0,0 +1,41 @@
+# inventory/tasks.py
+from celery import shared_task
+
+from .alerts import send_low_stock_digest
+from .cycle_counts import ABCClassifier, CycleCountScheduler
+from .forecasting import ReorderEngine
+from .services import take_valuation_snapshot
+from .supplier_metrics import refresh_supplier_metrics
+
+
+@shared_task
+def snapshot_stock_valuation():
+    """Nightly stock valuation snapshot for month-end and year-over-year reporting"""
+    return take_valuation_snapshot()
+
+
+@shared_task
+def refresh_supplier_analytics():
+    """Nightly refresh of supplier lead times, fill rates, open order value and item price trends"""
+    return refresh_supplier_metrics()
+
+
+@shared_task
+def generate_reorder_drafts():
+    """Nightly reorder run: forecast demand and raise draft purchase orders per supplier"""
+    orders = ReorderEngine().run()
+    return [order.order_number for order in orders]
+
+
+@shared_task
+def schedule_cycle_counts():
+    """Nightly ABC classification, then raise the cycle counts that are due by class"""
+    summary = ABCClassifier().run()
+    summary['counts'] = [count.count_reference for count in CycleCountScheduler().run()]
+    return summary
+
+
+@shared_task
+def send_low_stock_alert_digest():
+    """Send queued low stock alerts as one digest per recipient"""
+    return send_low_stock_digest()
@@ -1,3 +1,1267 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connection, transaction
+from django.http import StreamingHttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+# Receivers are connected from wsgi.py, which the test runner doesn't load
+from . import importers, search, signals, views
+from .alerts import send_low_stock_digest
+from .costing import recompute_costs
+from .cycle_counts import CYCLE_COUNT_NOTE, ABCClassifier, CycleCountScheduler, pareto_ranks
+from .forecasting import DRAFT_PO_NOTE, ReorderEngine
+from .history import stock_as_of
+from .forms import PurchaseOrderLinesForm, ReceivePurchaseOrderForm
+from .models import (
+    Category, CostLayer, InventoryCount, Item, ItemLocationBalance, Kit, Location, LowStockAlert, PurchaseOrder,
+    PurchaseOrderItem, StockMovement, StockMovementDaily, Supplier, SupplierItemPrice, SupplierMetrics
+)
+from .rollups import movement_totals_by_type, rebuild_rollups
+from .sequences import allocate_numbers, next_number
+from .search import BaseSearchBackend, DatabaseSearchBackend, SqliteFTS5Backend, get_search_backend
+from .services import (
+    InsufficientStockError, KitShortageError, OverReceiptError, add_purchase_order_lines, apply_stock_movement,
+    complete_inventory_count, inventory_count_completed, issue_kit, receive_purchase_order,
+    recalculate_purchase_order_totals, record_count_scans, take_valuation_snapshot
+)
+from .summary import get_dashboard_summary
+from .supplier_metrics import refresh_supplier_metrics
+
+
+class InventoryTestMixin:
+    """Shared location, supplier and item factories"""
+
+    def setUp(self):
+        # Creating the FTS5 table is rolled back with each test, and these tests don't search
+        for module in (signals, importers):
+            patcher = mock.patch.object(module, 'get_search_backend', return_value=BaseSearchBackend())
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.location = Location.objects.create(name='Main Store', company='wisp')
+        self.supplier = Supplier.objects.create(name='Acme Networks')
+
+    def make_item(self, quantity=0, unit_price='3.00', **fields):
+        return Item.objects.create(
+            name=fields.pop('name', 'Patch Cable'),
+            quantity=quantity,
+            unit_price=Decimal(unit_price) if unit_price is not None else None,
+            location=fields.pop('location', self.location),
+            supplier=fields.pop('supplier', self.supplier),
+            **fields
+        )
+
+    def make_purchase_order(self, lines, status='ordered'):
+        """A purchase order with (item, quantity, unit price) lines"""
+        purchase_order = PurchaseOrder.objects.create(supplier=self.supplier, company='wisp', status=status)
+        for item, quantity, unit_price in lines:
+            PurchaseOrderItem.objects.create(
+                purchase_order=purchase_order,
+                item=item,
+                quantity_ordered=quantity,
+                unit_price=Decimal(unit_price),
+            )
+        return purchase_order
+
+
+class ApplyStockMovementTests(InventoryTestMixin, TestCase):
+    """Quantity changes through the atomic stock service"""
+
+    def test_movement_changes_quantity_and_records_balance(self):
+        item = self.make_item(quantity=5)
+
+        movement = apply_stock_movement(item, -2, 'out', job_reference='JOB-1')
+
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 3)
+        self.assertEqual(movement.stock_after, 3)
+        self.assertEqual(movement.quantity, -2)
+
+    def test_insufficient_stock_raises_and_leaves_balance(self):
+        item = self.make_item(quantity=2)
+
+        with self.assertRaises(InsufficientStockError) as raised:
+            apply_stock_movement(item, -3, 'out')
+
+        self.assertEqual(raised.exception.requested, 3)
+        self.assertEqual(raised.exception.available, 2)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 2)
+        self.assertFalse(StockMovement.objects.filter(item=item).exists())
+
+    def test_receipt_writes_item_fields_in_one_update(self):
+        item = self.make_item(quantity=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            apply_stock_movement(item, 3, 'in', unit_price=Decimal('4.00'), destination_location=self.location)
+
+        item_updates = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "inventory_item"')
+        ]
+        self.assertEqual(len(item_updates), 1)
+
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 4)
+        self.assertEqual(item.unit_price, Decimal('4.00'))
+        self.assertIsNotNone(item.last_received_date)
+        self.assertIsNotNone(item.average_cost)
+
+    def test_movement_is_rolled_up_and_costed_by_the_service(self):
+        item = self.make_item(quantity=0)
+
+        movement = apply_stock_movement(item, 2, 'in', unit_price=Decimal('4.00'), destination_location=self.location)
+
+        movement.refresh_from_db()
+        self.assertEqual(movement.cost_amount, Decimal('8.00'))
+        rollup = StockMovementDaily.objects.get(item=item)
+        self.assertEqual((rollup.movement_count, rollup.quantity_in), (1, 2))
+
+
+class ReceivePurchaseOrderTests(InventoryTestMixin, TestCase):
+    """Whole deliveries received against a purchase order"""
+
+    def setUp(self):
+        super().setUp()
+        self.cable = self.make_item(name='Patch Cable', quantity=1)
+        self.bracket = self.make_item(name='Wall Bracket', quantity=0)
+        self.purchase_order = self.make_purchase_order([(self.cable, 4, '3.00'), (self.bracket, 2, '8.00')])
+        self.cable_line, self.bracket_line = self.purchase_order.items.order_by('pk')
+
+    def test_delivery_receives_every_line(self):
+        movements = receive_purchase_order(
+            self.purchase_order, {self.cable_line.pk: 3, self.bracket_line.pk: 2}, location=self.location
+        )
+
+        self.assertEqual([movement.stock_after for movement in movements], [4, 2])
+        self.cable.refresh_from_db()
+        self.bracket.refresh_from_db()
+        self.assertEqual((self.cable.quantity, self.bracket.quantity), (4, 2))
+        self.cable_line.refresh_from_db()
+        self.assertEqual(self.cable_line.quantity_received, 3)
+        self.purchase_order.refresh_from_db()
+        self.assertEqual(self.purchase_order.status, 'partially_received')
+
+        receive_purchase_order(self.purchase_order, {self.cable_line.pk: 1})
+        self.purchase_order.refresh_from_db()
+        self.assertEqual(self.purchase_order.status, 'fully_received')
+        self.assertIsNotNone(self.purchase_order.actual_delivery_date)
+
+    def test_over_receipt_rejects_the_whole_delivery(self):
+        with self.assertRaises(OverReceiptError) as raised:
+            self.purchase_order.receive_items({self.cable_line.pk: 1, self.bracket_line.pk: 3})
+
+        self.assertEqual(raised.exception.line.pk, self.bracket_line.pk)
+        self.assertIn('only 2 outstanding', str(raised.exception))
+        self.cable.refresh_from_db()
+        self.assertEqual(self.cable.quantity, 1)
+        self.assertFalse(StockMovement.objects.exists())
+        self.purchase_order.refresh_from_db()
+        self.assertEqual(self.purchase_order.status, 'ordered')
+
+    def test_over_receipt_is_reported_on_the_line(self):
+        form = ReceivePurchaseOrderForm({f'receive_{self.bracket_line.pk}': 2}, purchase_order=self.purchase_order)
+        self.assertTrue(form.is_valid())
+
+        form.add_receipt_error(OverReceiptError(self.bracket_line, 3))
+
+        self.assertEqual(
+            form.errors[f'receive_{self.bracket_line.pk}'],
+            ['Cannot receive 3 x Wall Bracket: only 2 outstanding']
+        )
+
+    def test_receive_view_shows_the_over_received_line(self):
+        user = get_user_model().objects.create_user(username='storeman', password='secret')
+        self.client.force_login(user)
+        error = OverReceiptError(self.bracket_line, 3)
+
+        with mock.patch.object(PurchaseOrder, 'receive_items', side_effect=error):
+            response = self.client.post(
+                reverse('inventory:receive_items_form', args=[self.purchase_order.pk]),
+                {f'receive_{self.bracket_line.pk}': 2}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Cannot receive 3 x Wall Bracket: only 2 outstanding')
+
+
+class CostMovementsTests(InventoryTestMixin, TestCase):
+    """FIFO and weighted-average costing of recorded movements"""
+
+    def receive_and_issue(self):
+        item = self.make_item(quantity=0, unit_price='2.00')
+        apply_stock_movement(item, 2, 'in', unit_price=Decimal('3.00'), destination_location=self.location)
+        apply_stock_movement(item, 2, 'in', unit_price=Decimal('5.00'), destination_location=self.location)
+        issue = apply_stock_movement(item, -3, 'out', source_location=self.location)
+        issue.refresh_from_db()
+        item.refresh_from_db()
+        return item, issue
+
+    @override_settings(INVENTORY_COSTING_METHOD='fifo')
+    def test_fifo_issues_the_oldest_layers_first(self):
+        item, issue = self.receive_and_issue()
+
+        self.assertEqual(issue.cost_amount, Decimal('11.00'))
+        self.assertEqual(item.average_cost, Decimal('5.0000'))
+        self.assertEqual(item.total_value, Decimal('5.00'))
+        self.assertEqual(
+            list(CostLayer.objects.filter(item=item, remaining_quantity__gt=0).values_list(
+                'remaining_quantity', 'unit_cost')),
+            [(1, Decimal('5.0000'))]
+        )
+
+    @override_settings(INVENTORY_COSTING_METHOD='average')
+    def test_average_issues_at_the_running_average(self):
+        item, issue = self.receive_and_issue()
+
+        self.assertEqual(issue.cost_amount, Decimal('12.00'))
+        self.assertEqual(item.average_cost, Decimal('4.0000'))
+        self.assertEqual(item.total_value, Decimal('4.00'))
+
+    def test_first_receipt_values_existing_stock_at_its_previous_price(self):
+        for method in ('fifo', 'average'):
+            with self.subTest(method=method), override_settings(INVENTORY_COSTING_METHOD=method):
+                item = self.make_item(name=f'Bracket {method}', quantity=1, unit_price='3.00')
+
+                apply_stock_movement(item, 3, 'in', unit_price=Decimal('4.00'), destination_location=self.location)
+
+                item.refresh_from_db()
+                self.assertEqual(item.average_cost, Decimal('3.7500'))
+                self.assertEqual(item.total_value, Decimal('15.00'))
+                self.assertEqual(item.unit_price, Decimal('4.00'))
+
+    def test_first_purchase_order_receipt_values_existing_stock_at_its_previous_price(self):
+        item = self.make_item(quantity=1, unit_price='3.00')
+        purchase_order = self.make_purchase_order([(item, 3, '4.00')])
+
+        receive_purchase_order(purchase_order, {purchase_order.items.get().pk: 3})
+
+        item.refresh_from_db()
+        self.assertEqual(item.average_cost, Decimal('3.7500'))
+        self.assertEqual(item.total_value, Decimal('15.00'))
+        self.assertEqual(item.unit_price, Decimal('4.00'))
+
+
+class CountScanTests(InventoryTestMixin, TestCase):
+    """Batches of scanner submissions against an inventory count"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username='counter', password='secret')
+        self.client.force_login(self.user)
+        self.cable = self.make_item(quantity=6, sku='PC-1')
+        self.bracket = self.make_item(name='Wall Bracket', quantity=2, sku='WB-1', supplier_part_number='ACME-9')
+        self.inventory_count = InventoryCount.objects.create(location=self.location, company='wisp')
+
+    def submit(self, scans):
+        return self.client.post(reverse('inventory:submit_count_scans', args=[self.inventory_count.pk]),
+                                json.dumps({'scans': scans}), content_type='application/json')
+
+    def test_scans_add_up_and_set_overrides(self):
+        results = record_count_scans(self.inventory_count, [
+            {'sku': 'PC-1'}, {'sku': 'PC-1', 'quantity': 2}, {'sku': 'ACME-9', 'quantity': 5},
+            {'sku': 'ACME-9', 'quantity': 1, 'mode': 'set', 'notes': 'Recounted'},
+        ], counted_by=self.user)
+        record_count_scans(self.inventory_count, [{'sku': 'PC-1', 'quantity': 4}], counted_by=self.user)
+
+        self.assertEqual([result['counted_quantity'] for result in results], [1, 3, 5, 1])
+        lines = {line.item_id: line for line in self.inventory_count.items.all()}
+        self.assertEqual((lines[self.cable.pk].counted_quantity, lines[self.cable.pk].discrepancy), (7, 1))
+        self.assertEqual((lines[self.bracket.pk].counted_quantity, lines[self.bracket.pk].notes), (1, 'Recounted'))
+
+    def test_bad_scans_are_reported_without_stopping_the_batch(self):
+        self.make_item(name='Other Bracket', sku='ACME-9')
+
+        results = record_count_scans(self.inventory_count, [
+            {'sku': '', 'scan_id': 'a'}, {'sku': 'PC-1', 'quantity': -1}, {'sku': 'PC-1', 'mode': 'replace'},
+            {'sku': 'NOPE'}, {'sku': 'ACME-9'}, {'sku': 'PC-1'},
+        ], counted_by=self.user)
+
+        self.assertEqual([result['status'] for result in results],
+                         ['invalid', 'invalid', 'invalid', 'unknown_sku', 'ambiguous', 'ok'])
+        self.assertEqual(results[0]['scan_id'], 'a')
+        self.assertEqual(self.inventory_count.items.count(), 1)
+
+    def test_api_summarises_the_batch(self):
+        response = self.submit([{'sku': 'PC-1', 'quantity': 6}, {'sku': 'NOPE'}])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['accepted'], response.json()['rejected']), (1, 1))
+
+    def test_api_rejects_malformed_batches_and_closed_counts(self):
+        self.assertEqual(self.submit('PC-1').status_code, 400)
+
+        self.inventory_count.status = 'completed'
+        self.inventory_count.save()
+
+        self.assertEqual(self.submit([{'sku': 'PC-1'}]).status_code, 409)
+
+
+class CategoryTreeTests(TestCase):
+    """Materialized category paths and names follow their parents"""
+
+    def setUp(self):
+        self.radio = Category.objects.create(name='Radio')
+        self.antennas = Category.objects.create(name='Antennas', parent=self.radio)
+        self.sectors = Category.objects.create(name='Sectors', parent=self.antennas)
+
+    def tree(self, category):
+        category.refresh_from_db()
+        return category.path, category.full_name, category.depth
+
+    def test_moving_a_category_rewrites_its_subtree(self):
+        fibre = Category.objects.create(name='Fibre')
+
+        self.antennas.parent = fibre
+        self.antennas.save()
+
+        self.assertEqual(self.tree(self.sectors), (
+            fibre.get_path_segment() + self.antennas.get_path_segment() + self.sectors.get_path_segment(),
+            'Fibre > Antennas > Sectors',
+            2,
+        ))
+        self.assertCountEqual(fibre.get_descendants(), [fibre, self.antennas, self.sectors])
+        self.assertCountEqual(self.radio.get_descendants(include_self=False), [])
+
+    def test_renaming_a_category_renames_its_subtree(self):
+        self.radio.name = 'Wireless'
+        self.radio.save()
+
+        self.assertEqual(self.tree(self.sectors)[1], 'Wireless > Antennas > Sectors')
+
+    def test_deleting_a_category_re_roots_its_children(self):
+        self.antennas.delete()
+
+        self.assertEqual(self.tree(self.sectors), (self.sectors.get_path_segment(), 'Sectors', 0))
+
+    def test_category_cannot_move_under_its_own_subtree(self):
+        self.radio.parent = self.sectors
+
+        with self.assertRaises(ValidationError):
+            self.radio.clean()
+
+    def test_rebuild_repairs_stale_paths(self):
+        Category.objects.filter(pk=self.sectors.pk).update(path='', full_name='', depth=0)
+
+        self.assertEqual(Category.rebuild_tree(), 1)
+        self.assertEqual(self.tree(self.sectors)[1:], ('Radio > Antennas > Sectors', 2))
+
+
+class LowStockAlertTests(InventoryTestMixin, TestCase):
+    """Alerts are queued when stock gets worse and sent as one digest"""
+
+    def setUp(self):
+        super().setUp()
+        get_user_model().objects.create_superuser(username='manager', email='manager@example.com', password='secret')
+        self.item = self.make_item(quantity=10, minimum_stock=5, sku='PC-1')
+
+    def levels(self):
+        return list(LowStockAlert.objects.order_by('pk').values_list('level', flat=True))
+
+    def test_alerts_are_queued_only_when_the_level_worsens(self):
+        apply_stock_movement(self.item, -6, 'out')
+        apply_stock_movement(self.item, -2, 'out')
+        apply_stock_movement(self.item, -2, 'out')
+        apply_stock_movement(self.item, 3, 'in')
+
+        self.assertEqual(self.levels(), ['low', 'out'])
+
+    def test_raising_the_minimum_on_save_queues_an_alert(self):
+        item = Item.objects.get(pk=self.item.pk)
+        item.minimum_stock = 12
+        item.save()
+        item.name = 'Patch Cable 2m'
+        item.save()
+
+        self.assertEqual(self.levels(), ['low'])
+
+    def test_digest_lists_each_item_once_and_skips_recovered_items(self):
+        recovered = self.make_item(name='Wall Bracket', quantity=3, minimum_stock=1)
+        apply_stock_movement(self.item, -6, 'out')
+        apply_stock_movement(self.item, -4, 'out')
+        apply_stock_movement(recovered, -3, 'out')
+        apply_stock_movement(recovered, 5, 'in')
+
+        self.assertEqual(send_low_stock_digest(), 1)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['manager@example.com'])
+        self.assertIn('OUT OF STOCK: Patch Cable (PC-1)', mail.outbox[0].body)
+        self.assertNotIn('Wall Bracket', mail.outbox[0].body)
+        self.assertFalse(LowStockAlert.objects.filter(sent_at__isnull=True).exists())
+        self.assertEqual(send_low_stock_digest(), 0)
+
+
+class DashboardSummaryTests(InventoryTestMixin, TestCase):
+    """The cached dashboard summary and its invalidation on commit"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.item = self.make_item(quantity=10, minimum_stock=5)
+        self.make_item(name='Dish', quantity=0, company='fno')
+
+    def test_summary_is_read_from_the_cache_until_a_change_commits(self):
+        summary = get_dashboard_summary()
+        self.assertEqual((summary['total_items'], summary['low_stock_count'], summary['out_of_stock_count']), (2, 0, 1))
+
+        with self.assertNumQueries(0):
+            get_dashboard_summary()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_stock_movement(self.item, -6, 'out')
+
+        summary = get_dashboard_summary()
+        self.assertEqual(summary['low_stock_count'], 1)
+        self.assertEqual(summary['low_stock_items'], [self.item])
+        self.assertEqual(summary['recent_movements'][0].quantity, -6)
+
+    def test_uncommitted_changes_keep_the_cached_summary(self):
+        get_dashboard_summary()
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            apply_stock_movement(self.item, -6, 'out')
+
+        self.assertTrue(callbacks)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_summary()['low_stock_count'], 0)
+
+    def test_bulk_count_completion_invalidates_the_summary(self):
+        user = get_user_model().objects.create_user(username='counter', password='secret')
+        self.item.sku = 'PC-1'
+        self.item.save()
+        inventory_count = InventoryCount.objects.create(location=self.location, company='wisp')
+        record_count_scans(inventory_count, [{'sku': 'PC-1', 'quantity': 4}], counted_by=user)
+        get_dashboard_summary()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_inventory_count(inventory_count, user)
+
+        self.assertEqual(get_dashboard_summary()['low_stock_count'], 1)
+
+
+class InventoryCountTests(InventoryTestMixin, TestCase):
+    """Counts adjust only the stock held at the counted location"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username='counter', password='secret')
+        self.yard = Location.objects.create(name='Yard', company='wisp')
+        self.item = self.make_item(quantity=0, sku='PC-1')
+        apply_stock_movement(self.item, 10, 'in', destination_location=self.location)
+        apply_stock_movement(self.item, 5, 'in', destination_location=self.yard)
+        self.inventory_count = InventoryCount.objects.create(location=self.location, company='wisp')
+
+    def balance(self, location):
+        return ItemLocationBalance.objects.get(item=self.item, location=location).quantity
+
+    def test_scans_expect_the_stock_at_the_counted_location(self):
+        results = record_count_scans(self.inventory_count, [{'sku': 'PC-1', 'quantity': 8}], counted_by=self.user)
+
+        self.assertEqual(results[0]['status'], 'ok')
+        line = self.inventory_count.items.get()
+        self.assertEqual((line.expected_quantity, line.discrepancy), (10, -2))
+
+    def test_completion_changes_the_total_by_the_location_difference(self):
+        record_count_scans(self.inventory_count, [{'sku': 'PC-1', 'quantity': 8}], counted_by=self.user)
+
+        summary = complete_inventory_count(self.inventory_count, self.user)
+
+        self.item.refresh_from_db()
+        self.assertEqual(summary['adjusted'], 1)
+        self.assertEqual(self.item.quantity, 13)
+        self.assertEqual((self.balance(self.location), self.balance(self.yard)), (8, 5))
+        movement = StockMovement.objects.get(item=self.item, movement_type='adjustment')
+        self.assertEqual((movement.quantity, movement.stock_after), (-2, 13))
+
+    def test_matching_count_leaves_other_locations_alone(self):
+        record_count_scans(self.inventory_count, [{'sku': 'PC-1', 'quantity': 10}], counted_by=self.user)
+
+        summary = complete_inventory_count(self.inventory_count, self.user)
+
+        self.item.refresh_from_db()
+        self.assertEqual(summary['adjusted'], 0)
+        self.assertEqual(self.item.quantity, 15)
+        self.assertEqual((self.balance(self.location), self.balance(self.yard)), (10, 5))
+
+
+    def test_batches_report_progress_and_notify_once_committed(self):
+        others = [self.make_item(quantity=3, name=f'Bracket {number}', sku=f'BR-{number}') for number in range(2)]
+        scans = [{'sku': 'PC-1', 'quantity': 8}] + [{'sku': item.sku, 'quantity': 1} for item in others]
+        record_count_scans(self.inventory_count, scans, counted_by=self.user)
+        progress, received = [], mock.Mock()
+        inventory_count_completed.connect(received)
+        self.addCleanup(inventory_count_completed.disconnect, received)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_inventory_count(self.inventory_count, self.user,
+                                     progress_callback=lambda *args: progress.append(args), batch_size=2)
+            received.assert_not_called()
+
+        self.assertEqual(progress, [(2, 3), (3, 3)])
+        received.assert_called_once()
+        self.assertCountEqual(received.call_args.kwargs['adjusted_item_ids'], [self.item.pk] + [item.pk for item in others])
+        self.assertEqual(StockMovement.objects.filter(movement_type='adjustment').count(), 3)
+
+class ItemImporterTests(InventoryTestMixin, TestCase):
+    """Chunked item imports against live stock"""
+
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Cabling')
+        self.item = self.make_item(quantity=5, sku='PC-1', category=self.category)
+        self.importer = importers.ItemImporter()
+        # Stock moves after the importer has loaded its lookup maps
+        apply_stock_movement(self.item, -2, 'out')
+
+    def test_blank_cells_leave_existing_values(self):
+        result = self.importer.run([(2, {'name': 'Patch Cable 1m', 'sku': 'PC-1', 'unit_price': '', 'category': ''})])
+
+        self.assertEqual((result.updated, result.movements), (1, 0))
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.name, 'Patch Cable 1m')
+        self.assertEqual(self.item.quantity, 3)
+        self.assertEqual(self.item.unit_price, Decimal('3.00'))
+        self.assertEqual(self.item.category, self.category)
+
+    def test_quantity_is_adjusted_from_the_current_stock(self):
+        self.importer.run([(2, {'name': 'Patch Cable', 'sku': 'PC-1', 'quantity': '10'})])
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 10)
+        movement = StockMovement.objects.get(item=self.item, movement_type='adjustment')
+        self.assertEqual((movement.quantity, movement.stock_after), (7, 10))
+
+    def test_new_items_are_valued_from_their_opening_movement(self):
+        result = self.importer.run([(2, {'name': 'Wall Bracket', 'quantity': '4', 'unit_price': '2.00'})])
+
+        self.assertEqual(result.created, 1)
+        item = Item.objects.get(name='Wall Bracket')
+        self.assertEqual(item.total_value, Decimal('8.00'))
+
+
+class MovementRollupTests(InventoryTestMixin, TestCase):
+    """Daily movement rollups, kept incrementally and rebuilt from the ledger"""
+
+    def setUp(self):
+        super().setUp()
+        self.yard = Location.objects.create(name='Yard', company='wisp')
+        self.item = self.make_item(quantity=0, unit_price='3.00')
+        apply_stock_movement(self.item, 6, 'in', unit_price=Decimal('4.00'), destination_location=self.location)
+        apply_stock_movement(self.item, 4, 'transfer', source_location=self.location, destination_location=self.yard)
+
+    def rollups(self):
+        return sorted(StockMovementDaily.objects.values_list(
+            'location__name', 'movement_type', 'movement_count', 'quantity_in', 'quantity_out', 'value'
+        ))
+
+    def test_transfers_are_rolled_up_at_both_ends(self):
+        self.assertEqual(self.rollups(), [
+            ('Main Store', 'in', 1, 6, 0, Decimal('24.00')),
+            ('Main Store', 'transfer', 0, 0, 4, Decimal('16.00')),
+            ('Yard', 'transfer', 1, 4, 0, Decimal('16.00')),
+        ])
+
+    def test_rebuild_matches_the_incremental_rollup(self):
+        incremental = self.rollups()
+        # A later price change must not revalue movements already made
+        Item.objects.filter(pk=self.item.pk).update(unit_price=Decimal('9.00'))
+
+        rebuild_rollups()
+
+        self.assertEqual(self.rollups(), incremental)
+        totals = {row['movement_type']: row['total_items']
+                  for row in movement_totals_by_type(StockMovementDaily.objects.all())}
+        self.assertEqual(totals, {'in': 6, 'transfer': 4})
+
+
+class StockValuationTests(InventoryTestMixin, TestCase):
+    """Live and snapshot stock valuation by category"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username='accountant', password='secret')
+        self.client.force_login(self.user)
+        radio = Category.objects.create(name='Radio')
+        fibre = Category.objects.create(name='Fibre')
+        self.radio_antennas = Category.objects.create(name='Antennas', parent=radio)
+        self.fibre_antennas = Category.objects.create(name='Antennas', parent=fibre)
+        self.make_item(name='Sector', quantity=2, unit_price='50.00', category=self.radio_antennas)
+        self.make_item(name='Dish', quantity=1, unit_price='20.00', category=self.fibre_antennas)
+        self.make_item(name='Sample', quantity=3, unit_price=None, category=self.radio_antennas)
+
+    def report(self, **params):
+        response = self.client.get(reverse('inventory:stock_valuation_report'), params)
+        return {
+            row['category']: (row['total_value'], row['total_count'])
+            for row in response.context['items_by_category'].values()
+        }
+
+    def test_same_named_subcategories_are_kept_apart(self):
+        self.assertEqual(self.report(), {
+            'Fibre > Antennas': (Decimal('20.00'), 1),
+            'Radio > Antennas': (Decimal('100.00'), 1),
+        })
+
+    def test_snapshot_counts_the_same_items_as_the_live_report(self):
+        snapshot_date = timezone.now().date()
+        take_valuation_snapshot(snapshot_date)
+
+        self.assertEqual(self.report(as_of=snapshot_date.isoformat()), self.report())
+
+
+class ItemSearchTests(InventoryTestMixin, TestCase):
+    """Full-text item search, kept in sync by the item signals"""
+
+    def setUp(self):
+        super().setUp()
+        # A fresh backend creates its FTS table inside this test's transaction
+        self.backend = SqliteFTS5Backend()
+        patcher = mock.patch.object(signals, 'get_search_backend', return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sector = self.make_item(name='Sector Antenna', sku='SA-5')
+        self.cable = self.make_item(name='Patch Cable', description='Fits the sector antenna mount')
+        self.dish = self.make_item(name='Dish', supplier_part_number='ANT-DISH')
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.backend.search('sector antenna'), [self.sector.pk, self.cable.pk])
+
+    def test_words_match_as_prefixes_and_all_must_match(self):
+        self.assertEqual(self.backend.search('ant dis'), [self.dish.pk])
+        self.assertEqual(self.backend.search('sect'), [self.sector.pk, self.cable.pk])
+        self.assertEqual(self.backend.search('sector dish'), [])
+
+    def test_query_syntax_is_treated_as_text(self):
+        self.assertEqual(self.backend.search('"sector" OR NOT'), [])
+        self.assertEqual(self.backend.search('*"()'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.dish.name = 'Grid Dish'
+        self.dish.save()
+        self.sector.delete()
+
+        self.assertEqual(self.backend.search('grid'), [self.dish.pk])
+        self.assertEqual(self.backend.search('sector'), [self.cable.pk])
+
+    def test_supplier_renames_are_searchable(self):
+        self.supplier.name = 'Ubiquiti'
+        self.supplier.save()
+
+        self.assertCountEqual(self.backend.search('ubiquiti'), [self.sector.pk, self.cable.pk, self.dish.pk])
+
+    def test_database_backend_matches_every_word_across_fields(self):
+        backend = DatabaseSearchBackend()
+
+        self.assertEqual(backend.search('acme sector'), [self.cable.pk, self.sector.pk])
+        self.assertEqual(backend.search('ant-dish'), [self.dish.pk])
+        self.assertEqual(backend.search('  '), [])
+
+    @override_settings(INVENTORY_SEARCH_BACKEND='applications.inventory.search.DatabaseSearchBackend')
+    def test_configured_backend_is_used(self):
+        with mock.patch.object(search, '_backend', None):
+            self.assertIsInstance(get_search_backend(), DatabaseSearchBackend)
+
+
+class ItemSearchListTests(InventoryTestMixin, TestCase):
+    """The item list pages through search hits in rank order"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(get_user_model().objects.create_user(username='storeman', password='secret'))
+        self.items = {name: self.make_item(name=name) for name in ['Sector', 'Dish', 'Omni', 'Panel']}
+        self.items['Panel'].is_active = False
+        self.items['Panel'].save()
+        ranked = [self.items[name].pk for name in ['Omni', 'Panel', 'Sector', 'Dish']]
+        patcher = mock.patch.object(views, 'get_search_backend', return_value=mock.Mock(**{'search.return_value': ranked}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def names(self, response):
+        return [item.name for item in response.context['items']]
+
+    def test_results_follow_the_ranking_across_pages(self):
+        with mock.patch.object(views.ItemListView, 'paginate_by', 2):
+            first = self.client.get(reverse('inventory:item_list'), {'search': 'antenna'})
+            second = self.client.get(reverse('inventory:item_list'),
+                                     {'search': 'antenna', 'after': first.context['page_obj'].next_cursor})
+
+        self.assertEqual(self.names(first), ['Omni', 'Sector'])
+        self.assertEqual(self.names(second), ['Dish'])
+        self.assertFalse(first.context['search_truncated'])
+
+    def test_capped_results_are_flagged(self):
+        with mock.patch.object(views, 'SEARCH_RESULT_LIMIT', 4):
+            response = self.client.get(reverse('inventory:item_list'), {'search': 'antenna'})
+
+        self.assertTrue(response.context['search_truncated'])
+        self.assertContains(response, 'Showing the best 4 matches')
+
+
+class MovementExportTests(InventoryTestMixin, TestCase):
+    """Stock movement report downloads are streamed"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(get_user_model().objects.create_user(username='accountant', password='secret'))
+        self.item = self.make_item(quantity=0, sku='PC-1')
+        apply_stock_movement(self.item, 10, 'in', reference_number='PO-1')
+        apply_stock_movement(self.item, -4, 'out', job_reference='JOB-1')
+        apply_stock_movement(self.make_item(name='Dish', company='fno', quantity=0), 1, 'in')
+
+    def export(self, export_format, **params):
+        return self.client.get(reverse('inventory:stock_movement_report'), {'export': export_format, **params})
+
+    def test_csv_is_streamed_newest_first(self):
+        response = self.export('csv', company='wisp')
+
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertIn('attachment; filename="stock_movements_', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:6], ['Date', 'Item', 'SKU', 'Company', 'Type', 'Quantity'])
+        self.assertEqual([(row[4], row[5], row[6]) for row in rows[1:]], [('out', '-4', '6'), ('in', '10', '10')])
+        self.assertEqual(rows[1][11], 'JOB-1')
+
+    def test_xlsx_holds_every_movement_with_plain_dates(self):
+        from openpyxl import load_workbook
+
+        response = self.export('xlsx')
+
+        self.assertTrue(response.streaming)
+        worksheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        rows = list(worksheet.iter_rows(values_only=True))
+        self.assertEqual(len(rows), 4)
+        self.assertIsNone(rows[1][0].tzinfo)
+        self.assertCountEqual([row[1] for row in rows[1:]], ['Patch Cable', 'Patch Cable', 'Dish'])
+
+
+class StockAsOfTests(InventoryTestMixin, TestCase):
+    """Point-in-time stock answered from the movement ledger"""
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.cable = self.make_item(quantity=6)
+        self.bracket = self.make_item(name='Wall Bracket', quantity=4)
+        self.spare = self.make_item(name='Spare Radio', quantity=7)
+        self.new = self.make_item(name='New Radio', quantity=1)
+        Item.objects.exclude(pk=self.new.pk).update(created_at=self.days_ago(10))
+        Item.objects.filter(pk=self.new.pk).update(created_at=self.days_ago(1))
+
+        for item, days, quantity, movement_type, stock_after in [
+            (self.cable, 8, 10, 'in', 10),
+            (self.cable, 5, -4, 'out', 6),
+            (self.cable, 2, 3, 'transfer', 6),
+            (self.bracket, 2, 4, 'transfer', 4),
+        ]:
+            StockMovement.objects.create(item=item, quantity=quantity, movement_type=movement_type,
+                                         movement_date=self.days_ago(days), stock_after=stock_after)
+
+    def days_ago(self, days):
+        return self.now - timezone.timedelta(days=days)
+
+    def quantities(self, days):
+        return dict(stock_as_of(self.days_ago(days)).values_list('name', 'quantity_as_of'))
+
+    def test_stock_comes_from_the_latest_movement_at_or_before_the_time(self):
+        self.assertEqual(self.quantities(6)['Patch Cable'], 10)
+        self.assertEqual(self.quantities(3)['Patch Cable'], 6)
+
+    def test_stock_before_the_first_movement_is_worked_back_from_it(self):
+        self.assertEqual(self.quantities(9)['Patch Cable'], 0)
+        # Transfers move stock between locations without changing the total
+        self.assertEqual(self.quantities(3)['Wall Bracket'], 4)
+
+    def test_items_that_never_moved_keep_their_quantity_and_new_items_are_left_out(self):
+        self.assertEqual(self.quantities(3), {'Patch Cable': 6, 'Wall Bracket': 4, 'Spare Radio': 7})
+        self.assertEqual(self.quantities(0)['New Radio'], 1)
+
+    def test_value_is_at_the_current_unit_price(self):
+        item = stock_as_of(self.days_ago(6), Item.objects.filter(pk=self.cable.pk)).get()
+
+        self.assertEqual(item.value_as_of, Decimal('30.00'))
+
+    def test_report_date_means_the_end_of_that_day(self):
+        self.client.force_login(get_user_model().objects.create_user(username='accountant', password='secret'))
+        movement_day = timezone.localtime(self.days_ago(5)).date()
+
+        response = self.client.get(reverse('inventory:stock_as_of_report'),
+                                   {'at': movement_day.isoformat(), 'item': self.cable.pk, 'format': 'json'})
+
+        self.assertEqual(response.json()['items'][0]['quantity_as_of'], 6)
+
+
+class RecomputeCostsTests(InventoryTestMixin, TestCase):
+    """Rebuilding every cost from the movement ledger"""
+
+    def test_items_without_movements_are_valued_at_their_price(self):
+        item = self.make_item(quantity=4, unit_price='2.50')
+        unpriced = self.make_item(name='Loose Screws', quantity=9, unit_price=None)
+        Item.objects.filter(pk__in=[item.pk, unpriced.pk]).update(average_cost=Decimal('9'), total_value=Decimal('36'))
+
+        summary = recompute_costs()
+
+        item.refresh_from_db()
+        unpriced.refresh_from_db()
+        self.assertEqual(summary['items'], 2)
+        self.assertEqual((item.average_cost, item.total_value), (Decimal('2.5000'), Decimal('10.00')))
+        self.assertEqual((unpriced.average_cost, unpriced.total_value), (None, None))
+
+    @override_settings(INVENTORY_COSTING_METHOD='fifo')
+    def test_legacy_absolute_adjustments_are_read_as_changes(self):
+        item = self.make_item(quantity=0, unit_price='2.00')
+        apply_stock_movement(item, 10, 'in', unit_price=Decimal('2.00'), destination_location=self.location)
+        # The old movement form stored the new level as the quantity
+        legacy = StockMovement.objects.create(item=item, quantity=7, movement_type='adjustment', stock_after=7)
+        Item.objects.filter(pk=item.pk).update(quantity=7)
+
+        summary = recompute_costs()
+
+        legacy.refresh_from_db()
+        item.refresh_from_db()
+        self.assertEqual(summary['normalised'], 1)
+        self.assertEqual(legacy.quantity, -3)
+        self.assertEqual(legacy.cost_amount, Decimal('6.00'))
+        self.assertEqual(item.total_value, Decimal('14.00'))
+
+    def test_progress_is_reported_as_movements_are_written(self):
+        item = self.make_item(quantity=0)
+        apply_stock_movement(item, 2, 'in', destination_location=self.location)
+        apply_stock_movement(item, -1, 'out', source_location=self.location)
+        progress = []
+
+        with mock.patch('applications.inventory.costing.RECOMPUTE_BATCH_SIZE', 1):
+            recompute_costs(progress_callback=lambda summary: progress.append(summary['movements']))
+
+        self.assertEqual(progress[:2], [1, 2])
+
+
+class NumberSequenceTests(InventoryTestMixin, TestCase):
+    """Document numbers come from per-prefix sequence counters"""
+
+    def test_blocks_are_consecutive_and_prefixes_are_numbered_apart(self):
+        self.assertEqual(allocate_numbers('purchase_order', count=2, company='wisp', year=2026),
+                         ['PO-WISP-2026-00001', 'PO-WISP-2026-00002'])
+        self.assertEqual(next_number('purchase_order', company='wisp', year=2026), 'PO-WISP-2026-00003')
+        self.assertEqual(next_number('purchase_order', company='fno', year=2026), 'PO-FNO-2026-00001')
+        self.assertEqual(next_number('inventory_count', company='wisp', year=2027), 'CNT-WISP-2027-00001')
+
+    def test_new_sequence_starts_past_hand_entered_numbers(self):
+        year = timezone.now().year
+        PurchaseOrder.objects.create(supplier=self.supplier, company='wisp', order_number=f'PO-WISP-{year}-00041')
+
+        purchase_order = PurchaseOrder.objects.create(supplier=self.supplier, company='wisp')
+
+        self.assertEqual(purchase_order.order_number, f'PO-WISP-{year}-00042')
+
+    def test_rolled_back_block_is_released(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            allocate_numbers('purchase_order', count=5, company='wisp', year=2026)
+            raise RuntimeError
+
+        self.assertEqual(next_number('purchase_order', company='wisp', year=2026), 'PO-WISP-2026-00001')
+
+
+class NumberSequenceContentionTests(TransactionTestCase):
+    """Concurrent allocations never hand out the same number"""
+
+    def test_concurrent_callers_get_distinct_numbers(self):
+        numbers, errors = [], []
+        barrier = threading.Barrier(4)
+
+        def allocate():
+            try:
+                barrier.wait()
+                blocks = 0
+                while blocks < 5:
+                    try:
+                        numbers.extend(allocate_numbers('purchase_order', count=3, company='wisp', year=2026))
+                        blocks += 1
+                    except OperationalError as exc:
+                        # In-memory SQLite fails a locked table at once instead of waiting, so wait here
+                        if 'locked' not in str(exc):
+                            raise
+                        time.sleep(0.001)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=allocate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        # No number is handed out twice, and blocks that failed to lock leave no gaps
+        self.assertEqual(sorted(numbers), [f'PO-WISP-2026-{value:05d}' for value in range(1, 61)])
+
+
+class ABCClassificationTests(InventoryTestMixin, TestCase):
+    """Items are classed by the better of their value and velocity"""
+
+    def setUp(self):
+        super().setUp()
+        self.classifier = ABCClassifier(lookback_days=30)
+        self.router = self.make_item(name='Router')
+        self.cable = self.make_item(name='Patch Cable')
+        self.bracket = self.make_item(name='Wall Bracket')
+        for item, value in [(self.router, 900), (self.cable, 5), (self.bracket, 95)]:
+            Item.objects.filter(pk=item.pk).update(total_value=value)
+
+    def rollup(self, item, movement_count, movement_type='out'):
+        StockMovementDaily.objects.create(date=self.classifier.today, item=item, location=self.location,
+                                          movement_type=movement_type, company='wisp', movement_count=movement_count)
+
+    def classes(self):
+        return dict(Item.objects.values_list('name', 'abc_class'))
+
+    def test_pareto_split_of_the_cumulative_share(self):
+        ranks = pareto_ranks(np.array([15, 50, 0, 30, 4, 1], dtype=np.float64))
+
+        self.assertEqual(ranks.tolist(), [1, 0, 2, 0, 2, 2])
+
+    def test_fast_moving_cheap_items_are_counted_like_valuable_ones(self):
+        self.rollup(self.cable, 90)
+        self.rollup(self.bracket, 10)
+
+        summary = self.classifier.run()
+
+        self.assertEqual(self.classes(), {'Router': 'A', 'Patch Cable': 'A', 'Wall Bracket': 'B'})
+        self.assertEqual((summary['A'], summary['B'], summary['C'], summary['changed']), (2, 1, 0, 3))
+        self.assertEqual(self.classifier.run()['changed'], 0)
+
+    def test_count_adjustments_do_not_add_velocity(self):
+        self.rollup(self.cable, 90, movement_type='adjustment')
+
+        self.classifier.run()
+
+        self.assertEqual(self.classes()['Patch Cable'], 'C')
+
+
+class CycleCountSchedulerTests(InventoryTestMixin, TestCase):
+    """Due items are batched into one small count per location"""
+
+    def setUp(self):
+        super().setUp()
+        self.scheduler = CycleCountScheduler(max_items=2)
+        self.yard = Location.objects.create(name='Yard', company='fno')
+        today = self.scheduler.today
+        self.never = self.make_item(name='Never Counted', abc_class='C')
+        self.a_due = self.make_item(name='A Due', abc_class='A', last_counted_date=today - timezone.timedelta(days=8))
+        self.a_recent = self.make_item(name='A Recent', abc_class='A', last_counted_date=today)
+        self.c_due = self.make_item(name='C Due', abc_class='C', last_counted_date=today - timezone.timedelta(days=91))
+        self.yard_item = self.make_item(name='Yard Mast', quantity=3, location=self.yard)
+
+    def test_a_items_come_first_and_batches_are_capped(self):
+        self.assertEqual(self.scheduler.plan(), {
+            self.location.pk: [(self.a_due.pk, 0), (self.never.pk, 0)],
+            self.yard.pk: [(self.yard_item.pk, 3)],
+        })
+
+    def test_items_on_open_counts_are_skipped(self):
+        open_count = InventoryCount.objects.create(location=self.location, company='wisp')
+        open_count.items.create(item=self.a_due, expected_quantity=0)
+
+        self.assertEqual(self.scheduler.plan()[self.location.pk], [(self.never.pk, 0), (self.c_due.pk, 0)])
+
+    def test_counts_are_numbered_per_company_and_expect_location_stock(self):
+        counts = self.scheduler.run()
+
+        self.assertEqual(len(counts), 2)
+        yard_count = InventoryCount.objects.get(location=self.yard)
+        self.assertTrue(yard_count.count_reference.startswith('CNT-FNO-'))
+        self.assertEqual((yard_count.status, yard_count.notes), ('in_progress', CYCLE_COUNT_NOTE))
+        self.assertEqual(list(yard_count.items.values_list('item_id', 'expected_quantity')), [(self.yard_item.pk, 3)])
+        self.assertEqual(self.scheduler.plan(), {self.location.pk: [(self.c_due.pk, 0)]})
+
+
+class ReorderEngineTests(InventoryTestMixin, TestCase):
+    """Forecast reorder points from daily demand and raise draft orders"""
+
+    def setUp(self):
+        super().setUp()
+        self.engine = ReorderEngine(lookback_days=60, recent_days=30, review_days=30)
+        self.item = self.make_item(quantity=20, unit_price='2.50')
+        # A steady two a day, split across two locations on alternate days
+        yard = Location.objects.create(name='Yard', company='wisp')
+        StockMovementDaily.objects.bulk_create([
+            StockMovementDaily(date=self.engine.today - timezone.timedelta(days=days), item=self.item,
+                               location=self.location if days % 2 else yard, movement_type='out', company='wisp',
+                               movement_count=1, quantity_out=2)
+            for days in range(60)
+        ])
+
+    def test_steady_demand_needs_no_safety_stock(self):
+        parameters = self.engine.forecast()[self.item.pk]
+
+        self.assertAlmostEqual(parameters['daily_rate'], 2)
+        self.assertEqual(parameters['lead_time'], 14)
+        self.assertAlmostEqual(parameters['safety_stock'], 0)
+        self.assertAlmostEqual(parameters['reorder_point'], 28)
+        self.assertAlmostEqual(parameters['order_up_to'], 88)
+
+    def test_supplier_lead_time_comes_from_its_metrics(self):
+        SupplierMetrics.objects.create(supplier=self.supplier, average_lead_time_days=7, p90_lead_time_days=10,
+                                       computed_at=timezone.now())
+
+        self.assertAlmostEqual(self.engine.forecast()[self.item.pk]['reorder_point'], 14)
+
+    def test_orders_up_to_the_target_and_counts_stock_on_order(self):
+        self.assertEqual([(item, quantity) for item, quantity, _ in self.engine.suggest()], [(self.item, 68)])
+
+        self.make_purchase_order([(self.item, 10, '2.50')])
+
+        self.assertEqual(self.engine.suggest(), [])
+
+    def test_run_raises_one_draft_order_per_supplier(self):
+        orders = self.engine.run(update_levels=True)
+
+        self.assertEqual(len(orders), 1)
+        purchase_order = PurchaseOrder.objects.get()
+        self.assertEqual((purchase_order.status, purchase_order.notes), ('draft', DRAFT_PO_NOTE))
+        self.assertTrue(purchase_order.order_number)
+        self.assertEqual(purchase_order.total, Decimal('170.00'))
+        line = purchase_order.items.get()
+        self.assertEqual((line.item, line.quantity_ordered), (self.item, 68))
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.minimum_stock, self.item.reorder_quantity), (28, 60))
+
+
+class IssueKitTests(InventoryTestMixin, TestCase):
+    """Kits are issued whole, in one batch, or not at all"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username='installer', password='secret')
+        self.radio = self.make_item(name='Radio', quantity=0, unit_price='100.00')
+        self.bracket = self.make_item(name='Bracket', quantity=0, unit_price='4.00')
+        apply_stock_movement(self.radio, 3, 'in', unit_price=Decimal('100.00'), destination_location=self.location)
+        apply_stock_movement(self.bracket, 5, 'in', unit_price=Decimal('4.00'), destination_location=self.location)
+        self.kit = Kit.objects.create(name='Tower Install')
+        self.kit.components.create(item=self.radio, quantity=1)
+        self.kit.components.create(item=self.bracket, quantity=2)
+
+    def test_components_go_out_together_at_cost(self):
+        movements = issue_kit(self.kit, 2, job_reference='JOB-7', source_location=self.location,
+                              performed_by=self.user)
+
+        self.assertEqual(len(movements), 2)
+        self.radio.refresh_from_db()
+        self.bracket.refresh_from_db()
+        self.assertEqual((self.radio.quantity, self.bracket.quantity), (1, 1))
+        self.assertEqual(ItemLocationBalance.objects.get(item=self.bracket, location=self.location).quantity, 1)
+        issued = {
+            movement.item_id: (movement.quantity, movement.stock_after, movement.cost_amount)
+            for movement in StockMovement.objects.filter(job_reference='JOB-7', movement_type='out')
+        }
+        self.assertEqual(issued, {
+            self.radio.pk: (-2, 1, Decimal('200.00')),
+            self.bracket.pk: (-4, 1, Decimal('16.00')),
+        })
+
+    def test_shortage_lists_every_short_component_and_issues_nothing(self):
+        with self.assertRaises(KitShortageError) as raised:
+            issue_kit(self.kit, 4, job_reference='JOB-7')
+
+        self.assertEqual(raised.exception.shortages, [
+            (self.bracket.pk, 'Bracket', 8, 5),
+            (self.radio.pk, 'Radio', 4, 3),
+        ])
+        self.assertFalse(StockMovement.objects.filter(job_reference='JOB-7').exists())
+        self.radio.refresh_from_db()
+        self.assertEqual(self.radio.quantity, 3)
+
+    def test_issue_view_reports_shortages_as_json(self):
+        self.client.force_login(self.user)
+
+        response = self.client.post(reverse('inventory:issue_kit_to_job', args=[self.kit.pk]) + '?format=json',
+                                    {'kits': 3, 'job_reference': 'JOB-7'})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['shortages'][0]['short'], 1)
+
+
+class PurchaseOrderTotalsTests(InventoryTestMixin, TestCase):
+    """Incrementally maintained purchase order subtotals and totals"""
+
+    def setUp(self):
+        super().setUp()
+        self.item = self.make_item(quantity=0, unit_price='3.00')
+        self.purchase_order = self.make_purchase_order([(self.item, 2, '5.00')], status='draft')
+
+    def assertTotals(self, subtotal, total):
+        self.purchase_order.refresh_from_db()
+        self.assertEqual(self.purchase_order.subtotal, Decimal(subtotal))
+        self.assertEqual(self.purchase_order.total, Decimal(total))
+
+    def test_line_add_edit_and_delete_move_the_totals(self):
+        self.assertTotals('10.00', '10.00')
+
+        line = PurchaseOrderItem.objects.create(
+            purchase_order=self.purchase_order, item=self.item, quantity_ordered=1, unit_price=Decimal('7.50')
+        )
+        self.assertTotals('17.50', '17.50')
+
+        line = PurchaseOrderItem.objects.get(pk=line.pk)
+        line.quantity_ordered = 3
+        line.save()
+        self.assertTotals('32.50', '32.50')
+
+        line.delete()
+        self.assertTotals('10.00', '10.00')
+
+    def test_bulk_line_entry_moves_the_totals_once(self):
+        add_purchase_order_lines(self.purchase_order, [(self.item, 4, Decimal('2.50')), (self.item, 1, None)])
+
+        self.assertTotals('23.00', '23.00')
+
+    def test_header_edit_keeps_the_subtotal_from_the_lines(self):
+        stale = PurchaseOrder.objects.get(pk=self.purchase_order.pk)
+        PurchaseOrderItem.objects.create(
+            purchase_order=self.purchase_order, item=self.item, quantity_ordered=1, unit_price=Decimal('5.00')
+        )
+
+        stale.tax = Decimal('2.25')
+        stale.save()
+
+        self.assertTotals('15.00', '17.25')
+
+    def test_receipt_keeps_the_subtotal_from_the_lines(self):
+        self.purchase_order.status = 'ordered'
+        self.purchase_order.save()
+        stale = PurchaseOrder.objects.get(pk=self.purchase_order.pk)
+        PurchaseOrder.objects.filter(pk=stale.pk).update(subtotal=Decimal('12.00'), total=Decimal('12.00'))
+
+        receive_purchase_order(stale, {stale.items.get().pk: 2})
+
+        self.assertTotals('12.00', '12.00')
+        self.assertEqual(self.purchase_order.status, 'fully_received')
+
+    def test_recalculate_totals_repairs_drift(self):
+        PurchaseOrder.objects.filter(pk=self.purchase_order.pk).update(
+            subtotal=Decimal('99.00'), total=Decimal('1.00')
+        )
+        untouched = self.make_purchase_order([(self.item, 1, '4.00')], status='draft')
+
+        self.assertEqual(recalculate_purchase_order_totals(), 1)
+        self.assertTotals('10.00', '10.00')
+        untouched.refresh_from_db()
+        self.assertEqual(untouched.total, Decimal('4.00'))
+
+        PurchaseOrder.objects.filter(pk=self.purchase_order.pk).update(subtotal=Decimal('0.00'))
+        self.purchase_order.recalculate_totals()
+        self.assertEqual(self.purchase_order.subtotal, Decimal('10.00'))
+
+
+class PurchaseOrderLinesFormTests(InventoryTestMixin, TestCase):
+    """Pasted purchase order lines are matched to exactly one item"""
+
+    def setUp(self):
+        super().setUp()
+        self.other_supplier = Supplier.objects.create(name='Other Networks')
+        self.purchase_order = self.make_purchase_order([], status='draft')
+        self.cable = self.make_item(sku='PC-1', supplier_part_number='ACME-1')
+        self.other_cable = self.make_item(name='Other Cable', sku='OC-1', supplier_part_number='ACME-1',
+                                          supplier=self.other_supplier)
+
+    def form(self, lines):
+        return PurchaseOrderLinesForm({'lines': lines}, purchase_order=self.purchase_order)
+
+    def test_part_number_prefers_the_order_supplier(self):
+        form = self.form('ACME-1,2\nPC-1,3,2.50')
+
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['parsed_lines'],
+                         [(self.cable, 2, None), (self.cable, 3, Decimal('2.50'))])
+
+    def test_ambiguous_sku_is_rejected_on_its_line(self):
+        self.make_item(name='Patch Cable 2m', sku='PC-1')
+
+        form = self.form('OC-1,1\nPC-1,2')
+
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.non_field_errors(),
+                         ['Line 2: "PC-1" matches more than one active item (Patch Cable, Patch Cable 2m)'])
+
+    def test_part_number_shared_by_other_suppliers_is_ambiguous(self):
+        self.make_item(name='Third Cable', supplier_part_number='XYZ-9', supplier=self.other_supplier)
+        self.make_item(name='Fourth Cable', supplier_part_number='XYZ-9', supplier=self.other_supplier)
+
+        form = self.form('XYZ-9,1')
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('matches more than one active item', form.non_field_errors()[0])
+
+
+class SupplierMetricsTests(InventoryTestMixin, TestCase):
+    """Precomputed supplier figures"""
+
+    def test_open_order_value_counts_only_what_is_still_to_be_delivered(self):
+        item = self.make_item(quantity=0)
+        partial = self.make_purchase_order([(item, 10, '2.00')], status='partially_received')
+        PurchaseOrderItem.objects.filter(purchase_order=partial).update(quantity_received=4)
+        self.make_purchase_order([(item, 1, '5.00')], status='ordered')
+        self.make_purchase_order([(item, 3, '9.00')], status='fully_received')
+
+        refresh_supplier_metrics()
+
+        metrics = SupplierMetrics.objects.get(supplier=self.supplier)
+        self.assertEqual(metrics.open_order_count, 2)
+        self.assertEqual(metrics.open_order_value, Decimal('17.00'))
+
+    def test_lead_times_and_fill_rate_come_from_delivered_orders(self):
+        item = self.make_item(quantity=0)
+        today = timezone.localdate()
+        for days, status, received in [(4, 'fully_received', 5), (10, 'partially_received', 3), (1, 'cancelled', 5)]:
+            purchase_order = self.make_purchase_order([(item, 5, '2.00')], status=status)
+            PurchaseOrder.objects.filter(pk=purchase_order.pk).update(
+                order_date=today - timezone.timedelta(days=days), actual_delivery_date=today
+            )
+            PurchaseOrderItem.objects.filter(purchase_order=purchase_order).update(quantity_received=received)
+        idle = Supplier.objects.create(name='Idle Supplier')
+
+        self.assertEqual(refresh_supplier_metrics()['suppliers'], 2)
+
+        metrics = SupplierMetrics.objects.get(supplier=self.supplier)
+        self.assertEqual(metrics.delivered_order_count, 2)
+        self.assertAlmostEqual(metrics.average_lead_time_days, 7)
+        self.assertAlmostEqual(metrics.p90_lead_time_days, 9.4)
+        self.assertEqual(metrics.fill_rate, Decimal('0.8000'))
+        self.assertEqual(metrics.order_count, 2)
+        idle_metrics = SupplierMetrics.objects.get(supplier=idle)
+        self.assertEqual((idle_metrics.order_count, idle_metrics.average_lead_time_days), (0, None))
+
+    def test_price_trend_runs_from_the_first_to_the_last_order(self):
+        item = self.make_item(quantity=0)
+        today = timezone.localdate()
+        for days, unit_price in [(30, '2.00'), (10, '3.00'), (400, '1.00'), (1, '2.50')]:
+            purchase_order = self.make_purchase_order([(item, 1, unit_price)])
+            PurchaseOrder.objects.filter(pk=purchase_order.pk).update(order_date=today - timezone.timedelta(days=days))
+
+        refresh_supplier_metrics()
+
+        price = SupplierItemPrice.objects.get(supplier=self.supplier, item=item)
+        self.assertEqual(price.line_count, 3)
+        self.assertEqual((price.first_unit_price, price.last_unit_price), (Decimal('2.00'), Decimal('2.50')))
+        self.assertEqual((price.min_unit_price, price.max_unit_price), (Decimal('2.00'), Decimal('3.00')))
+        self.assertEqual(price.average_unit_price, Decimal('2.50'))
+        self.assertEqual(price.price_change, Decimal('0.2500'))
+        self.assertEqual(price.last_order_date, today - timezone.timedelta(days=1))
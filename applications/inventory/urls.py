@@ -11,6 +11,8 @@ urlpatterns = [
     # Items
     path('items/', views.ItemListView.as_view(), name='item_list'),
     path('items/create/', views.ItemCreateView.as_view(), name='item_create'),
+    path('items/search/', views.item_search, name='item_search'),
+    path('items/import/', views.item_import, name='item_import'),
     path('items/<int:pk>/', views.ItemDetailView.as_view(), name='item_detail'),
     path('items/<int:pk>/edit/', views.ItemUpdateView.as_view(), name='item_update'),
     path('items/<int:pk>/add-attachment/', views.add_item_attachment, name='add_item_attachment'),
@@ -29,19 +31,24 @@ urlpatterns = [
     path('purchase-orders/<int:pk>/', views.PurchaseOrderDetailView.as_view(), name='purchase_order_detail'),
     path('purchase-orders/<int:pk>/edit/', views.PurchaseOrderUpdateView.as_view(), name='purchase_order_update'),
     path('purchase-orders/<int:pk>/add-item/', views.add_purchase_order_item, name='add_purchase_order_item'),
+    path('purchase-orders/<int:pk>/add-items/', views.bulk_add_purchase_order_items,
+         name='bulk_add_purchase_order_items'),
     path('purchase-orders/items/<int:pk>/remove/', views.remove_purchase_order_item, name='remove_purchase_order_item'),
     path('purchase-orders/<int:pk>/approve/', views.approve_purchase_order, name='approve_purchase_order'),
     path('purchase-orders/<int:pk>/mark-as-ordered/', views.mark_as_ordered, name='mark_as_ordered'),
     path('purchase-orders/items/<int:pk>/receive/', views.receive_purchase_order_item,
          name='receive_purchase_order_item'),
+    path('purchase-orders/<int:pk>/receive/', views.receive_purchase_order, name='receive_items_form'),
 
     # Inventory Counts
     path('counts/', views.InventoryCountListView.as_view(), name='count_list'),
     path('counts/create/', views.InventoryCountCreateView.as_view(), name='count_create'),
     path('counts/<int:pk>/', views.InventoryCountDetailView.as_view(), name='count_detail'),
     path('counts/<int:pk>/add-item/', views.add_inventory_count_item, name='add_inventory_count_item'),
+    path('counts/<int:pk>/scans/', views.submit_count_scans, name='submit_count_scans'),
     path('counts/items/<int:pk>/update/', views.update_count_item, name='update_count_item'),
     path('counts/<int:pk>/complete/', views.complete_inventory_count, name='complete_inventory_count'),
+    path('counts/<int:pk>/progress/', views.inventory_count_progress, name='inventory_count_progress'),
 
     # Categories
     path('categories/', views.CategoryListView.as_view(), name='category_list'),
@@ -52,6 +59,7 @@ urlpatterns = [
     path('locations/', views.LocationListView.as_view(), name='location_list'),
     path('locations/create/', views.LocationCreateView.as_view(), name='location_create'),
     path('locations/<int:pk>/edit/', views.LocationUpdateView.as_view(), name='location_update'),
+    path('locations/<int:pk>/stock/', views.location_stock_view, name='location_stock'),
 
     # Suppliers
     path('suppliers/', views.SupplierListView.as_view(), name='supplier_list'),
@@ -59,7 +67,19 @@ urlpatterns = [
     path('suppliers/<int:pk>/', views.SupplierDetailView.as_view(), name='supplier_detail'),
     path('suppliers/<int:pk>/edit/', views.SupplierUpdateView.as_view(), name='supplier_update'),
 
+    # Kits
+    path('kits/', views.KitListView.as_view(), name='kit_list'),
+    path('kits/create/', views.KitCreateView.as_view(), name='kit_create'),
+    path('kits/<int:pk>/', views.KitDetailView.as_view(), name='kit_detail'),
+    path('kits/<int:pk>/edit/', views.KitUpdateView.as_view(), name='kit_update'),
+    path('kits/<int:pk>/add-component/', views.add_kit_component, name='add_kit_component'),
+    path('kits/components/<int:pk>/remove/', views.remove_kit_component, name='remove_kit_component'),
+    path('kits/<int:pk>/issue/', views.issue_kit_to_job, name='issue_kit_to_job'),
+
     # Reports
     path('reports/stock-valuation/', views.stock_valuation_report, name='stock_valuation_report'),
+    path('reports/stock-valuation/history/', views.stock_valuation_history, name='stock_valuation_history'),
     path('reports/stock-movement/', views.stock_movement_report, name='stock_movement_report'),
+    path('reports/stock-as-of/', views.stock_as_of_report, name='stock_as_of_report'),
+    path('reports/job-costs/', views.job_cost_report, name='job_cost_report'),
 ]
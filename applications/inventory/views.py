@@ -7,26 +7,45 @@ from django.views.generic import ListView, DetailView, CreateView, UpdateView, D
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
-from django.db.models import Q, Sum, F, Count, Case, When, Func
+from django.utils.dateparse import parse_date, parse_datetime
+from django.db.models import Q, Sum, F, Count, Max
+from django.db.models.functions import TruncMonth
 from django.contrib import messages
+from django.core.cache import cache
+from django.core.paginator import Paginator
 from django.db import transaction, models
+import json
+
+from OpsPilot.pagination import KeysetPaginationMixin
 
 from .models import (
     Category, Location, Supplier, Item, StockMovement, StockAdjustment,
     PurchaseOrder, PurchaseOrderItem, InventoryCount, InventoryCountItem,
-    ItemAttachment
+    ItemAttachment, StockValuationSnapshot, StockMovementDaily, Kit, KitComponent, SupplierMetrics
 )
 from .forms import (
     CategoryForm, LocationForm, SupplierForm, ItemForm, ItemAttachmentForm,
     StockMovementForm, StockAdjustmentForm, PurchaseOrderForm, PurchaseOrderItemForm,
     InventoryCountForm, InventoryCountItemForm, ItemFilterForm,
-    StockMovementFilterForm, PurchaseOrderFilterForm, ReceiveItemsForm
+    StockMovementFilterForm, PurchaseOrderFilterForm, ReceiveItemsForm, ReceivePurchaseOrderForm,
+    ItemImportForm, PurchaseOrderLinesForm, KitForm, KitComponentForm, IssueKitForm
+)
+from .costing import cost_of_goods_by_job
+from .exports import export_movements, stream_csv
+from .history import stock_as_of
+from .importers import ItemImporter, read_rows
+from .rollups import day_start, movement_date_range, movement_totals_by_type
+from .search import SEARCH_RESULT_LIMIT, get_search_backend
+from .services import (
+    InsufficientStockError, apply_stock_movement, set_stock_level, lock_item, location_stock, record_count_scans,
+    add_purchase_order_lines, issue_kit, KitShortageError, OverReceiptError, valued_items
 )
+from .summary import get_dashboard_summary
 
 
 # Item Views
 @method_decorator(login_required, name='dispatch')
-class ItemListView(ListView):
+class ItemListView(KeysetPaginationMixin, ListView):
     """View for listing inventory items with filtering"""
     model = Item
     template_name = 'inventory/item_list.html'
@@ -34,7 +53,7 @@ class ItemListView(ListView):
     paginate_by = 50
 
     def get_queryset(self):
-        queryset = Item.objects.all()
+        queryset = Item.objects.select_related('category', 'location')
 
         # Apply filters from form
         form = ItemFilterForm(self.request.GET)
@@ -45,9 +64,13 @@ class ItemListView(ListView):
             if data.get('company'):
                 queryset = queryset.filter(company=data['company'])
 
-            # Filter by category
+            # Filter by category, including its sub-categories
             if data.get('category'):
-                queryset = queryset.filter(category=data['category'])
+                category = data['category']
+                if category.path:
+                    queryset = queryset.filter(category__path__startswith=category.path)
+                else:
+                    queryset = queryset.filter(category=category)
 
             # Filter by location
             if data.get('location'):
@@ -66,15 +89,11 @@ class ItemListView(ListView):
                 elif data['stock_status'] == 'ok':
                     queryset = queryset.filter(quantity__gt=F('minimum_stock'))
 
-            # Search in name, description, sku, tags
+            # Search in name, description, sku, part number, tags and supplier; pages follow the ranking
             if data.get('search'):
-                search_term = data['search']
-                queryset = queryset.filter(
-                    Q(name__icontains=search_term) |
-                    Q(description__icontains=search_term) |
-                    Q(sku__icontains=search_term) |
-                    Q(tags__icontains=search_term)
-                )
+                self.ranked_ids = get_search_backend().search(data['search'])
+                self.search_truncated = len(self.ranked_ids) >= SEARCH_RESULT_LIMIT
+                queryset = queryset.filter(pk__in=self.ranked_ids)
 
         # Only show active items by default, unless filtered
         if 'is_active' not in self.request.GET:
@@ -85,33 +104,13 @@ class ItemListView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['filter_form'] = ItemFilterForm(self.request.GET)
+        context['search_truncated'] = getattr(self, 'search_truncated', False)
+        context['search_limit'] = SEARCH_RESULT_LIMIT
 
-        # Add summary statistics
-        context['total_items'] = Item.objects.filter(is_active=True).count()
-        context['low_stock_count'] = Item.objects.filter(
-            is_active=True,
-            quantity__gt=0,
-            quantity__lte=F('minimum_stock')
-        ).count()
-        context['out_of_stock_count'] = Item.objects.filter(
-            is_active=True,
-            quantity=0
-        ).count()
-
-        # Stock value by company
-        context['wisp_stock_value'] = Item.objects.filter(
-            company='wisp',
-            is_active=True
-        ).exclude(
-            total_value=None
-        ).aggregate(total=Sum('total_value'))['total'] or 0
-
-        context['fno_stock_value'] = Item.objects.filter(
-            company='fno',
-            is_active=True
-        ).exclude(
-            total_value=None
-        ).aggregate(total=Sum('total_value'))['total'] or 0
+        # Add summary statistics from the cached dashboard summary
+        summary = get_dashboard_summary()
+        for key in ('total_items', 'low_stock_count', 'out_of_stock_count', 'wisp_stock_value', 'fno_stock_value'):
+            context[key] = summary[key]
 
         return context
 
@@ -130,6 +129,9 @@ class ItemDetailView(DetailView):
         context['movements'] = StockMovement.objects.filter(item=self.object).order_by('-movement_date')[:10]
         context['adjustments'] = StockAdjustment.objects.filter(item=self.object).order_by('-adjustment_date')[:5]
         context['attachments'] = self.object.attachments.all()
+        context['location_balances'] = self.object.location_balances.filter(
+            quantity__gt=0
+        ).select_related('location').order_by('location__name')
 
         # Add form for adding attachments
         context['attachment_form'] = ItemAttachmentForm()
@@ -161,6 +163,65 @@ class ItemUpdateView(UpdateView):
         return super().form_valid(form)
 
 
+@login_required
+def item_search(request):
+    """Search-as-you-type lookup for inventory items"""
+    query = request.GET.get('q', '').strip()
+    ranked_ids = get_search_backend().search(query, limit=10) if query else []
+
+    items = Item.objects.filter(pk__in=ranked_ids, is_active=True).values('pk', 'name', 'sku', 'quantity')
+    items_by_id = {item['pk']: item for item in items}
+
+    return JsonResponse({
+        'results': [
+            {
+                'id': item['pk'],
+                'name': item['name'],
+                'sku': item['sku'],
+                'quantity': item['quantity'],
+                'url': reverse('inventory:item_detail', kwargs={'pk': item['pk']}),
+            }
+            for item in (items_by_id.get(pk) for pk in ranked_ids) if item
+        ]
+    })
+
+
+@login_required
+def item_import(request):
+    """Upload a CSV or XLSX of items and opening quantities"""
+    result = None
+
+    if request.method == 'POST':
+        form = ItemImportForm(request.POST, request.FILES)
+
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            importer = ItemImporter(
+                performed_by=request.user,
+                dry_run=form.cleaned_data['dry_run'],
+                start_row=form.cleaned_data['start_row'] or 1,
+            )
+            result = importer.run(read_rows(upload.file, upload.name))
+
+            if result.dry_run:
+                messages.info(request, f'Dry run complete: {result.rows} rows checked, {len(result.errors)} errors.')
+            else:
+                messages.success(
+                    request,
+                    f'Import complete: {result.created} items created, {result.updated} updated.'
+                )
+    else:
+        form = ItemImportForm()
+
+    context = {
+        'form': form,
+        'result': result,
+        'errors': result.errors[:200] if result else [],
+    }
+
+    return render(request, 'inventory/item_import.html', context)
+
+
 @login_required
 @require_POST
 def add_item_attachment(request, pk):
@@ -195,12 +256,13 @@ def add_item_attachment(request, pk):
 
 # Stock Movement Views
 @method_decorator(login_required, name='dispatch')
-class StockMovementListView(ListView):
+class StockMovementListView(KeysetPaginationMixin, ListView):
     """View for listing stock movements with filtering"""
     model = StockMovement
     template_name = 'inventory/movement_list.html'
     context_object_name = 'movements'
     paginate_by = 50
+    keyset_count = True
 
     def get_queryset(self):
         queryset = StockMovement.objects.all()
@@ -214,12 +276,8 @@ class StockMovementListView(ListView):
             if data.get('movement_type'):
                 queryset = queryset.filter(movement_type=data['movement_type'])
 
-            # Filter by date range
-            if data.get('date_from'):
-                queryset = queryset.filter(movement_date__date__gte=data['date_from'])
-
-            if data.get('date_to'):
-                queryset = queryset.filter(movement_date__date__lte=data['date_to'])
+            # Filter by date range, as a plain range so the movement_date index is used
+            queryset = queryset.filter(**movement_date_range(data.get('date_from'), data.get('date_to')))
 
             # Filter by reference
             if data.get('reference'):
@@ -245,38 +303,41 @@ class StockMovementCreateView(CreateView):
     success_url = reverse_lazy('inventory:movement_list')
 
     def form_valid(self, form):
-        with transaction.atomic():
-            movement = form.save(commit=False)
-            movement.performed_by = self.request.user
-
-            # Update item quantity based on movement type
-            item = movement.item
-            original_quantity = item.quantity
-
-            if movement.movement_type == 'in':
-                item.quantity += movement.quantity
-            elif movement.movement_type == 'out':
-                # Ensure we have enough stock
-                if item.quantity < abs(movement.quantity):
-                    form.add_error('quantity', 'Not enough stock available')
-                    return self.form_invalid(form)
-                item.quantity += movement.quantity  # movement.quantity is negative
-            elif movement.movement_type == 'transfer':
-                # For transfers, we just track the movement but don't change total quantity
-                pass
-            elif movement.movement_type in ['adjustment', 'count']:
-                # For adjustments and counts, we use the quantity as the new value
-                item.quantity = movement.quantity
+        movement = form.save(commit=False)
+        movement_fields = {
+            'movement_date': movement.movement_date,
+            'source_location': movement.source_location,
+            'destination_location': movement.destination_location,
+            'reference_number': movement.reference_number,
+            'job_reference': movement.job_reference,
+            'notes': movement.notes,
+        }
 
-            # Update stock after value
-            movement.stock_after = item.quantity
+        try:
+            if movement.movement_type in ['adjustment', 'count']:
+                # For adjustments and counts, we use the quantity as the new value
+                set_stock_level(
+                    movement.item,
+                    movement.quantity,
+                    movement_type=movement.movement_type,
+                    performed_by=self.request.user,
+                    **movement_fields
+                )
+            else:
+                # Stock in/out/return change the balance by the signed quantity, transfers leave it unchanged
+                apply_stock_movement(
+                    movement.item,
+                    movement.quantity,
+                    movement.movement_type,
+                    performed_by=self.request.user,
+                    **movement_fields
+                )
+        except InsufficientStockError:
+            form.add_error('quantity', 'Not enough stock available')
+            return self.form_invalid(form)
 
-            # Save item and movement
-            item.save()
-            movement.save()
-
-            messages.success(self.request, 'Stock movement recorded successfully!')
-            return redirect(self.success_url)
+        messages.success(self.request, 'Stock movement recorded successfully!')
+        return redirect(self.success_url)
 
 
 # Stock Adjustment Views
@@ -292,28 +353,20 @@ class StockAdjustmentCreateView(CreateView):
         with transaction.atomic():
             adjustment = form.save(commit=False)
             adjustment.performed_by = self.request.user
-            adjustment.previous_quantity = adjustment.item.quantity
+            adjustment.previous_quantity = lock_item(adjustment.item)
             adjustment.adjustment_quantity = adjustment.new_quantity - adjustment.previous_quantity
 
             # Save adjustment
             adjustment.save()
 
-            # Update item quantity
-            item = adjustment.item
-            item.quantity = adjustment.new_quantity
-            item.last_counted_date = timezone.now().date()
-            item.save()
-
-            # Create corresponding stock movement
-            StockMovement.objects.create(
-                item=item,
-                quantity=adjustment.adjustment_quantity,
-                movement_type='adjustment',
-                movement_date=adjustment.adjustment_date,
+            # Update item quantity and create corresponding stock movement
+            set_stock_level(
+                adjustment.item,
+                adjustment.new_quantity,
                 performed_by=self.request.user,
+                movement_date=adjustment.adjustment_date,
                 reference_number=f"Adjustment #{adjustment.pk}",
-                notes=adjustment.reason,
-                stock_after=adjustment.new_quantity
+                notes=adjustment.reason
             )
 
             messages.success(self.request, 'Stock adjustment recorded successfully!')
@@ -321,13 +374,14 @@ class StockAdjustmentCreateView(CreateView):
 
 
 @method_decorator(login_required, name='dispatch')
-class StockAdjustmentListView(ListView):
+class StockAdjustmentListView(KeysetPaginationMixin, ListView):
     """View for listing stock adjustments"""
     model = StockAdjustment
     template_name = 'inventory/adjustment_list.html'
     context_object_name = 'adjustments'
     paginate_by = 50
     ordering = ['-adjustment_date']
+    keyset_count = True
 
 
 # Purchase Order Views
@@ -451,14 +505,11 @@ def add_purchase_order_item(request, pk):
     form = PurchaseOrderItemForm(request.POST, purchase_order=purchase_order)
 
     if form.is_valid():
+        # Saving the line moves the order totals by its line total
         po_item = form.save(commit=False)
         po_item.purchase_order = purchase_order
         po_item.save()
 
-        # Update purchase order subtotal and total
-        purchase_order.subtotal = purchase_order.items.aggregate(total=Sum('line_total'))['total'] or 0
-        purchase_order.save()
-
         if request.headers.get('HX-Request'):
             # Return HTML for HTMX to update the items section
             return render(
@@ -478,6 +529,35 @@ def add_purchase_order_item(request, pk):
     return redirect('inventory:purchase_order_detail', pk=purchase_order.pk)
 
 
+@login_required
+def bulk_add_purchase_order_items(request, pk):
+    """Add many items to a purchase order at once from a pasted list or a supplier quote"""
+    purchase_order = get_object_or_404(PurchaseOrder, pk=pk)
+
+    # Check if PO is still editable
+    if not purchase_order.is_editable():
+        messages.error(request, 'This purchase order can no longer be edited')
+        return redirect('inventory:purchase_order_detail', pk=purchase_order.pk)
+
+    if request.method == 'POST':
+        form = PurchaseOrderLinesForm(request.POST, request.FILES, purchase_order=purchase_order)
+
+        if form.is_valid():
+            lines = add_purchase_order_lines(purchase_order, form.cleaned_data['parsed_lines'])
+
+            messages.success(request, f'{len(lines)} items added to the purchase order')
+            return redirect('inventory:purchase_order_detail', pk=purchase_order.pk)
+    else:
+        form = PurchaseOrderLinesForm(purchase_order=purchase_order)
+
+    context = {
+        'form': form,
+        'purchase_order': purchase_order,
+    }
+
+    return render(request, 'inventory/purchase_order_lines_form.html', context)
+
+
 @login_required
 @require_POST
 def remove_purchase_order_item(request, pk):
@@ -490,13 +570,9 @@ def remove_purchase_order_item(request, pk):
         messages.error(request, 'This purchase order can no longer be edited')
         return redirect('inventory:purchase_order_detail', pk=purchase_order.pk)
 
-    # Delete the item
+    # Delete the item, taking its line total off the order
     po_item.delete()
 
-    # Update purchase order subtotal and total
-    purchase_order.subtotal = purchase_order.items.aggregate(total=Sum('line_total'))['total'] or 0
-    purchase_order.save()
-
     messages.success(request, 'Item removed successfully!')
     return redirect('inventory:purchase_order_detail', pk=purchase_order.pk)
 
@@ -556,12 +632,12 @@ def receive_purchase_order_item(request, pk):
             location = form.cleaned_data['location']
 
             # Receive the items
-            success = po_item.receive_items(quantity, location, request.user)
-
-            if success:
-                messages.success(request, 'Items received successfully!')
+            try:
+                po_item.receive_items(quantity, location, request.user)
+            except OverReceiptError as e:
+                messages.error(request, str(e))
             else:
-                messages.error(request, 'Error receiving items!')
+                messages.success(request, 'Items received successfully!')
 
             return redirect('inventory:purchase_order_detail', pk=purchase_order.pk)
     else:
@@ -576,6 +652,44 @@ def receive_purchase_order_item(request, pk):
     return render(request, 'inventory/receive_items_form.html', context)
 
 
+@login_required
+def receive_purchase_order(request, pk):
+    """Receive all or selected outstanding lines of a purchase order in one go"""
+    purchase_order = get_object_or_404(PurchaseOrder, pk=pk)
+
+    # Check if PO is in ordered or partially received status
+    if purchase_order.status not in ['ordered', 'partially_received']:
+        messages.error(request, 'This purchase order cannot receive items')
+        return redirect('inventory:purchase_order_detail', pk=purchase_order.pk)
+
+    if request.method == 'POST':
+        form = ReceivePurchaseOrderForm(request.POST, purchase_order=purchase_order)
+
+        if form.is_valid():
+            try:
+                purchase_order.receive_items(
+                    form.cleaned_data['quantities'],
+                    form.cleaned_data['location'],
+                    request.user
+                )
+            except OverReceiptError as e:
+                # Nothing was received; show which line is over and what is still outstanding
+                form.add_receipt_error(e)
+            else:
+                messages.success(request, 'Items received successfully!')
+                return redirect('inventory:purchase_order_detail', pk=purchase_order.pk)
+    else:
+        form = ReceivePurchaseOrderForm(purchase_order=purchase_order)
+
+    context = {
+        'form': form,
+        'purchase_order': purchase_order,
+        'outstanding_lines': form.outstanding_lines,
+    }
+
+    return render(request, 'inventory/receive_purchase_order_form.html', context)
+
+
 # Inventory Count Views
 @method_decorator(login_required, name='dispatch')
 class InventoryCountListView(ListView):
@@ -620,16 +734,11 @@ class InventoryCountCreateView(CreateView):
         return kwargs
 
     def form_valid(self, form):
-        with transaction.atomic():
-            inventory_count = form.save()
+        # A blank count reference is numbered from the sequence on save
+        inventory_count = form.save()
 
-            # Generate a count reference if not provided
-            if not inventory_count.count_reference:
-                inventory_count.count_reference = f"COUNT-{inventory_count.pk}"
-                inventory_count.save()
-
-            messages.success(self.request, 'Inventory count created successfully!')
-            return redirect('inventory:count_detail', pk=inventory_count.pk)
+        messages.success(self.request, 'Inventory count created successfully!')
+        return redirect('inventory:count_detail', pk=inventory_count.pk)
 
 
 @login_required
@@ -655,8 +764,7 @@ def add_inventory_count_item(request, pk):
             messages.error(request, 'This item is already in the count')
             return redirect('inventory:count_detail', pk=inventory_count.pk)
 
-        # Set expected quantity from current item quantity
-        count_item.expected_quantity = count_item.item.quantity
+        # The form sets the expected quantity from the stock at the counted location
         count_item.save()
 
         if request.headers.get('HX-Request'):
@@ -678,6 +786,33 @@ def add_inventory_count_item(request, pk):
     return redirect('inventory:count_detail', pk=inventory_count.pk)
 
 
+@login_required
+@require_POST
+def submit_count_scans(request, pk):
+    """Accept a JSON batch of scanner submissions for an inventory count"""
+    inventory_count = get_object_or_404(InventoryCount, pk=pk)
+
+    # Check if count is still in progress
+    if inventory_count.status != 'in_progress':
+        return JsonResponse({'error': 'This inventory count is no longer in progress'}, status=409)
+
+    try:
+        scans = json.loads(request.body).get('scans')
+    except (ValueError, AttributeError):
+        scans = None
+    if not isinstance(scans, list) or not all(isinstance(scan, dict) for scan in scans):
+        return JsonResponse({'error': 'Expected a JSON object with a list of scans'}, status=400)
+
+    results = record_count_scans(inventory_count, scans, counted_by=request.user)
+
+    return JsonResponse({
+        'count': inventory_count.count_reference,
+        'accepted': sum(1 for result in results if result['status'] == 'ok'),
+        'rejected': sum(1 for result in results if result['status'] != 'ok'),
+        'results': results,
+    })
+
+
 @login_required
 @require_POST
 def update_count_item(request, pk):
@@ -737,13 +872,37 @@ def complete_inventory_count(request, pk):
         messages.error(request, 'All items must be counted before completing the count')
         return redirect('inventory:count_detail', pk=inventory_count.pk)
 
-    # Complete the count
-    inventory_count.mark_as_completed(request.user)
+    # Complete the count, publishing progress for the progress endpoint
+    progress_key = f'inventory_count_progress_{inventory_count.pk}'
+
+    def report_progress(processed, total):
+        cache.set(progress_key, {'processed': processed, 'total': total}, 3600)
 
-    messages.success(request, 'Inventory count completed successfully!')
+    summary = inventory_count.mark_as_completed(request.user, progress_callback=report_progress)
+    cache.delete(progress_key)
+
+    messages.success(
+        request,
+        f"Inventory count completed successfully! {summary['adjusted']} of {summary['counted']} items adjusted."
+    )
     return redirect('inventory:count_detail', pk=inventory_count.pk)
 
 
+@login_required
+def inventory_count_progress(request, pk):
+    """Return completion progress for a long-running inventory count"""
+    inventory_count = get_object_or_404(InventoryCount, pk=pk)
+    progress = cache.get(f'inventory_count_progress_{inventory_count.pk}')
+
+    if progress is None:
+        total = inventory_count.items.count()
+        processed = total if inventory_count.status == 'completed' else 0
+        progress = {'processed': processed, 'total': total}
+
+    progress['status'] = inventory_count.status
+    return JsonResponse(progress)
+
+
 # Category Views
 @method_decorator(login_required, name='dispatch')
 class CategoryListView(ListView):
@@ -814,6 +973,45 @@ class LocationUpdateView(UpdateView):
         return super().form_valid(form)
 
 
+@login_required
+def location_stock_view(request, pk):
+    """What is held at a location, for picking stock"""
+    location = get_object_or_404(Location, pk=pk)
+    balances = location_stock(location)
+
+    search = request.GET.get('search', '').strip()
+    if search:
+        balances = balances.filter(Q(item__name__icontains=search) | Q(item__sku__icontains=search))
+
+    # JSON for pickers and mobile clients
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'location': location.name,
+            'items': [
+                {
+                    'id': balance.item_id,
+                    'name': balance.item.name,
+                    'sku': balance.item.sku,
+                    'quantity': balance.quantity,
+                }
+                for balance in balances[:500]
+            ],
+        })
+
+    paginator = Paginator(balances, 100)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'location': location,
+        'balances': page_obj.object_list,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+        'search': search,
+    }
+
+    return render(request, 'inventory/location_stock.html', context)
+
+
 # Supplier Views
 @method_decorator(login_required, name='dispatch')
 class SupplierListView(ListView):
@@ -822,6 +1020,10 @@ class SupplierListView(ListView):
     template_name = 'inventory/supplier_list.html'
     context_object_name = 'suppliers'
 
+    def get_queryset(self):
+        # Performance figures come precomputed from the supplier metrics table
+        return Supplier.objects.select_related('metrics')
+
 
 @method_decorator(login_required, name='dispatch')
 class SupplierDetailView(DetailView):
@@ -833,9 +1035,15 @@ class SupplierDetailView(DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
+        # Precomputed lead times, fill rate and open order value, if they have been computed yet
+        context['metrics'] = SupplierMetrics.objects.filter(supplier=self.object).first()
+
         # Get related data
         context['items'] = Item.objects.filter(supplier=self.object, is_active=True)
-        context['purchase_orders'] = PurchaseOrder.objects.filter(supplier=self.object).order_by('-created_at')
+        context['item_prices'] = self.object.item_prices.select_related('item').order_by('item__name')
+        context['purchase_orders'] = PurchaseOrder.objects.filter(supplier=self.object).annotate(
+            line_count=Count('items')
+        ).order_by('-created_at')[:10]
 
         return context
 
@@ -868,55 +1076,154 @@ class SupplierUpdateView(UpdateView):
         return super().form_valid(form)
 
 
-# Dashboard and Reports
+# Kits
+@method_decorator(login_required, name='dispatch')
+class KitListView(ListView):
+    """View for listing kits"""
+    model = Kit
+    template_name = 'inventory/kit_list.html'
+    context_object_name = 'kits'
+
+    def get_queryset(self):
+        return Kit.objects.annotate(component_count=Count('components'))
+
+
+@method_decorator(login_required, name='dispatch')
+class KitDetailView(DetailView):
+    """View for viewing a kit's components and issuing it to a job"""
+    model = Kit
+    template_name = 'inventory/kit_detail.html'
+    context_object_name = 'kit'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        # Whole kits each component's stock covers; the lowest limits the kit
+        components = list(self.object.components.select_related('item'))
+        for component in components:
+            component.kits_on_hand = component.item.quantity // component.quantity if component.quantity else 0
+        context['components'] = components
+        context['kits_on_hand'] = min((component.kits_on_hand for component in components), default=0)
+
+        context['component_form'] = KitComponentForm(kit=self.object)
+        context['issue_form'] = IssueKitForm()
+
+        return context
+
+
+@method_decorator(login_required, name='dispatch')
+class KitCreateView(CreateView):
+    """View for creating new kits"""
+    model = Kit
+    form_class = KitForm
+    template_name = 'inventory/kit_form.html'
+
+    def form_valid(self, form):
+        form.instance.created_by = self.request.user
+        messages.success(self.request, 'Kit created successfully!')
+        return super().form_valid(form)
+
+
+@method_decorator(login_required, name='dispatch')
+class KitUpdateView(UpdateView):
+    """View for updating kits"""
+    model = Kit
+    form_class = KitForm
+    template_name = 'inventory/kit_form.html'
+
+    def form_valid(self, form):
+        messages.success(self.request, 'Kit updated successfully!')
+        return super().form_valid(form)
+
+
 @login_required
-def inventory_dashboard(request):
-    """View for inventory dashboard with summary statistics"""
-    # Get summary statistics
-    wisp_item_count = Item.objects.filter(company='wisp', is_active=True).count()
-    fno_item_count = Item.objects.filter(company='fno', is_active=True).count()
-
-    wisp_stock_value = Item.objects.filter(
-        company='wisp',
-        is_active=True
-    ).exclude(
-        total_value=None
-    ).aggregate(total=Sum('total_value'))['total'] or 0
-
-    fno_stock_value = Item.objects.filter(
-        company='fno',
-        is_active=True
-    ).exclude(
-        total_value=None
-    ).aggregate(total=Sum('total_value'))['total'] or 0
-
-    low_stock_items = Item.objects.filter(
-        is_active=True,
-        quantity__gt=0,
-        quantity__lte=F('minimum_stock')
-    )
+@require_POST
+def add_kit_component(request, pk):
+    """Add an item to a kit"""
+    kit = get_object_or_404(Kit, pk=pk)
+    form = KitComponentForm(request.POST, kit=kit)
+
+    if form.is_valid():
+        component = form.save(commit=False)
+        component.kit = kit
+        component.save()
+        messages.success(request, 'Component added successfully!')
+    else:
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+
+    return redirect('inventory:kit_detail', pk=kit.pk)
+
+
+@login_required
+@require_POST
+def remove_kit_component(request, pk):
+    """Remove an item from a kit"""
+    component = get_object_or_404(KitComponent, pk=pk)
+    kit = component.kit
+    component.delete()
+
+    messages.success(request, 'Component removed successfully!')
+    return redirect('inventory:kit_detail', pk=kit.pk)
+
+
+@login_required
+@require_POST
+def issue_kit_to_job(request, pk):
+    """Issue a number of kits to a job in one batch"""
+    kit = get_object_or_404(Kit, pk=pk, is_active=True)
+    form = IssueKitForm(request.POST)
+    as_json = request.GET.get('format') == 'json'
+
+    if not form.is_valid():
+        if as_json:
+            return JsonResponse({'error': 'Invalid kit issue', 'errors': form.errors}, status=400)
+        messages.error(request, 'Enter the number of kits and a job reference')
+        return redirect('inventory:kit_detail', pk=kit.pk)
+
+    data = form.cleaned_data
+    try:
+        movements = issue_kit(
+            kit,
+            data['kits'],
+            job_reference=data['job_reference'],
+            source_location=data['source_location'],
+            performed_by=request.user,
+            notes=data['notes'],
+        )
+    except KitShortageError as exc:
+        shortages = [
+            {'item_id': item_id, 'item': name, 'required': required, 'available': available,
+             'short': required - available}
+            for item_id, name, required, available in exc.shortages
+        ]
+        if as_json:
+            return JsonResponse({'error': 'Not enough stock', 'shortages': shortages}, status=409)
+        messages.error(request, f"Not enough stock to issue {data['kits']} x {kit.name}")
+        for shortage in shortages:
+            messages.error(
+                request,
+                f"{shortage['item']}: need {shortage['required']}, have {shortage['available']} "
+                f"({shortage['short']} short)"
+            )
+        return redirect('inventory:kit_detail', pk=kit.pk)
 
-    out_of_stock_items = Item.objects.filter(
-        is_active=True,
-        quantity=0
+    if as_json:
+        return JsonResponse({'success': True, 'movements': [movement.pk for movement in movements]})
+
+    messages.success(
+        request, f"Issued {data['kits']} x {kit.name} to job {data['job_reference']} ({len(movements)} items)"
     )
+    return redirect('inventory:kit_detail', pk=kit.pk)
 
-    # Get recent activity
-    recent_movements = StockMovement.objects.all().order_by('-movement_date')[:10]
-    recent_purchase_orders = PurchaseOrder.objects.filter(
-        status__in=['ordered', 'partially_received']
-    ).order_by('-order_date')[:5]
 
-    context = {
-        'wisp_item_count': wisp_item_count,
-        'fno_item_count': fno_item_count,
-        'wisp_stock_value': wisp_stock_value,
-        'fno_stock_value': fno_stock_value,
-        'low_stock_items': low_stock_items,
-        'out_of_stock_items': out_of_stock_items,
-        'recent_movements': recent_movements,
-        'recent_purchase_orders': recent_purchase_orders,
-    }
+# Dashboard and Reports
+@login_required
+def inventory_dashboard(request):
+    """View for inventory dashboard with summary statistics"""
+    # All KPIs and short lists come from one cached summary
+    context = get_dashboard_summary()
 
     return render(request, 'inventory/dashboard.html', context)
 
@@ -924,36 +1231,52 @@ def inventory_dashboard(request):
 @login_required
 def stock_valuation_report(request):
     """View for stock valuation report"""
+    # Read a stored snapshot when a past date is requested, otherwise the live items
+    as_of = request.GET.get('as_of')
+    snapshot_date = None
+    if as_of:
+        try:
+            snapshot_date = timezone.datetime.strptime(as_of, '%Y-%m-%d').date()
+        except ValueError:
+            snapshot_date = None
+
+    # Grouped by category id, since subcategories in different branches can share a name
+    if snapshot_date:
+        rows = StockValuationSnapshot.objects.filter(
+            snapshot_date=snapshot_date,
+            category__isnull=False
+        ).values('category', 'category__name', 'category__full_name').annotate(
+            wisp_value=Sum('total_value', filter=Q(company='wisp')),
+            fno_value=Sum('total_value', filter=Q(company='fno')),
+            wisp_count=Sum('item_count', filter=Q(company='wisp')),
+            fno_count=Sum('item_count', filter=Q(company='fno')),
+        )
+    else:
+        # One grouped aggregation over the same valued items a snapshot stores
+        rows = valued_items().filter(
+            category__isnull=False
+        ).values('category', 'category__name', 'category__full_name').annotate(
+            wisp_value=Sum('total_value', filter=Q(company='wisp')),
+            fno_value=Sum('total_value', filter=Q(company='fno')),
+            wisp_count=Count('id', filter=Q(company='wisp')),
+            fno_count=Count('id', filter=Q(company='fno')),
+        )
+
     # Group items by category and company
     items_by_category = {}
-
-    # Get categories with items
-    categories = Category.objects.filter(items__is_active=True).distinct()
-
-    for category in categories:
-        wisp_items = Item.objects.filter(
-            category=category,
-            company='wisp',
-            is_active=True
-        ).exclude(total_value=None)
-
-        fno_items = Item.objects.filter(
-            category=category,
-            company='fno',
-            is_active=True
-        ).exclude(total_value=None)
-
-        wisp_value = wisp_items.aggregate(total=Sum('total_value'))['total'] or 0
-        fno_value = fno_items.aggregate(total=Sum('total_value'))['total'] or 0
+    for row in rows.order_by('category__full_name', 'category__name'):
+        wisp_value = row['wisp_value'] or 0
+        fno_value = row['fno_value'] or 0
 
         if wisp_value > 0 or fno_value > 0:
-            items_by_category[category.name] = {
+            items_by_category[row['category']] = {
+                'category': row['category__full_name'] or row['category__name'],
                 'wisp_value': wisp_value,
                 'fno_value': fno_value,
                 'total_value': wisp_value + fno_value,
-                'wisp_count': wisp_items.count(),
-                'fno_count': fno_items.count(),
-                'total_count': wisp_items.count() + fno_items.count(),
+                'wisp_count': row['wisp_count'] or 0,
+                'fno_count': row['fno_count'] or 0,
+                'total_count': (row['wisp_count'] or 0) + (row['fno_count'] or 0),
             }
 
     # Calculate totals
@@ -965,11 +1288,191 @@ def stock_valuation_report(request):
         'wisp_total': wisp_total,
         'fno_total': fno_total,
         'grand_total': wisp_total + fno_total,
+        'snapshot_date': snapshot_date,
     }
 
     return render(request, 'inventory/stock_valuation_report.html', context)
 
 
+@login_required
+def stock_valuation_history(request):
+    """Month-end stock valuation for a year against the year before, read from snapshots"""
+    try:
+        year = int(request.GET.get('year', timezone.now().year))
+    except ValueError:
+        year = timezone.now().year
+
+    # Latest snapshot in each month of both years
+    month_ends = StockValuationSnapshot.objects.filter(
+        snapshot_date__year__in=[year - 1, year]
+    ).annotate(
+        month=TruncMonth('snapshot_date')
+    ).values('month').annotate(
+        last_date=Max('snapshot_date')
+    ).values_list('last_date', flat=True)
+
+    rows = StockValuationSnapshot.objects.filter(
+        snapshot_date__in=list(month_ends)
+    ).values('snapshot_date').annotate(
+        wisp_value=Sum('total_value', filter=Q(company='wisp')),
+        fno_value=Sum('total_value', filter=Q(company='fno')),
+        total_value=Sum('total_value'),
+    ).order_by('snapshot_date')
+
+    # Line up each month with the same month of the previous year
+    by_month = {}
+    for row in rows:
+        snapshot_date = row['snapshot_date']
+        month = by_month.setdefault(snapshot_date.month, {'month': snapshot_date.replace(day=1, year=year)})
+        key = 'current' if snapshot_date.year == year else 'previous'
+        month[key] = row
+        month[f'{key}_date'] = snapshot_date
+
+    # Value received and issued per month of the year, from the daily movement rollup
+    flows = StockMovementDaily.objects.filter(
+        date__year=year,
+        movement_type__in=['in', 'out']
+    ).annotate(
+        month=TruncMonth('date')
+    ).values('month').annotate(
+        received_value=Sum('value', filter=Q(movement_type='in')),
+        issued_value=Sum('value', filter=Q(movement_type='out')),
+    ).order_by()
+    for flow in flows:
+        month = by_month.setdefault(flow['month'].month, {'month': flow['month']})
+        month['received_value'] = flow['received_value']
+        month['issued_value'] = flow['issued_value']
+
+    months = [by_month[month] for month in sorted(by_month)]
+    for month in months:
+        current = month.get('current', {}).get('total_value')
+        previous = month.get('previous', {}).get('total_value')
+        month['change'] = current - previous if current is not None and previous is not None else None
+
+    context = {
+        'year': year,
+        'months': months,
+    }
+
+    return render(request, 'inventory/stock_valuation_history.html', context)
+
+
+@login_required
+def stock_as_of_report(request):
+    """Stock level of every item, or one item or category, at a point in time, from the movement ledger"""
+    # A date means the end of that day, a datetime is taken as given
+    at_param = request.GET.get('at', '')
+    # parse_datetime also accepts a bare date, as midnight, so dates are checked first
+    at_date = parse_date(at_param)
+    at = None if at_date else parse_datetime(at_param)
+    if at is None:
+        at_date = at_date or timezone.localdate()
+        at = day_start(at_date + timezone.timedelta(days=1)) - timezone.timedelta(microseconds=1)
+    elif timezone.is_naive(at):
+        at = timezone.make_aware(at)
+
+    items = Item.objects.select_related('category', 'location').order_by('name')
+
+    category = None
+    if request.GET.get('category', '').isdigit():
+        category = Category.objects.filter(pk=request.GET['category']).first()
+        if category and category.path:
+            items = items.filter(category__path__startswith=category.path)
+        elif category:
+            items = items.filter(category=category)
+
+    if request.GET.get('item', '').isdigit():
+        items = items.filter(pk=request.GET['item'])
+
+    company = request.GET.get('company')
+    if company:
+        items = items.filter(company=company)
+
+    # One query answers every item
+    items = stock_as_of(at, items)
+
+    export_format = request.GET.get('format')
+    if export_format == 'json':
+        return JsonResponse({
+            'at': at.isoformat(),
+            'items': list(items.values('id', 'name', 'sku', 'quantity_as_of', 'value_as_of')),
+        })
+    if export_format == 'csv':
+        return stream_csv(
+            f'stock_as_of_{timezone.localtime(at):%Y%m%d_%H%M}.csv',
+            ['Item', 'SKU', 'Company', 'Category', 'Quantity', 'Value (current unit price)'],
+            items.values_list('name', 'sku', 'company', 'category__full_name', 'quantity_as_of', 'value_as_of')
+            .iterator(chunk_size=2000)
+        )
+
+    totals = items.aggregate(total_quantity=Sum('quantity_as_of'), total_value=Sum('value_as_of'))
+
+    paginator = Paginator(items, 100)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'at': timezone.localtime(at),
+        'category': category,
+        'company': company,
+        'categories': Category.objects.order_by('path'),
+        'items': page_obj.object_list,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+        'totals': totals,
+    }
+
+    return render(request, 'inventory/stock_as_of.html', context)
+
+
+@login_required
+def job_cost_report(request):
+    """Cost of stock issued to each job, net of returns, from the costed movement ledger"""
+    date_from = parse_date(request.GET.get('start_date', ''))
+    date_to = parse_date(request.GET.get('end_date', ''))
+    company = request.GET.get('company')
+    job = request.GET.get('job', '').strip()
+
+    movements = StockMovement.objects.filter(**movement_date_range(date_from, date_to))
+    if company:
+        movements = movements.filter(item__company=company)
+    if job:
+        movements = movements.filter(job_reference__icontains=job)
+
+    jobs = cost_of_goods_by_job(movements)
+
+    export_format = request.GET.get('format')
+    if export_format == 'json':
+        return JsonResponse({'jobs': list(jobs)})
+    if export_format == 'csv':
+        return stream_csv(
+            f'job_costs_{timezone.now():%Y%m%d}.csv',
+            ['Job Reference', 'Issued Cost', 'Returned Cost', 'Net Cost', 'Movements'],
+            jobs.values_list('job_reference', 'issued_cost', 'returned_cost', 'net_cost', 'movement_count')
+            .iterator(chunk_size=2000)
+        )
+
+    totals = movements.exclude(job_reference='').aggregate(
+        issued_cost=Sum('cost_amount', filter=Q(movement_type='out')),
+        returned_cost=Sum('cost_amount', filter=Q(movement_type='return')),
+    )
+
+    paginator = Paginator(jobs, 100)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'start_date': date_from,
+        'end_date': date_to,
+        'company': company,
+        'job': job,
+        'jobs': page_obj.object_list,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+        'totals': totals,
+    }
+
+    return render(request, 'inventory/job_cost_report.html', context)
+
+
 @login_required
 def stock_movement_report(request):
     """View for stock movement report"""
@@ -997,33 +1500,44 @@ def stock_movement_report(request):
                 days=1)
 
     # Build filter
-    movement_filter = Q(movement_date__date__gte=start_date, movement_date__date__lte=end_date)
+    movement_filter = Q(**movement_date_range(start_date, end_date))
+    rollup_filter = Q(date__gte=start_date, date__lte=end_date)
 
     if company:
         movement_filter &= Q(item__company=company)
+        rollup_filter &= Q(company=company)
 
     # Get movement data
     movements = StockMovement.objects.filter(movement_filter)
 
-    # Group by movement type
-    movement_summary = movements.values('movement_type').annotate(
-        count=Count('id'),
-        total_items=Sum(
-            Case(
-                When(movement_type='in', then=F('quantity')),
-                When(movement_type='out', then=Func(F('quantity'), function='ABS')),
-                default=F('quantity'),
-                output_field=models.PositiveIntegerField()
-            )
+    # Group by movement type from the daily rollup rather than the raw movements
+    movement_summary = movement_totals_by_type(StockMovementDaily.objects.filter(rollup_filter))
+
+    # Full dataset downloads are streamed rather than rendered
+    export_format = request.GET.get('export')
+    if export_format in ['csv', 'xlsx']:
+        return export_movements(
+            movements.order_by('-movement_date'),
+            export_format,
+            f'stock_movements_{start_date:%Y%m%d}_{end_date:%Y%m%d}'
         )
+
+    # Show the detail rows a page at a time
+    paginator = Paginator(
+        movements.select_related('item', 'item__location', 'source_location', 'destination_location')
+        .order_by('-movement_date'),
+        100
     )
+    page_obj = paginator.get_page(request.GET.get('page'))
 
     # Prepare context
     context = {
         'start_date': start_date,
         'end_date': end_date,
         'company': company,
-        'movements': movements.order_by('-movement_date'),
+        'movements': page_obj.object_list,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
         'movement_summary': movement_summary,
     }
 
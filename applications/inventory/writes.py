@@ -0,0 +1,79 @@
+# inventory/writes.py
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .models import Item
+
+
+_local = threading.local()
+
+
+def _write(updates):
+    """One UPDATE per item set of fields: a plain UPDATE for a single item, a bulk UPDATE for several"""
+    groups = {}
+    for item_id, fields in updates.items():
+        groups.setdefault(tuple(sorted(fields)), []).append(Item(pk=item_id, **fields))
+
+    for field_names, items in groups.items():
+        if len(items) == 1:
+            Item.objects.filter(pk=items[0].pk).update(**{name: getattr(items[0], name) for name in field_names})
+        else:
+            Item.objects.bulk_update(items, list(field_names))
+
+
+@contextmanager
+def coalesce_item_writes():
+    """
+    Unit of work for Item field writes made by services and signal handlers.
+
+    Changes passed to update_items() inside the block are merged per item and
+    written once when it ends, with only the fields that changed, instead of
+    each handler saving the item again. Nested blocks join the outermost one;
+    if the block raises, the pending changes are dropped with its transaction.
+    """
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+
+    pending = _local.pending = {}
+    try:
+        with transaction.atomic():
+            yield
+            _local.pending = None
+            if pending:
+                _write(pending)
+    finally:
+        _local.pending = None
+
+
+def update_items(updates):
+    """
+    Write field changes to items, given as {item_id: {field: value}}.
+
+    Inside coalesce_item_writes() the changes are merged (the last value of a
+    field wins) and written at the end of the block; otherwise they are
+    written now. Values should be plain values, not F() expressions, since
+    merged writes keep only the last one. Post-save signals are not sent.
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        _write(updates)
+        return
+
+    for item_id, fields in updates.items():
+        pending.setdefault(item_id, {}).update(fields)
+
+
+def pending_changes(item_id):
+    """Changes to an item still waiting in the current block, so readers inside it see them"""
+    pending = getattr(_local, 'pending', None)
+    return dict(pending.get(item_id, {})) if pending else {}
+
+
+def update_item(item, **fields):
+    """Change fields on an in-memory item and write them through update_items()"""
+    for name, value in fields.items():
+        setattr(item, name, value)
+    update_items({item.pk: fields})
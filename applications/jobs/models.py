@@ -3,6 +3,12 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from django.urls import reverse
+from django.core.files.storage import storages
+
+
+def attachment_storage():
+    """Storage for uploaded attachments, configured as STORAGES['attachments']"""
+    return storages['attachments']
 
 
 class Location(models.Model):
@@ -227,6 +233,7 @@ class Job(models.Model):
             models.Index(fields=['scheduled_start_date']),
             models.Index(fields=['job_type']),
             models.Index(fields=['assigned_team']),
+            models.Index(fields=['created_at', 'id']),
         ]
 
     def __str__(self):
@@ -362,7 +369,7 @@ class JobNote(models.Model):
 class JobAttachment(models.Model):
     """File attachments for jobs"""
     job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='attachments')
-    file = models.FileField(upload_to='job_attachments/%Y/%m/')
+    file = models.FileField(upload_to='job_attachments/%Y/%m/', storage=attachment_storage)
     file_name = models.CharField(max_length=255)
     file_size = models.PositiveIntegerField()  # Size in bytes
     file_type = models.CharField(max_length=100)  # MIME type
@@ -10,6 +10,8 @@ from django.utils import timezone
 from django.db.models import Q
 from django.contrib import messages
 
+from OpsPilot.pagination import KeysetPaginationMixin
+
 from .models import (
     Job, JobTask, JobNote, JobAttachment, Location, Team,
     CivilWorker, CivilWorkerAssignment, InventoryUsage, JobStatusUpdate
@@ -22,7 +24,7 @@ from .forms import (
 
 
 @method_decorator(login_required, name='dispatch')
-class JobListView(ListView):
+class JobListView(KeysetPaginationMixin, ListView):
     """View for listing jobs with filtering"""
     model = Job
     template_name = 'jobs/job_list.html'
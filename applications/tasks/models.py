@@ -2,6 +2,12 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from django.urls import reverse
+from django.core.files.storage import storages
+
+
+def attachment_storage():
+    """Storage for uploaded attachments, configured as STORAGES['attachments']"""
+    return storages['attachments']
 
 
 class TaskCategory(models.Model):
@@ -107,6 +113,7 @@ class Task(models.Model):
             models.Index(fields=['created_by']),
             models.Index(fields=['assigned_to']),
             models.Index(fields=['company']),
+            models.Index(fields=['created_at', 'id']),
         ]
 
     def __str__(self):
@@ -167,7 +174,7 @@ class Subtask(models.Model):
 class TaskAttachment(models.Model):
     """File attachments for tasks"""
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='attachments')
-    file = models.FileField(upload_to='task_attachments/%Y/%m/')
+    file = models.FileField(upload_to='task_attachments/%Y/%m/', storage=attachment_storage)
     file_name = models.CharField(max_length=255)
     file_size = models.PositiveIntegerField()  # Size in bytes
     file_type = models.CharField(max_length=100)  # MIME type
@@ -209,7 +216,7 @@ class TaskComment(models.Model):
 class TaskVoiceNote(models.Model):
     """Voice notes attached to tasks"""
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='voice_notes')
-    audio_file = models.FileField(upload_to='task_voice_notes/%Y/%m/')
+    audio_file = models.FileField(upload_to='task_voice_notes/%Y/%m/', storage=attachment_storage)
     duration = models.PositiveIntegerField(help_text='Duration in seconds')
     transcription = models.TextField(blank=True, help_text='Automatic transcription of the voice note')
     recorded_at = models.DateTimeField(auto_now_add=True)
@@ -9,6 +9,8 @@ from django.utils import timezone
 from django.db.models import Q
 from django.contrib import messages
 
+from OpsPilot.pagination import KeysetPaginationMixin
+
 from .models import (
     Task, Subtask, TaskCategory, TaskPriority,
     TaskAttachment, TaskComment, TaskVoiceNote
@@ -20,7 +22,7 @@ from .forms import (
 
 
 @method_decorator(login_required, name='dispatch')
-class TaskListView(ListView):
+class TaskListView(KeysetPaginationMixin, ListView):
     """View for listing tasks with filtering"""
     model = Task
     template_name = 'tasks/task_list.html'
@@ -24,4 +24,35 @@ document.addEventListener('DOMContentLoaded', function() {
     tooltipTriggerList.map(function (tooltipTriggerEl) {
         return new bootstrap.Tooltip(tooltipTriggerEl);
     });
+
+    // Search-as-you-type suggestions for inputs with a data-search-url
+    document.querySelectorAll('input[data-search-url]').forEach(function(input) {
+        const datalist = document.createElement('datalist');
+        datalist.id = input.id + '-suggestions';
+        input.setAttribute('list', datalist.id);
+        input.after(datalist);
+
+        let timer = null;
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (query.length < 2) {
+                datalist.innerHTML = '';
+                return;
+            }
+            timer = setTimeout(function() {
+                fetch(input.dataset.searchUrl + '?q=' + encodeURIComponent(query))
+                    .then(function(response) { return response.json(); })
+                    .then(function(data) {
+                        datalist.innerHTML = '';
+                        data.results.forEach(function(result) {
+                            const option = document.createElement('option');
+                            option.value = result.name;
+                            option.label = result.sku ? result.name + ' (' + result.sku + ')' : result.name;
+                            datalist.appendChild(option);
+                        });
+                    });
+            }, 200);
+        });
+    });
 });
\ No newline at end of file